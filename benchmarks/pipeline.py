@@ -0,0 +1,194 @@
+"""
+Benchmark the full tracking pipeline on a synthetic clip with ground truth.
+
+Renders (or reuses) a clip from benchmarks/synthetic.py, runs every tracking
+stage and the USD export from scratch, then reports stage throughput and the
+pose error against the ground truth. Results are saved per machine so a
+change can be compared against a baseline run on the same hardware.
+
+    python benchmarks/pipeline.py --frames 96 --save baseline
+    python benchmarks/pipeline.py --frames 96 --mapper global --baseline baseline
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pycolmap
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from synthetic import render_clip
+from telemetry import compare_reports, load_report, record_stage
+from tracking import create_usd, make_pair_options, run_tracking, setup_project
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def pose_errors(model_dir, truth):
+    """Camera center RMSE (fraction of the path length), rotation and focal errors after a similarity alignment."""
+    reconstruction = pycolmap.Reconstruction(model_dir)
+    index = {f"frame_{frame:06d}.jpg": i for i, frame in enumerate(truth["frames"])}
+    images = [image for image in reconstruction.images.values() if image.has_pose and image.name in index]
+    if len(images) < 3:
+        return {"registered_frames": len(images)}
+
+    rows = [index[image.name] for image in images]
+    gt_centers = np.asarray(truth["centers"])[rows]
+    gt_rotations = np.asarray(truth["world_from_cam"])[rows]
+    centers = np.array([image.projection_center() for image in images])
+
+    gt_from_model = pycolmap.estimate_sim3d(centers, gt_centers)
+    aligned = np.array([gt_from_model * c for c in centers])
+    path_length = np.linalg.norm(np.diff(np.asarray(truth["centers"]), axis=0), axis=1).sum()
+    center_rmse = np.sqrt(np.mean(np.sum((aligned - gt_centers) ** 2, axis=1)))
+
+    # world_from_cam of the model, brought into the ground truth frame.
+    align = gt_from_model.rotation.matrix()
+    rotations = np.array([align @ image.cam_from_world().rotation.matrix().T for image in images])
+    relative = np.einsum("nji,njk->nik", gt_rotations, rotations)
+    angles = np.degrees(np.arccos(np.clip((np.trace(relative, axis1=1, axis2=2) - 1) / 2, -1, 1)))
+
+    focal = reconstruction.cameras[images[0].camera_id].params[0]
+    return {
+        "registered_frames": len(images),
+        "center_rmse_pct": round(float(100 * center_rmse / path_length), 3),
+        "rotation_error_deg": round(float(np.mean(angles)), 4),
+        "focal_error_pct": round(float(100 * abs(focal - truth["focal"]) / truth["focal"]), 3),
+    }
+
+
+def throughput(report):
+    """Per-stage throughput from a run report."""
+    stages, metrics = report["stages"], report["metrics"]
+    frames = metrics.get("frames", 0)
+    result = {}
+
+    decode = sum(stages[name]["wall_s"] for name in ("frames", "features", "stream") if name in stages)
+    if decode:
+        result["decode_extract_fps"] = round(frames / decode, 3)
+    if stages.get("matching", {}).get("wall_s"):
+        result["matching_pairs_per_s"] = round(metrics.get("verified_pairs", 0) / stages["matching"]["wall_s"], 3)
+    registered = max([model["registered_images"] for model in metrics.get("models", {}).values()], default=0)
+    if registered and "mapping" in stages:
+        result["mapping_s_per_image"] = round(stages["mapping"]["wall_s"] / registered, 4)
+    if stages.get("export", {}).get("wall_s"):
+        result["export_fps"] = round(frames / stages["export"]["wall_s"], 3)
+    return result
+
+
+def largest_model(recon_dir):
+    models = [
+        os.path.join(recon_dir, name) for name in os.listdir(recon_dir)
+        if os.path.isfile(os.path.join(recon_dir, name, "images.bin"))
+    ]
+    if not models:
+        return None
+    return max(models, key=lambda path: pycolmap.Reconstruction(path).num_reg_images())
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def machine_dir():
+    return os.path.join(RESULTS_DIR, platform.node() or "unknown")
+
+
+def get_clip(args):
+    """Render the clip once per set of parameters and keep it with its ground truth."""
+    name = f"synthetic_{args.frames}f_{args.width}x{args.height}_s{args.seed}.mp4"
+    clip_dir = os.path.join(RESULTS_DIR, "clips")
+    os.makedirs(clip_dir, exist_ok=True)
+    clip_path = os.path.join(clip_dir, name)
+    truth_path = clip_path + ".json"
+    if not (os.path.exists(clip_path) and os.path.exists(truth_path)):
+        print(f"🎬 Rendering {name}…")
+        truth = render_clip(clip_path, args.frames, args.width, args.height, seed=args.seed)
+        with open(truth_path, "w", encoding="utf-8") as f:
+            json.dump(truth, f)
+    with open(truth_path, "r", encoding="utf-8") as f:
+        return clip_path, json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=96)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--match-type", dest="match_type", default="sequential",
+                        choices=["exhaustive", "sequential", "spatial", "retrieval"])
+    parser.add_argument("--mapper", default="incremental", choices=["incremental", "chunked", "global"])
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--keyframes", action="store_true")
+    parser.add_argument("--proxy-scale", dest="proxy_scale", type=float, default=1.0)
+    parser.add_argument("--mask-motion", dest="motion_masks", action="store_true")
+    parser.add_argument("--threads", type=int, default=-1)
+    parser.add_argument("--save", help="Store the result under this label (default: git revision)")
+    parser.add_argument("--baseline", help="Compare against the stored result with this label")
+    parser.add_argument("--keep", help="Keep the benchmark project in this folder")
+    args = parser.parse_args()
+
+    work_dir = args.keep or tempfile.mkdtemp(prefix="methventrack_bench_")
+    clip_path, truth = get_clip(args)
+    project_dir = os.path.join(work_dir, "project")
+    shutil.rmtree(project_dir, ignore_errors=True)
+    setup_project(project_dir, clip_path)
+
+    try:
+        recon_dir = run_tracking(
+            project_dir, "SIMPLE_RADIAL", args.match_type, 0.8, 0.7, make_pair_options(args.match_type),
+            num_threads=args.threads, use_cache=False, streaming=args.streaming,
+            keyframes=args.keyframes, mapper=args.mapper, proxy_scale=args.proxy_scale,
+            motion_masks=args.motion_masks
+        )
+        model_dir = largest_model(recon_dir)
+        if model_dir is None:
+            print("❌ Mapping produced no model.")
+            return 1
+        with record_stage(model_dir, "export"):
+            create_usd(project_dir, model_dir, os.path.join(work_dir, "bench.usdc"))
+        report = load_report(recon_dir)
+        errors = pose_errors(model_dir, truth)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report["settings"].update(clip=os.path.basename(clip_path), revision=git_revision())
+    report["metrics"].update(throughput(report))
+    report["metrics"].update(errors)
+
+    print("\n📏 Benchmark")
+    for key, value in report["metrics"].items():
+        if not isinstance(value, dict):
+            print(f"  {key:<24} {value}")
+
+    label = args.save or report["settings"]["revision"] or "latest"
+    os.makedirs(machine_dir(), exist_ok=True)
+    result_path = os.path.join(machine_dir(), f"{label}.json")
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Saved {result_path}")
+
+    if args.baseline:
+        baseline = load_report(os.path.join(machine_dir(), f"{args.baseline}.json"))
+        print(f"\n⚖️ Against {args.baseline}")
+        for line in compare_reports(baseline, report):
+            print(f"  {line}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Time the GUI from launch to the first paint of the main window.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 10 --budget 1.0
+    QT_QPA_PLATFORM=offscreen python benchmarks/startup.py   # CI, no display
+
+Each run starts src/main.py with METHVENTRACK_STARTUP_PROBE set, which makes
+the app print the heavy modules (NumPy, pycolmap, USD, OpenGL, tracking) that
+were loaded by its first paint and quit. Exits with status 1 when the median
+time to first paint is over the budget or a heavy module was loaded before
+the window was shown, so it can gate a build.
+"""
+import argparse
+import json
+import os
+import queue
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "main.py")
+MARKER = "STARTUP "
+
+
+def read_lines(stream, lines):
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+
+def time_startup(timeout):
+    """Seconds from launch to the first paint, and the heavy modules loaded by then."""
+    env = dict(os.environ, METHVENTRACK_STARTUP_PROBE="1")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, MAIN], cwd=os.path.dirname(MAIN), env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    # Read on a thread: an app that hangs before painting prints nothing to wake a blocking read.
+    lines = queue.Queue()
+    threading.Thread(target=read_lines, args=(process.stdout, lines), daemon=True).start()
+    try:
+        while True:
+            line = lines.get(timeout=max(0.0, timeout - (time.perf_counter() - start)))
+            if line is None:
+                raise RuntimeError("The app exited before its first paint")
+            if line.startswith(MARKER):
+                elapsed = time.perf_counter() - start
+                return elapsed, json.loads(line[len(MARKER):])["loaded"]
+    except queue.Empty:
+        raise RuntimeError(f"No first paint within {timeout:.0f}s") from None
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.5, help="Maximum median seconds to first paint")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    timings = []
+    loaded = set()
+    for run in range(args.runs):
+        elapsed, modules = time_startup(args.timeout)
+        timings.append(elapsed)
+        loaded.update(modules)
+        print(f"  run {run + 1}: {elapsed:.3f}s" + (f" (loaded {', '.join(modules)})" if modules else ""))
+
+    median = statistics.median(timings)
+    print(f"First paint: median {median:.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s "
+          f"(budget {args.budget:.2f}s)")
+
+    failed = False
+    if median > args.budget:
+        print(f"❌ Startup is over budget by {median - args.budget:.3f}s")
+        failed = True
+    if loaded:
+        print(f"❌ Loaded before the first paint: {', '.join(sorted(loaded))}")
+        failed = True
+    if not failed:
+        print("✅ Startup within budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Render synthetic clips with a known camera path and intrinsics.
+
+The scene is the inside of a box whose six walls carry different procedural
+textures, ray traced with NumPy and piped into ffmpeg. The ground truth
+(pinhole focal length, principal point and per-frame camera poses in COLMAP
+conventions) is written next to the clip.
+
+    python benchmarks/synthetic.py clip.mp4 --frames 96 --width 640 --height 360
+"""
+import argparse
+import json
+import subprocess
+
+import imageio_ffmpeg
+import numpy as np
+
+ROOM_SIZE = 4.0
+TEXTURE_SIZE = 512
+
+
+def wall_textures(seed):
+    """Six (TEXTURE_SIZE, TEXTURE_SIZE, 3) uint8 textures with a 1/f spectrum."""
+    rng = np.random.default_rng(seed)
+    f = np.fft.fftfreq(TEXTURE_SIZE)
+    fx, fy = np.meshgrid(f, f)
+    falloff = (np.sqrt(fx ** 2 + fy ** 2) + 0.005) ** 1.3
+
+    textures = []
+    for _ in range(6):
+        channels = []
+        for _ in range(3):
+            spectrum = np.fft.fft2(rng.normal(size=(TEXTURE_SIZE, TEXTURE_SIZE))) / falloff
+            channel = np.real(np.fft.ifft2(spectrum))
+            channels.append((channel - channel.min()) / (channel.max() - channel.min()))
+        textures.append((np.stack(channels, axis=-1) * 255).astype(np.uint8))
+    return textures
+
+
+def camera_path(num_frames):
+    """
+    Ground truth camera centers (N, 3) and world_from_cam rotations (N, 3, 3):
+    a dolly forward with a sideways arc, a little bounce, pan and tilt.
+    """
+    a = np.arange(num_frames) / max(num_frames - 1, 1)
+    centers = np.stack([np.sin(a * 2) * 1.5, 0.2 * np.sin(a * 5), -2 + a * 1.5], axis=1)
+
+    yaw = 0.4 * np.sin(a * 2)
+    pitch = 0.1 * np.sin(a * 3)
+    cy, sy, cp, sp = np.cos(yaw), np.sin(yaw), np.cos(pitch), np.sin(pitch)
+    zeros, ones = np.zeros_like(a), np.ones_like(a)
+    yaw_m = np.stack([cy, zeros, sy, zeros, ones, zeros, -sy, zeros, cy], axis=1).reshape(-1, 3, 3)
+    pitch_m = np.stack([ones, zeros, zeros, zeros, cp, -sp, zeros, sp, cp], axis=1).reshape(-1, 3, 3)
+    return centers, yaw_m @ pitch_m
+
+
+def render_frame(center, world_from_cam, rays, textures):
+    """Ray trace one frame of the box interior; ``rays`` are (H, W, 3) camera-space directions."""
+    directions = rays @ world_from_cam.T
+    height, width = rays.shape[:2]
+    depth = np.full((height, width), np.inf)
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+
+    wall = 0
+    for axis in range(3):
+        u_axis, v_axis = [k for k in range(3) if k != axis]
+        for side in (-ROOM_SIZE, ROOM_SIZE):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = (side - center[axis]) / directions[..., axis]
+            hit = (t > 0) & (t < depth)
+            points = center + t[..., None] * directions
+            # Each wall is covered once by its texture, so no pattern repeats.
+            u = ((points[..., u_axis] / ROOM_SIZE + 1) / 2 * (TEXTURE_SIZE - 1)).clip(0, TEXTURE_SIZE - 1)
+            v = ((points[..., v_axis] / ROOM_SIZE + 1) / 2 * (TEXTURE_SIZE - 1)).clip(0, TEXTURE_SIZE - 1)
+            colors = textures[wall][v.astype(np.int64), u.astype(np.int64)]
+            depth = np.where(hit, t, depth)
+            image = np.where(hit[..., None], colors, image)
+            wall += 1
+    return image
+
+
+def render_clip(path, num_frames=96, width=640, height=360, focal=None, fps=24, seed=1):
+    """Render a clip to ``path`` and return its ground truth dict."""
+    focal = focal or 0.8 * width
+    cx, cy = width / 2, height / 2
+    textures = wall_textures(seed)
+    centers, rotations = camera_path(num_frames)
+
+    # COLMAP's pixel convention: pixel centers are at +0.5.
+    u, v = np.meshgrid(np.arange(width) + 0.5, np.arange(height) + 0.5)
+    rays = np.stack([(u - cx) / focal, (v - cy) / focal, np.ones_like(u)], axis=-1)
+
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "pipe:0",
+        "-pix_fmt", "yuv420p", "-crf", "12", str(path),
+    ]
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    try:
+        for center, rotation in zip(centers, rotations):
+            process.stdin.write(render_frame(center, rotation, rays, textures).tobytes())
+    finally:
+        process.stdin.close()
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd)
+
+    return {
+        "width": width,
+        "height": height,
+        "focal": focal,
+        "principal_point": [cx, cy],
+        "fps": fps,
+        "seed": seed,
+        # Frame numbers match the extracted frame_%06d.jpg names.
+        "frames": list(range(1, num_frames + 1)),
+        "centers": centers.tolist(),
+        "world_from_cam": rotations.tolist(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="Output video, ground truth goes to <output>.json")
+    parser.add_argument("--frames", type=int, default=96)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--focal", type=float, help="Focal length in pixels (default 0.8 x width)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    truth = render_clip(args.output, args.frames, args.width, args.height, args.focal, seed=args.seed)
+    with open(args.output + ".json", "w", encoding="utf-8") as f:
+        json.dump(truth, f)
+    print(f"Rendered {args.frames} frame(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark tracking.create_usd on a synthetic reconstruction.
+
+    python benchmarks/usd_export.py --points 1000000 --frames 10000
+    python benchmarks/usd_export.py --voxel-size 0.05 --lods 3 --inline
+    python benchmarks/usd_export.py --source folder   # model read from disk by colmap_binary
+    python benchmarks/usd_export.py --source load     # model loaded as a pycolmap.Reconstruction
+
+With --source load/folder the model is written to disk first and reading it
+is part of the timing, like an export from the GUI or CLI.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pycolmap
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from tracking import create_usd, points_layer_path
+
+
+def synthetic_reconstruction(num_points, num_frames, seed=0):
+    """Build a single-camera reconstruction with a circular camera path."""
+    rng = np.random.default_rng(seed)
+    recon = pycolmap.Reconstruction()
+
+    camera = pycolmap.Camera(
+        model="SIMPLE_RADIAL", width=1920, height=1080,
+        params=[1500.0, 960.0, 540.0, 0.01], camera_id=1
+    )
+    recon.add_camera(camera)
+    rig = pycolmap.Rig(rig_id=1)
+    rig.add_ref_sensor(camera.sensor_id)
+    recon.add_rig(rig)
+
+    angles = np.linspace(0.0, 2.0 * np.pi, num_frames, endpoint=False)
+    for i, angle in enumerate(angles, start=1):
+        quat = np.array([0.0, np.sin(angle / 2.0), 0.0, np.cos(angle / 2.0)])
+        frame = pycolmap.Frame(frame_id=i, rig_id=1)
+        frame.add_data_id(pycolmap.data_t(sensor_id=camera.sensor_id, id=i))
+        frame.rig_from_world = pycolmap.Rigid3d(
+            pycolmap.Rotation3d(quat), [np.cos(angle), 0.0, np.sin(angle)]
+        )
+        recon.add_frame(frame)
+        recon.add_image(pycolmap.Image(name=f"frame_{i:06d}.jpg", camera_id=1, image_id=i, frame_id=i))
+        recon.register_frame(i)
+
+    xyz = rng.normal(size=(num_points, 3))
+    rgb = rng.integers(0, 256, size=(num_points, 3), dtype=np.uint8)
+    track = pycolmap.Track()
+    for p, c in zip(xyz, rgb):
+        recon.add_point3D(p, track, c)
+
+    return recon
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--frames", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--ext", default="usdc", choices=["usda", "usdc", "usd"])
+    parser.add_argument("--voxel-size", dest="voxel_size", type=float, default=0.0)
+    parser.add_argument("--lods", type=int, default=1)
+    parser.add_argument("--inline", action="store_true", help="Write the points into the export instead of a payload")
+    parser.add_argument("--source", default="memory", choices=["memory", "load", "folder"],
+                        help="Export the in-memory model, load it from disk with pycolmap, or read its folder directly")
+    args = parser.parse_args()
+
+    print(f"Building synthetic reconstruction: {args.points} points, {args.frames} frames…")
+    start = time.perf_counter()
+    recon = synthetic_reconstruction(args.points, args.frames)
+    print(f"  built in {time.perf_counter() - start:.2f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        export_path = os.path.join(tmp, f"bench.{args.ext}")
+        model_dir = os.path.join(tmp, "model")
+        if args.source != "memory":
+            os.makedirs(model_dir)
+            recon.write(model_dir)
+            del recon
+
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            if args.source == "memory":
+                model = recon
+            elif args.source == "load":
+                model = pycolmap.Reconstruction(model_dir)
+            else:
+                model = model_dir
+            create_usd(tmp, model, export_path, voxel_size=args.voxel_size, lod_levels=args.lods,
+                       points_payload=not args.inline)
+            timings.append(time.perf_counter() - start)
+        size = os.path.getsize(export_path)
+        points_size = 0 if args.inline else os.path.getsize(points_layer_path(export_path))
+
+    print(f"create_usd ({args.source}): best {min(timings):.2f}s, mean {np.mean(timings):.2f}s over {args.repeat} run(s)")
+    print(f"  output {size / 1e6:.1f} MB ({args.ext})" + (f" + {points_size / 1e6:.1f} MB points" if points_size else ""))
+
+
+if __name__ == "__main__":
+    main()
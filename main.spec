@@ -24,6 +24,8 @@ a = Analysis(
     datas=datas,
     hiddenimports=[
         'pycolmap', 'imageio_ffmpeg', 'PySide6',
+        # Imported after the window is shown (src/ui/startup.py)
+        'tracking', 'ui.viewer', 'ui.worker', 'OpenGL.GL',
         'pxr.Usd', 'pxr.Sdf', 'pxr.Tf', 'pxr.Gf', 'pxr.Vt', 'pxr.Ar'
     ],
     hookspath=[],
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+
+CACHE_FILE = "cache.json"
+FINGERPRINT_FILE = "fingerprint"
+# Written when mapping starts, the fingerprint only once it completed.
+CHECKPOINT_FILE = "checkpoint"
+
+# Options that change speed but not results.
+IGNORED_OPTIONS = ("num_threads",)
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """Return the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def options_dict(options):
+    """Turn a pycolmap options object (or dict) into plain, result-relevant values."""
+    values = options.todict() if hasattr(options, "todict") else dict(options)
+    for key in IGNORED_OPTIONS:
+        values.pop(key, None)
+    return {k: options_dict(v) if isinstance(v, dict) else v for k, v in values.items()}
+
+
+def fingerprint(upstream, **inputs):
+    """Content address of a stage: its upstream fingerprint plus its own inputs."""
+    payload = json.dumps({"upstream": upstream, "inputs": inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """
+    Per-project record of the fingerprint each stage was last completed with,
+    stored in ``<project>/cache.json``.
+    """
+
+    def __init__(self, project_dir):
+        self.path = os.path.join(project_dir, CACHE_FILE)
+        self.data = {"source": {}, "stages": {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data.update(json.load(f))
+            except (OSError, ValueError):
+                pass  # a corrupt cache only costs a full rerun
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def source_hash(self, path):
+        """Hash of the source video, re-read only when its size or mtime change."""
+        stat = os.stat(path)
+        source = self.data["source"]
+        if source.get("size") != stat.st_size or source.get("mtime_ns") != stat.st_mtime_ns:
+            source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": hash_file(path)}
+            self.data["source"] = source
+            self.save()
+        return source["sha256"]
+
+    def is_fresh(self, stage, key):
+        return self.data["stages"].get(stage) == key
+
+    def store(self, stage, key):
+        self.data["stages"][stage] = key
+        self.save()
+
+    def invalidate(self, stage):
+        """Forget a stage before it reruns, so an interrupted run is never trusted."""
+        if self.data["stages"].pop(stage, None) is not None:
+            self.save()
+
+
+def find_reconstruction(recon_root, key):
+    """Return an existing reconstruction folder mapped with this fingerprint, or None."""
+    if not os.path.isdir(recon_root):
+        return None
+
+    for name in sorted(os.listdir(recon_root)):
+        recon_dir = os.path.join(recon_root, name)
+        fingerprint_path = os.path.join(recon_dir, FINGERPRINT_FILE)
+        if not os.path.isfile(fingerprint_path):
+            continue
+        with open(fingerprint_path, "r", encoding="utf-8") as f:
+            if f.read().strip() != key:
+                continue
+        if any(os.path.isdir(os.path.join(recon_dir, d)) for d in os.listdir(recon_dir)):
+            return recon_dir
+    return None
+
+
+def read_marker(recon_dir, name):
+    path = os.path.join(recon_dir, name)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def find_checkpoint(recon_root, key=None):
+    """
+    Return an unfinished reconstruction folder whose mapping started with this
+    fingerprint (any fingerprint if ``key`` is None), or None.
+    """
+    if not os.path.isdir(recon_root):
+        return None
+
+    for name in sorted(os.listdir(recon_root)):
+        recon_dir = os.path.join(recon_root, name)
+        started = read_marker(recon_dir, CHECKPOINT_FILE)
+        if started and (key is None or started == key) and read_marker(recon_dir, FINGERPRINT_FILE) is None:
+            return recon_dir
+    return None
+
+
+def new_run_dir(root):
+    """Create the first unused numbered folder in ``root`` (deleted runs leave gaps) and return it."""
+    os.makedirs(root, exist_ok=True)
+    index = 0
+    while True:
+        path = os.path.join(root, str(index))
+        try:
+            # Atomic: concurrent runs never get the same folder.
+            os.mkdir(path)
+            return path
+        except FileExistsError:
+            index += 1
+
+
+def write_fingerprint(recon_dir, key, name=FINGERPRINT_FILE):
+    with open(os.path.join(recon_dir, name), "w", encoding="utf-8") as f:
+        f.write(key)
+    if name == FINGERPRINT_FILE:
+        checkpoint_path = os.path.join(recon_dir, CHECKPOINT_FILE)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
@@ -0,0 +1,105 @@
+"""
+Cancellation and mapping checkpoints.
+
+A run is cancelled through a ``threading.Event`` that the pipeline checks at
+safe points: between stages and after every image the incremental mapper
+registers. While mapping, the partial models are written to
+``<output>/_checkpoint`` every CHECKPOINT_IMAGES registered images or
+CHECKPOINT_MINUTES, and once more when the run is cancelled, so a crashed or
+cancelled run resumes from there instead of starting over.
+"""
+import os
+import shutil
+import time
+
+import pycolmap
+
+CHECKPOINT_DIR = "_checkpoint"
+CHECKPOINT_IMAGES = 50
+CHECKPOINT_MINUTES = 5.0
+
+
+class TrackingCancelled(Exception):
+    """Raised at the next safe point once a run has been cancelled."""
+
+
+def check_cancelled(cancel):
+    if cancel is not None and cancel.is_set():
+        raise TrackingCancelled("Tracking cancelled")
+
+
+def write_checkpoint(manager, output_path):
+    """Write every model of a ReconstructionManager to ``output_path/_checkpoint``, replacing the last one."""
+    path = os.path.join(output_path, CHECKPOINT_DIR)
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    for i in range(manager.size()):
+        os.makedirs(os.path.join(tmp_path, str(i)))
+    manager.write(tmp_path)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def latest_checkpoint(output_path):
+    """Folder of the largest checkpointed model in ``output_path``, or None."""
+    path = os.path.join(output_path, CHECKPOINT_DIR)
+    if not os.path.isdir(path):
+        # Interrupted between removing the old checkpoint and renaming the new one.
+        path += ".tmp"
+    if not os.path.isdir(path):
+        return None
+
+    best, best_images = None, 0
+    for name in os.listdir(path):
+        model_dir = os.path.join(path, name)
+        try:
+            num_images = pycolmap.Reconstruction(model_dir).num_reg_images()
+        except Exception:
+            continue  # partially written
+        if num_images > best_images:
+            best, best_images = model_dir, num_images
+    return best
+
+
+def remove_checkpoint(output_path):
+    path = os.path.join(output_path, CHECKPOINT_DIR)
+    shutil.rmtree(path, ignore_errors=True)
+    shutil.rmtree(path + ".tmp", ignore_errors=True)
+
+
+class Checkpointer:
+    """
+    Image registration callback of an IncrementalPipeline: writes checkpoints
+    of ``manager`` and stops mapping once ``cancel`` is set. ``on_image`` is
+    called with the model being mapped and its index after every image.
+    """
+
+    def __init__(self, manager, output_path, cancel=None, every_images=CHECKPOINT_IMAGES,
+                 every_minutes=CHECKPOINT_MINUTES, on_image=None, log=print):
+        self.manager = manager
+        self.output_path = output_path
+        self.cancel = cancel
+        self.every_images = every_images
+        self.every_seconds = every_minutes * 60
+        self.on_image = on_image
+        self.log = log
+        self.registered = 0
+        self.last_time = time.monotonic()
+
+    def save(self):
+        write_checkpoint(self.manager, self.output_path)
+        num_images = sum(self.manager.get(i).num_reg_images() for i in range(self.manager.size()))
+        self.log(f"💾 Checkpoint: {num_images} image(s) registered.")
+        self.registered = 0
+        self.last_time = time.monotonic()
+
+    def __call__(self):
+        self.registered += 1
+        if self.on_image is not None and self.manager.size():
+            index = self.manager.size() - 1
+            self.on_image(self.manager.get(index), index)
+        cancelled = self.cancel is not None and self.cancel.is_set()
+        if cancelled or self.registered >= self.every_images or time.monotonic() - self.last_time >= self.every_seconds:
+            self.save()
+        if cancelled:
+            raise TrackingCancelled("Tracking cancelled")
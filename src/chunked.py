@@ -0,0 +1,188 @@
+"""
+Chunked, parallel mapping for long shots.
+
+The frame range is split into overlapping chunks that are mapped in separate
+processes. Chunks are then joined one after another with a similarity
+transform estimated from the camera centers of the frames they share, the
+joined poses are re-triangulated against the database and a global bundle
+adjustment refines the result into a single model. Every mapped chunk is
+kept in ``_chunks/<i>`` with a ``done`` marker, so a cancelled or crashed
+run only maps the chunks that were not finished.
+"""
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pycolmap
+
+from checkpoints import check_cancelled
+from mappers import refine_model
+
+# Shared registered frames needed to join two chunks.
+MIN_SHARED_FRAMES = 3
+CHUNK_DONE_FILE = "done"
+
+
+def split_chunks(names, chunk_size, chunk_overlap):
+    """Split sorted image names into overlapping chunks."""
+    chunk_size = max(chunk_size, 2)
+    chunk_overlap = min(max(chunk_overlap, MIN_SHARED_FRAMES), chunk_size - 1)
+    step = chunk_size - chunk_overlap
+
+    chunks = []
+    for start in range(0, len(names), step):
+        chunks.append(names[start:start + chunk_size])
+        if start + chunk_size >= len(names):
+            break
+    return chunks
+
+
+def map_chunk(db_path, frames_path, output_path, image_names, num_threads, extract_colors, refine_intrinsics=True):
+    """Process pool entry point: map one chunk, return its largest model folder or None."""
+    options = pycolmap.IncrementalPipelineOptions(
+        num_threads=num_threads,
+        extract_colors=extract_colors,
+        image_names=image_names,
+        ba_refine_focal_length=refine_intrinsics,
+        ba_refine_extra_params=refine_intrinsics
+    )
+    pycolmap.incremental_mapping(
+        database_path=db_path,
+        image_path=frames_path,
+        output_path=output_path,
+        options=options
+    )
+    # Read the sizes back from disk, the returned dict keys need not match the folders.
+    model_dirs = [
+        os.path.join(output_path, name) for name in os.listdir(output_path)
+        if os.path.isdir(os.path.join(output_path, name))
+    ]
+    if not model_dirs:
+        return None
+    return max(model_dirs, key=lambda path: pycolmap.Reconstruction(path).num_reg_images())
+
+
+def projection_centers(reconstruction, names):
+    by_name = {image.name: image for image in reconstruction.images.values() if image.has_pose}
+    return np.array([by_name[name].projection_center() for name in names], dtype=np.float64)
+
+
+def estimate_join(merged, chunk):
+    """Similarity transform bringing ``chunk`` into ``merged``'s frame, or None."""
+    merged_names = {image.name for image in merged.images.values() if image.has_pose}
+    shared = sorted(
+        image.name for image in chunk.images.values()
+        if image.has_pose and image.name in merged_names
+    )
+    if len(shared) < MIN_SHARED_FRAMES:
+        return None
+
+    src = projection_centers(chunk, shared)
+    tgt = projection_centers(merged, shared)
+
+    # RANSAC threshold relative to the size of the shared camera path.
+    spread = np.linalg.norm(tgt - tgt.mean(axis=0), axis=1).max()
+    ransac = pycolmap.RANSACOptions(max_error=max(spread * 0.05, 1e-6))
+    result = pycolmap.estimate_sim3d_robust(src, tgt, ransac)
+    if result is not None and result["num_inliers"] >= MIN_SHARED_FRAMES:
+        return result["tgt_from_src"]
+    return pycolmap.estimate_sim3d(src, tgt)
+
+
+def add_chunk(merged, chunk):
+    """Add the posed images of an aligned chunk that ``merged`` does not have yet."""
+    merged_names = {image.name for image in merged.images.values()}
+    for image in chunk.images.values():
+        if not image.has_pose or image.name in merged_names:
+            continue
+        frame = chunk.frames[image.frame_id]
+        new_frame = pycolmap.Frame(frame_id=frame.frame_id, rig_id=frame.rig_id)
+        new_frame.add_data_id(image.data_id)
+        new_frame.rig_from_world = frame.rig_from_world
+        merged.add_frame(new_frame)
+        merged.add_image(pycolmap.Image(
+            name=image.name, camera_id=image.camera_id, image_id=image.image_id, frame_id=image.frame_id
+        ))
+        merged.register_frame(frame.frame_id)
+
+
+def map_chunked(db_path, frames_path, output_path, chunk_size=300, chunk_overlap=30, jobs=None,
+                num_threads=-1, extract_colors=True, log=print, cancel=None, refine_intrinsics=True):
+    """
+    Map ``db_path`` in overlapping chunks on a process pool and write the joined
+    model(s) to ``output_path/<i>``, like pycolmap.incremental_mapping.
+    """
+    with pycolmap.Database.open(db_path) as db:
+        names = sorted(image.name for image in db.read_all_images())
+
+    chunks = split_chunks(names, chunk_size, chunk_overlap)
+    cpu_count = num_threads if num_threads > 0 else (os.cpu_count() or 1)
+    jobs = max(1, min(jobs or cpu_count, len(chunks)))
+    threads_per_job = max(1, cpu_count // jobs)
+    log(f"🧩 Mapping {len(names)} image(s) in {len(chunks)} chunk(s): {jobs} job(s) x {threads_per_job} thread(s)")
+
+    chunks_dir = os.path.join(output_path, "_chunks")
+    context = multiprocessing.get_context("spawn")
+    chunk_models = [None] * len(chunks)
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+        pending = {}
+        for i, chunk in enumerate(chunks):
+            chunk_dir = os.path.join(chunks_dir, str(i))
+            done_path = os.path.join(chunk_dir, CHUNK_DONE_FILE)
+            if os.path.isfile(done_path):
+                with open(done_path, "r", encoding="utf-8") as f:
+                    model = f.read().strip()
+                chunk_models[i] = os.path.join(chunk_dir, model) if model else None
+                continue
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+            os.makedirs(chunk_dir)
+            future = pool.submit(map_chunk, db_path, frames_path, chunk_dir, chunk, threads_per_job, extract_colors,
+                                 refine_intrinsics)
+            pending[future] = i
+        if len(pending) < len(chunks):
+            log(f"⏯️ Reusing {len(chunks) - len(pending)} chunk(s) mapped before.")
+
+        while pending:
+            if cancel is not None and cancel.is_set():
+                # Running chunks finish and are kept, the queued ones are dropped.
+                for future in pending:
+                    future.cancel()
+            done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                if future.cancelled():
+                    continue
+                chunk_models[i] = future.result()
+                chunk_dir = os.path.join(chunks_dir, str(i))
+                with open(os.path.join(chunk_dir, CHUNK_DONE_FILE), "w", encoding="utf-8") as f:
+                    f.write(os.path.relpath(chunk_models[i], chunk_dir) if chunk_models[i] else "")
+    check_cancelled(cancel)
+
+    # Join consecutive chunks; a chunk that cannot be joined starts a new model.
+    groups = []
+    for i, model_dir in enumerate(chunk_models):
+        if model_dir is None:
+            log(f"⚠️ Chunk {i} produced no model.")
+            continue
+        chunk = pycolmap.Reconstruction(model_dir)
+        if groups:
+            transform = estimate_join(groups[-1], chunk)
+            if transform is not None:
+                chunk.transform(transform)
+                add_chunk(groups[-1], chunk)
+                continue
+            log(f"⚠️ Chunk {i} shares too few frames with the previous chunk, starting a new model.")
+        chunk.delete_all_points2D_and_points3D()
+        groups.append(chunk)
+
+    log("🌐 Refining joined model(s)…")
+    for i, merged in enumerate(groups):
+        model_dir = os.path.join(output_path, str(i))
+        os.makedirs(model_dir, exist_ok=True)
+        refine_model(merged, db_path, frames_path, model_dir, num_threads=cpu_count,
+                     extract_colors=extract_colors, log=log, refine_intrinsics=refine_intrinsics)
+
+    shutil.rmtree(chunks_dir, ignore_errors=True)
+    return len(groups)
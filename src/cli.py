@@ -0,0 +1,467 @@
+"""
+Headless command line interface for Methven Track.
+
+    python src/cli.py track PROJECT [--video clip.mp4] [--config shot.json] [--export out.usd]
+    python src/cli.py batch manifest.json [--jobs N] [--threads-per-job M]
+    python src/cli.py compare reconstruction/0 reconstruction/1
+    python src/cli.py lens list | import NAME SOURCE | remove NAME [--resolution WxH]
+    python src/cli.py plan PROJECT_OR_VIDEO [--calibrate]
+    python src/cli.py shard-worker PROJECT [--threads N]
+
+Ctrl+C stops tracking at the next safe point; running the same command again
+resumes an interrupted mapping from its last checkpoint.
+
+A config file is a JSON object using the same keys as the command line flags
+(e.g. ``{"match_type": "sequential", "overlap": 20}``). With a ``preset``
+(fast, balanced or quality), the settings a config does not set are planned
+for the shot's clip (see ``presets``). A manifest is a JSON
+object ``{"defaults": {...}, "shots": [{"project": ..., ...}, ...]}`` or a
+plain list of shots; each shot is a config that must include ``project``.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+from lenses import LENS_MODES
+from presets import PRESETS
+
+DEFAULTS = {
+    "video": None,
+    "camera_model": "SIMPLE_RADIAL",
+    "match_type": "exhaustive",
+    "sift_ratio": 0.8,
+    "sift_distance": 0.7,
+    "block_size": 50,
+    "overlap": 15,
+    "max_num_neighbors": 50,
+    "max_distance": 100.0,
+    "retrieval_neighbors": 8,
+    "num_threads": -1,
+    "use_cache": True,
+    "streaming": False,
+    "write_frames": True,
+    "keyframes": False,
+    "keyframe_motion": 0.05,
+    "mapper": "incremental",
+    "chunk_size": 300,
+    "chunk_overlap": 30,
+    "proxy_scale": 1.0,
+    "motion_masks": False,
+    "mattes": None,
+    "lens": None,
+    "lens_mode": "prior",
+    "shards": 0,
+    "preset": None,
+    "export": None,
+    "voxel_size": 0.0,
+    "min_track_length": 0,
+    "max_reprojection_error": None,
+    "lod_levels": 1,
+    "points_payload": True,
+}
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve_config(*configs):
+    """Merge config dicts over the defaults, ignoring unset (None) values."""
+    config = dict(DEFAULTS)
+    for overrides in configs:
+        for key, value in overrides.items():
+            if value is not None:
+                config[key] = value
+
+    unknown = set(config) - set(DEFAULTS) - {"project", "name"}
+    if unknown:
+        raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+    return config
+
+
+def shot_name(config):
+    return config.get("name") or os.path.basename(os.path.normpath(config["project"]))
+
+
+def shot_video(config):
+    """The video a shot tracks: its ``video``, else the project's copy."""
+    return config["video"] or os.path.join(config["project"], "source.mp4")
+
+
+def apply_preset(config, *configs, log=print):
+    """
+    Plan the config's preset for its clip and use the planned settings where
+    none of ``configs`` (the layers the config was resolved from) set one.
+    """
+    if not config["preset"]:
+        return config
+    from cost_model import CostModel, format_estimate
+    from presets import describe_settings, plan_preset, probe_clip
+
+    explicit = {key for layer in configs for key, value in layer.items() if value is not None}
+    clip = probe_clip(shot_video(config), cores=config["num_threads"])
+    cost_model = CostModel(log=log)
+    planned = plan_preset(clip, config["preset"], cost_model)
+    config.update({key: value for key, value in planned.items() if key not in explicit})
+    log(f"🎛️ Preset {config['preset']}: {describe_settings(config)}, "
+        f"estimated {format_estimate(cost_model.estimate(clip, config))}")
+    return config
+
+
+def track_shot(config, log=print, cancel=None):
+    """Run the full pipeline (and optional USD export) for one shot config."""
+    from tracking import setup_project, make_pair_options, run_tracking, create_usd, ensure_plates
+    from telemetry import record_stage
+
+    project_dir = os.path.abspath(config["project"])
+    setup_project(project_dir, config["video"])
+    if not os.path.exists(os.path.join(project_dir, "source.mp4")):
+        raise FileNotFoundError(f"{project_dir} is missing source.mp4 (pass --video)")
+
+    pair_options = make_pair_options(
+        config["match_type"],
+        block_size=config["block_size"],
+        overlap=config["overlap"],
+        max_num_neighbors=config["max_num_neighbors"],
+        max_distance=config["max_distance"],
+        retrieval_neighbors=config["retrieval_neighbors"]
+    )
+
+    recon_dir = run_tracking(
+        project_dir,
+        config["camera_model"],
+        config["match_type"],
+        config["sift_ratio"],
+        config["sift_distance"],
+        pair_options,
+        num_threads=config["num_threads"],
+        use_cache=config["use_cache"],
+        streaming=config["streaming"],
+        write_frames=config["write_frames"],
+        keyframes=config["keyframes"],
+        keyframe_motion=config["keyframe_motion"],
+        mapper=config["mapper"],
+        chunk_size=config["chunk_size"],
+        chunk_overlap=config["chunk_overlap"],
+        proxy_scale=config["proxy_scale"],
+        motion_masks=config["motion_masks"],
+        mattes_dir=os.path.abspath(config["mattes"]) if config["mattes"] else None,
+        lens=config["lens"],
+        lens_mode=config["lens_mode"],
+        shards=config["shards"],
+        cancel=cancel,
+        log=log
+    )
+
+    if config["export"]:
+        # incremental_mapping writes one sub-model per folder, export the first.
+        models = sorted(d for d in os.listdir(recon_dir) if os.path.isdir(os.path.join(recon_dir, d)))
+        if not models:
+            raise RuntimeError(f"Mapping produced no model in {recon_dir}, nothing to export")
+        model_dir = os.path.join(recon_dir, models[0])
+        ensure_plates(project_dir, num_threads=config["num_threads"], log=log)
+        log(f"Exporting {model_dir} to USD…")
+        with record_stage(model_dir, "export"):
+            create_usd(
+                project_dir, model_dir, config["export"],
+                voxel_size=config["voxel_size"],
+                min_track_length=config["min_track_length"],
+                max_reprojection_error=config["max_reprojection_error"],
+                lod_levels=config["lod_levels"],
+                points_payload=config["points_payload"]
+            )
+        log(f"✅ USD file exported to: {config['export']}")
+
+    return recon_dir
+
+
+def cancel_on_interrupt():
+    """Event set by the first Ctrl+C, so the run stops cleanly; a second Ctrl+C aborts at once."""
+    cancel = threading.Event()
+
+    def handle(signum, frame):
+        print("⏹ Stopping at the next safe point (Ctrl+C again to abort)…", file=sys.stderr, flush=True)
+        cancel.set()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    signal.signal(signal.SIGINT, handle)
+    return cancel
+
+
+def limit_threads(num_threads):
+    """Keep BLAS/OpenMP pools inside a job's CPU budget."""
+    if num_threads > 0:
+        for var in THREAD_ENV_VARS:
+            os.environ[var] = str(num_threads)
+
+
+def run_batch_job(config):
+    """Process pool entry point, returns (name, recon_dir, error, seconds)."""
+    limit_threads(config["num_threads"])
+    name = shot_name(config)
+    start = time.perf_counter()
+
+    def log(message):
+        print(f"[{name}] {message}", flush=True)
+
+    try:
+        recon_dir = track_shot(config, log=log)
+        return name, recon_dir, None, time.perf_counter() - start
+    except Exception:
+        return name, None, traceback.format_exc(), time.perf_counter() - start
+
+
+def plan_jobs(num_shots, jobs=None, threads_per_job=None, cpu_count=None):
+    """Split the CPU budget between concurrent jobs, returns (jobs, threads_per_job)."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if jobs is None:
+        jobs = max(1, cpu_count // (threads_per_job or min(cpu_count, 4)))
+    jobs = max(1, min(jobs, num_shots))
+    if threads_per_job is None:
+        threads_per_job = max(1, cpu_count // jobs)
+    return jobs, threads_per_job
+
+
+def run_batch(shots, jobs=None, threads_per_job=None):
+    """Track many shots on a process pool; returns a list of failed shot names."""
+    jobs, threads_per_job = plan_jobs(len(shots), jobs, threads_per_job)
+    for shot in shots:
+        shot["num_threads"] = threads_per_job
+
+    print(f"🚀 Tracking {len(shots)} shot(s): {jobs} job(s) x {threads_per_job} thread(s)")
+
+    failed = []
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+        futures = [pool.submit(run_batch_job, shot) for shot in shots]
+        for future in as_completed(futures):
+            name, recon_dir, error, seconds = future.result()
+            if error:
+                failed.append(name)
+                print(f"❌ [{name}] failed after {seconds:.1f}s\n{error}", flush=True)
+            else:
+                print(f"✅ [{name}] {recon_dir} ({seconds:.1f}s)", flush=True)
+
+    print(f"=== Batch finished: {len(shots) - len(failed)} succeeded, {len(failed)} failed ===")
+    return failed
+
+
+def add_setting_flags(parser):
+    parser.add_argument("--config", help="JSON file with shot settings")
+    parser.add_argument("--camera-model", dest="camera_model", choices=["SIMPLE_RADIAL", "FISHEYE"])
+    parser.add_argument("--match-type", dest="match_type", choices=["exhaustive", "sequential", "spatial", "retrieval"])
+    parser.add_argument("--sift-ratio", dest="sift_ratio", type=float)
+    parser.add_argument("--sift-distance", dest="sift_distance", type=float)
+    parser.add_argument("--block-size", dest="block_size", type=int)
+    parser.add_argument("--overlap", type=int)
+    parser.add_argument("--max-neighbors", dest="max_num_neighbors", type=int)
+    parser.add_argument("--max-distance", dest="max_distance", type=float)
+    parser.add_argument("--retrieval-neighbors", dest="retrieval_neighbors", type=int,
+                        help="Retrieval matching: most similar frames matched per frame, on top of --overlap")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_const", const=False,
+                        help="Rerun every stage even if its inputs are unchanged")
+    parser.add_argument("--streaming", action="store_const", const=True,
+                        help="Pipe decoded frames straight into feature extraction")
+    parser.add_argument("--no-plates", dest="write_frames", action="store_const", const=False,
+                        help="With --streaming, only write background plate JPEGs when exporting")
+    parser.add_argument("--keyframes", action="store_const", const=True,
+                        help="Only match and map keyframes, then register the other frames")
+    parser.add_argument("--keyframe-motion", dest="keyframe_motion", type=float,
+                        help="Image motion (fraction of the diagonal) between keyframes")
+    parser.add_argument("--mapper", choices=["incremental", "chunked", "global"],
+                        help="Mapping backend: incremental, chunked (parallel chunks) or global SfM")
+    parser.add_argument("--chunk-size", dest="chunk_size", type=int, help="Frames per mapping chunk")
+    parser.add_argument("--chunk-overlap", dest="chunk_overlap", type=int, help="Frames shared by neighbouring chunks")
+    parser.add_argument("--proxy-scale", dest="proxy_scale", type=float,
+                        help="Track on frames downscaled by this factor (e.g. 0.5), plates stay full resolution")
+    parser.add_argument("--mask-motion", dest="motion_masks", action="store_const", const=True,
+                        help="Extract no features on moving objects (people, cars, water)")
+    parser.add_argument("--mattes", help="Folder of garbage mattes (white = no features), one per frame or one for all")
+    parser.add_argument("--preset", choices=PRESETS,
+                        help="Plan the settings that are not given for the clip (fast, balanced or quality)")
+    parser.add_argument("--lens", help="Lens library calibration to start from (see the lens command)")
+    parser.add_argument("--lens-mode", dest="lens_mode", choices=LENS_MODES,
+                        help="prior: refine the lens intrinsics and save them back, fixed: hold them fixed")
+    parser.add_argument("--shards", type=int,
+                        help="Extract and match features in shards on this many processes (0: off), "
+                             "other nodes can join with shard-worker")
+    parser.add_argument("--voxel-size", dest="voxel_size", type=float,
+                        help="Export: merge the points in each voxel of this size (0 keeps every point)")
+    parser.add_argument("--min-track-length", dest="min_track_length", type=int,
+                        help="Export: drop points seen by fewer images")
+    parser.add_argument("--max-error", dest="max_reprojection_error", type=float,
+                        help="Export: drop points with a larger mean reprojection error (pixels)")
+    parser.add_argument("--lods", dest="lod_levels", type=int, help="Export: number of point cloud LOD variants")
+    parser.add_argument("--inline-points", dest="points_payload", action="store_const", const=False,
+                        help="Export: keep the points in the USD file instead of a separate payload layer")
+
+
+def plan_command(args):
+    from cost_model import CostModel, format_estimate
+    from presets import PRESETS, describe_settings, plan_preset, probe_clip
+
+    video = os.path.join(args.source, "source.mp4") if os.path.isdir(args.source) else args.source
+    clip = probe_clip(video, cores=args.num_threads)
+    cost_model = CostModel(calibrate=args.calibrate)
+    print(f"🎬 {clip['frames']} frame(s) at {clip['width']}x{clip['height']}, "
+          f"{clip['motion'] * 100:.2f}% motion per frame, {clip['cores']} core(s)")
+    for preset in PRESETS:
+        settings = plan_preset(clip, preset, cost_model)
+        print(f"  {preset:<9} {describe_settings(settings)}")
+        print(f"  {'':<9} {format_estimate(cost_model.estimate(clip, settings))}")
+    return 0
+
+
+def lens_command(args):
+    from lenses import LensLibrary, describe_calibration, read_calibration
+
+    library = LensLibrary()
+    if args.lens_command == "list":
+        for name in library.names():
+            for calibration in library.calibrations(name).values():
+                print(describe_calibration(name, calibration))
+        print(f"📚 {len(library.names())} lens(es) in {library.path}")
+    elif args.lens_command == "import":
+        model, width, height, params, images, error = read_calibration(args.source)
+        library.add_sample(args.name, model, width, height, params, source=os.path.abspath(args.source),
+                           kind="grid", images=images, error=error)
+        library.save()
+        print(f"✅ Imported {model} intrinsics of lens '{args.name}' at {width}x{height}.")
+    elif not library.remove(args.name, args.resolution):
+        print(f"❌ No calibration of lens '{args.name}'" + (f" at {args.resolution}" if args.resolution else ""),
+              file=sys.stderr)
+        return 1
+    else:
+        library.save()
+        print(f"🗑️ Removed lens '{args.name}'" + (f" at {args.resolution}" if args.resolution else "") + ".")
+    return 0
+
+
+def flag_settings(args, *exclude):
+    skip = {"command", "config", *exclude}
+    return {key: value for key, value in vars(args).items() if key not in skip}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="methventrack",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    track = commands.add_parser("track", help="Track a single project")
+    track.add_argument("project", help="Project folder (created if missing)")
+    track.add_argument("--video", help="Source video to copy into the project")
+    track.add_argument("--export", help="Export the first model to this USD file")
+    track.add_argument("--threads", dest="num_threads", type=int, help="Thread budget (-1 uses every core)")
+    add_setting_flags(track)
+
+    batch = commands.add_parser("batch", help="Track every shot in a manifest")
+    batch.add_argument("manifest", help="JSON manifest of shots")
+    batch.add_argument("--jobs", type=int, help="Shots tracked at the same time")
+    batch.add_argument("--threads-per-job", dest="threads_per_job", type=int, help="CPU budget of each job")
+    add_setting_flags(batch)
+
+    compare = commands.add_parser("compare", help="Diff the run reports of two reconstructions")
+    compare.add_argument("before", help="Reconstruction folder or report.json")
+    compare.add_argument("after", help="Reconstruction folder or report.json")
+
+    plan = commands.add_parser("plan", help="Show the settings and estimated runtime of every preset")
+    plan.add_argument("source", help="Project folder or video")
+    plan.add_argument("--threads", dest="num_threads", type=int, help="Thread budget (-1 uses every core)")
+    plan.add_argument("--calibrate", action="store_true", help="Measure this machine again")
+
+    shard_worker = commands.add_parser("shard-worker", help="Run the pending shards of a sharded run")
+    shard_worker.add_argument("project", help="Project folder of the run, shared with the node running it")
+    shard_worker.add_argument("--threads", dest="num_threads", type=int, default=-1,
+                              help="Thread budget (-1 uses every core)")
+
+    lens = commands.add_parser("lens", help="List, import or remove lens calibrations")
+    lens_commands = lens.add_subparsers(dest="lens_command", required=True)
+    lens_commands.add_parser("list", help="List the calibrations of the lens library")
+    lens_import = lens_commands.add_parser("import", help="Add intrinsics from a grid shoot")
+    lens_import.add_argument("name", help="Lens name, e.g. 'A7S3 24mm'")
+    lens_import.add_argument("source", help="COLMAP model folder or JSON file with model, width, height and params")
+    lens_remove = lens_commands.add_parser("remove", help="Remove a lens or one of its resolutions")
+    lens_remove.add_argument("name")
+    lens_remove.add_argument("--resolution", help="Only remove this resolution, e.g. 1920x1080")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        from telemetry import load_report, compare_reports
+
+        for line in compare_reports(load_report(args.before), load_report(args.after)):
+            print(line)
+        return 0
+
+    if args.command == "lens":
+        return lens_command(args)
+
+    if args.command == "plan":
+        return plan_command(args)
+
+    if args.command == "shard-worker":
+        from sharding import work
+
+        ran = work(os.path.abspath(args.project), num_threads=args.num_threads)
+        print(f"✅ Ran {ran} shard(s), none left to claim.")
+        return 0
+
+    if args.command == "track":
+        file_settings = load_json(args.config) if args.config else {}
+        config = resolve_config(file_settings, flag_settings(args))
+        apply_preset(config, file_settings, flag_settings(args))
+        from checkpoints import TrackingCancelled
+
+        try:
+            track_shot(config, cancel=cancel_on_interrupt())
+        except TrackingCancelled:
+            print("⏹ Tracking cancelled, run the same command again to resume.", file=sys.stderr)
+            return 130
+        except Exception as e:
+            print(f"❌ Tracking failed: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    manifest = load_json(args.manifest)
+    if isinstance(manifest, list):
+        manifest = {"shots": manifest}
+
+    base_dir = os.path.dirname(os.path.abspath(args.manifest))
+    file_settings = load_json(args.config) if args.config else {}
+    overrides = flag_settings(args, "manifest", "jobs", "threads_per_job")
+
+    # Presets are planned for the threads each job gets, not for the whole machine.
+    jobs, threads_per_job = plan_jobs(len(manifest.get("shots", [])), args.jobs, args.threads_per_job)
+    shots = []
+    for shot in manifest.get("shots", []):
+        layers = (manifest.get("defaults", {}), file_settings, shot, overrides)
+        config = resolve_config(*layers)
+        if "project" not in config:
+            raise ValueError(f"Shot is missing 'project': {shot}")
+        # Relative paths in a manifest are relative to the manifest itself.
+        for key in ("project", "video", "export", "mattes"):
+            if config[key]:
+                config[key] = os.path.join(base_dir, config[key])
+        config["num_threads"] = threads_per_job
+        name = shot_name(config)
+        shots.append(apply_preset(config, *layers, log=lambda message: print(f"[{name}] {message}")))
+
+    failed = run_batch(shots, jobs, threads_per_job)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Direct reader of COLMAP binary models (cameras.bin, images.bin, points3D.bin).
+
+Loading a pycolmap.Reconstruction builds C++ objects for every observation
+and track element, and walking it from Python costs a binding call per point.
+This reader memory-maps the files and gathers the fixed-size part of every
+record into NumPy arrays: positions, colors, errors and track lengths of the
+points, poses of the images and camera intrinsics. Point tracks and 2D
+observations are skipped unless asked for.
+
+Models written by COLMAP 3.12+ only store registered images in images.bin.
+"""
+import mmap
+import os
+import struct
+
+import numpy as np
+
+# COLMAP camera model id: (name, number of parameters)
+CAMERA_MODELS = {
+    0: ("SIMPLE_PINHOLE", 3),
+    1: ("PINHOLE", 4),
+    2: ("SIMPLE_RADIAL", 4),
+    3: ("RADIAL", 5),
+    4: ("OPENCV", 8),
+    5: ("OPENCV_FISHEYE", 8),
+    6: ("FULL_OPENCV", 12),
+    7: ("FOV", 5),
+    8: ("SIMPLE_RADIAL_FISHEYE", 4),
+    9: ("RADIAL_FISHEYE", 5),
+    10: ("THIN_PRISM_FISHEYE", 12),
+    11: ("RAD_TAN_THIN_PRISM_FISHEYE", 16),
+}
+
+# Fixed part of a points3D.bin record, followed by track_length (image_id, point2D_idx) uint32 pairs.
+POINT_RECORD = np.dtype([
+    ("id", "<u8"), ("xyz", "<f8", 3), ("rgb", "u1", 3), ("error", "<f8"), ("track_length", "<u8"),
+])
+TRACK_ELEMENT_SIZE = 8
+# points2D of an images.bin record: x, y (double) and point3D_id (int64)
+POINT2D_SIZE = 24
+UINT64 = struct.Struct("<Q")
+# Records gathered per NumPy call: bounds the index arrays to a few MB.
+GATHER_CHUNK = 65536
+
+
+def map_file(path):
+    """Read-only memory map of a file (None for an empty file)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_count(path):
+    """Number of records of a binary model file, from its header alone."""
+    with open(path, "rb") as f:
+        header = f.read(UINT64.size)
+    return UINT64.unpack(header)[0] if len(header) == UINT64.size else 0
+
+
+def read_cameras(model_dir):
+    """{camera_id: {"model", "width", "height", "params"}} of cameras.bin."""
+    cameras = {}
+    with open(os.path.join(model_dir, "cameras.bin"), "rb") as f:
+        data = f.read()
+    offset = UINT64.size
+    for _ in range(UINT64.unpack_from(data)[0]):
+        camera_id, model_id, width, height = struct.unpack_from("<IiQQ", data, offset)
+        offset += 24
+        name, num_params = CAMERA_MODELS[model_id]
+        params = np.frombuffer(data, dtype="<f8", count=num_params, offset=offset).copy()
+        offset += 8 * num_params
+        cameras[camera_id] = {"model": name, "width": width, "height": height, "params": params}
+    return cameras
+
+
+def read_images(model_dir):
+    """
+    Return a dict of images.bin arrays in file order: ``ids`` and
+    ``camera_ids`` (N,), ``names`` (list), ``quats`` (N, 4) xyzw and
+    ``translations`` (N, 3) of the cam_from_world poses.
+    """
+    mapped = map_file(os.path.join(model_dir, "images.bin"))
+    count = UINT64.unpack_from(mapped)[0] if mapped is not None else 0
+    ids = np.empty(count, dtype=np.int64)
+    camera_ids = np.empty(count, dtype=np.int64)
+    poses = np.empty((count, 7), dtype=np.float64)
+    names = []
+    try:
+        offset = UINT64.size
+        for i in range(count):
+            ids[i] = struct.unpack_from("<I", mapped, offset)[0]
+            poses[i] = struct.unpack_from("<7d", mapped, offset + 4)
+            camera_ids[i] = struct.unpack_from("<I", mapped, offset + 60)[0]
+            end = mapped.find(b"\0", offset + 64)
+            names.append(mapped[offset + 64:end].decode("utf-8"))
+            num_points2D = UINT64.unpack_from(mapped, end + 1)[0]
+            offset = end + 1 + UINT64.size + num_points2D * POINT2D_SIZE
+    finally:
+        if mapped is not None:
+            mapped.close()
+    # COLMAP stores quaternions as wxyz, pycolmap and quat_to_matrix use xyzw.
+    return {
+        "ids": ids,
+        "names": names,
+        "camera_ids": camera_ids,
+        "quats": poses[:, [1, 2, 3, 0]],
+        "translations": poses[:, 4:],
+    }
+
+
+def record_offsets(mapped, count):
+    """Byte offset of every points3D.bin record; records are variable sized because of their tracks."""
+    offsets = np.empty(count, dtype=np.int64)
+    unpack = UINT64.unpack_from
+    length_offset = POINT_RECORD.fields["track_length"][1]
+    record_size = POINT_RECORD.itemsize
+    offset = UINT64.size
+    for i in range(count):
+        offsets[i] = offset
+        offset += record_size + unpack(mapped, offset + length_offset)[0] * TRACK_ELEMENT_SIZE
+    return offsets
+
+
+def gather(data, offsets, size, chunk_size=GATHER_CHUNK):
+    """(len(offsets), size) uint8 copy of the ``size`` bytes at every offset, gathered in chunks to bound memory."""
+    out = np.empty((len(offsets), size), dtype=np.uint8)
+    columns = np.arange(size)
+    for start in range(0, len(offsets), chunk_size):
+        out[start:start + chunk_size] = data[offsets[start:start + chunk_size, None] + columns]
+    return out
+
+
+def gather_points(mapped, with_tracks):
+    data = np.frombuffer(mapped, dtype=np.uint8)
+    offsets = record_offsets(mapped, UINT64.unpack_from(mapped)[0])
+    records = gather(data, offsets, POINT_RECORD.itemsize).view(POINT_RECORD).ravel()
+    tracks = None
+    if with_tracks:
+        lengths = records["track_length"].astype(np.int64)
+        starts = np.repeat(offsets + POINT_RECORD.itemsize, lengths)
+        # Each element's offset: its record's track start plus its rank in the track.
+        ranks = np.arange(len(starts)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        tracks = gather(data, starts + ranks * TRACK_ELEMENT_SIZE, TRACK_ELEMENT_SIZE).view("<u4")
+    return records, tracks
+
+
+def read_points3D(model_dir, with_tracks=False):
+    """
+    Return a dict of points3D.bin arrays: ``ids`` (N,), ``xyz`` (N, 3)
+    float64, ``rgb`` (N, 3) uint8, ``errors`` (N,) and ``track_lengths``
+    (N,). With ``with_tracks``, also ``tracks``, the (M, 2) uint32
+    (image_id, point2D_idx) pairs of every track in point order.
+    """
+    mapped = map_file(os.path.join(model_dir, "points3D.bin"))
+    if mapped is None:
+        records, tracks = np.empty(0, dtype=POINT_RECORD), np.empty((0, 2), dtype=np.uint32)
+    else:
+        try:
+            records, tracks = gather_points(mapped, with_tracks)
+        finally:
+            mapped.close()
+
+    points = {
+        "ids": records["id"].astype(np.int64),
+        "xyz": records["xyz"],
+        "rgb": records["rgb"],
+        "errors": records["error"],
+        "track_lengths": records["track_length"].astype(np.int64),
+    }
+    if with_tracks:
+        points["tracks"] = tracks
+    return points
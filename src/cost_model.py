@@ -0,0 +1,230 @@
+"""
+Runtime estimates of the tracking stages, before a run.
+
+Each stage costs a number of work units (megapixels decoded, megapixels
+searched for SIFT features, image pairs matched, images mapped) times a per
+unit cost measured on real footage on a reference machine. A micro-benchmark
+(one SIFT extraction and a small exhaustive matching on a synthetic texture,
+a few seconds) measures how much slower or faster this machine is, and is
+cached per machine in ``~/.methventrack/cost_model.json``
+(``METHVENTRACK_COST_MODEL`` points elsewhere).
+
+Estimates are meant to tell minutes from hours, not to be exact.
+"""
+import json
+import math
+import os
+import platform
+import tempfile
+import time
+
+MODEL_FILE = os.path.join("~", ".methventrack", "cost_model.json")
+
+# Single core seconds on the reference machine, measured on 480x270 footage
+# with about 2900 features per image.
+REFERENCE = {
+    "frames_per_mp": 0.07,       # decode and write the JPEG plates, per megapixel
+    "features_per_mp": 5.8,      # SIFT extraction, per megapixel
+    "match_per_pair": 0.025,     # matching and verification of one pair at REFERENCE_FEATURES
+    "incremental": 0.28,         # x images^1.5
+    "global": 0.43,              # x images^1.2 (pose averaging and the final bundle adjustments)
+    "register_per_image": 0.3,   # registering one non keyframe
+    "masks_per_frame": 0.07,     # motion masks, analysed at 320 pixels wide
+    # The micro-benchmark on the same machine
+    "benchmark_sift": 1.2,
+    "benchmark_match": 0.97,
+}
+REFERENCE_FEATURES = 2900
+# SIFT features per megapixel, up to COLMAP's default cap.
+FEATURES_PER_MP = 22000
+MAX_FEATURES = 8192
+# COLMAP downscales larger images to this longest side before extracting features.
+MAX_IMAGE_SIZE = 3200
+# Fraction of the cores a parallel stage keeps busy.
+PARALLEL_EFFICIENCY = 0.7
+BENCHMARK_SIZE = (640, 360)
+BENCHMARK_IMAGES = 4
+BENCHMARK_FEATURES = 1024
+
+
+def model_path():
+    return os.path.expanduser(os.environ.get("METHVENTRACK_COST_MODEL") or MODEL_FILE)
+
+
+def synthetic_texture(width, height, seed=0):
+    """Multi-scale block noise: textured enough for SIFT at every octave."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    image = np.zeros((height, width), dtype=np.float32)
+    for size in (4, 16, 64):
+        blocks = rng.random((height // size + 2, width // size + 2)).astype(np.float32)
+        image += np.kron(blocks, np.ones((size, size), dtype=np.float32))[:height, :width]
+    image -= image.min()
+    return (image * (255.0 / image.max())).astype(np.uint8)
+
+
+def run_benchmark():
+    """Single thread seconds of one SIFT extraction and of a small exhaustive matching."""
+    import numpy as np
+    import pycolmap
+
+    width, height = BENCHMARK_SIZE
+    texture = synthetic_texture(width + 40 * BENCHMARK_IMAGES, height)
+
+    options = pycolmap.FeatureExtractionOptions(num_threads=1)
+    start = time.perf_counter()
+    pycolmap.Sift(options, device=pycolmap.Device.cpu).extract(np.ascontiguousarray(texture[:, :width]))
+    sift_seconds = time.perf_counter() - start
+
+    options.sift.max_num_features = BENCHMARK_FEATURES
+    sift = pycolmap.Sift(options, device=pycolmap.Device.cpu)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "benchmark.db")
+        with pycolmap.Database.open(db_path) as db:
+            camera_id = db.write_camera(pycolmap.Camera.create(
+                1, pycolmap.CameraModelId.SIMPLE_RADIAL, 1.2 * width, width, height
+            ))
+            sensor = pycolmap.sensor_t(type=pycolmap.SensorType.CAMERA, id=camera_id)
+            rig = pycolmap.Rig()
+            rig.add_ref_sensor(sensor)
+            rig_id = db.write_rig(rig)
+            # Overlapping crops of one texture, like a panning camera.
+            for i in range(BENCHMARK_IMAGES):
+                keypoints, descriptors = sift.extract(np.ascontiguousarray(texture[:, 40 * i:40 * i + width]))
+                image_id = db.write_image(pycolmap.Image(name=f"{i}.png", camera_id=camera_id))
+                frame = pycolmap.Frame(rig_id=rig_id)
+                frame.add_data_id(pycolmap.data_t(sensor_id=sensor, id=image_id))
+                db.write_frame(frame)
+                db.write_keypoints(image_id, keypoints)
+                db.write_descriptors(image_id, descriptors)
+        start = time.perf_counter()
+        pycolmap.match_exhaustive(
+            database_path=db_path, matching_options=pycolmap.FeatureMatchingOptions(num_threads=1)
+        )
+        match_seconds = time.perf_counter() - start
+    return {"benchmark_sift": round(sift_seconds, 4), "benchmark_match": round(match_seconds, 4)}
+
+
+class CostModel:
+    """Per unit stage costs on this machine, from the cached (or a new) micro-benchmark."""
+
+    def __init__(self, path=None, calibrate=False, log=print):
+        self.path = path or model_path()
+        self.data = None
+        if not calibrate and os.path.isfile(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("machine") == platform.node():
+                    self.data = data
+            except (OSError, ValueError):
+                pass
+        if self.data is None:
+            log("⏱️ Measuring this machine for runtime estimates…")
+            self.data = {"machine": platform.node(), **run_benchmark()}
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def cost(self, key):
+        """Single core seconds of one unit of ``key`` on this machine."""
+        sift = self.data["benchmark_sift"] / REFERENCE["benchmark_sift"]
+        match = self.data["benchmark_match"] / REFERENCE["benchmark_match"]
+        if key.startswith("match"):
+            slowdown = match
+        elif key.startswith(("features", "masks")):
+            slowdown = sift
+        else:
+            slowdown = math.sqrt(sift * match)
+        return REFERENCE[key] * slowdown
+
+    def estimate(self, clip, settings, cores=None):
+        """
+        {stage: seconds} of a run with ``settings`` (the CLI config keys) on a
+        clip described by ``presets.probe_clip``.
+        """
+        cores = cores or clip.get("cores") or os.cpu_count() or 1
+        parallel = max(1.0, cores * PARALLEL_EFFICIENCY)
+        frames = clip["frames"]
+        scale = settings.get("proxy_scale") or 1.0
+        plate_mp = clip["width"] * clip["height"] / 1e6
+        longest = max(clip["width"], clip["height"]) * scale
+        mp = plate_mp * scale * scale * min(1.0, MAX_IMAGE_SIZE / longest) ** 2
+        features = min(MAX_FEATURES, FEATURES_PER_MP * mp)
+        mapped = keyframe_count(clip, settings)
+
+        stages = {}
+        if settings.get("motion_masks"):
+            stages["masks"] = frames * (self.cost("masks_per_frame") + plate_mp * self.cost("frames_per_mp"))
+        stages["frames"] = frames * plate_mp * self.cost("frames_per_mp") / parallel
+        stages["features"] = frames * mp * self.cost("features_per_mp") / parallel
+        pair_cost = self.cost("match_per_pair") * (features / REFERENCE_FEATURES) ** 2
+        stages["matching"] = match_pairs(mapped, settings) * pair_cost / parallel
+        stages["mapping"] = self.mapping_seconds(mapped, features, settings, cores)
+        if mapped < frames:
+            stages["register"] = (frames - mapped) * self.cost("register_per_image")
+        return stages
+
+    def mapping_seconds(self, images, features, settings, cores):
+        """Bundle adjustment is only partly parallel: the core count helps with its square root."""
+        feature_factor = features / REFERENCE_FEATURES
+        speedup = math.sqrt(cores)
+        mapper = settings.get("mapper") or "incremental"
+        if mapper == "global":
+            return self.cost("global") * images ** 1.2 * feature_factor / speedup
+        if mapper == "chunked":
+            size = min(settings.get("chunk_size") or 300, images)
+            overlap = min(settings.get("chunk_overlap") or 30, size - 1)
+            chunks = max(1, math.ceil((images - overlap) / (size - overlap)))
+            jobs = max(1, min(cores, chunks))
+            chunk = self.cost("incremental") * size ** 1.5 * feature_factor
+            refine = self.cost("global") * images ** 1.2 * feature_factor / speedup
+            return math.ceil(chunks / jobs) * chunk / math.sqrt(max(1, cores // jobs)) + refine
+        return self.cost("incremental") * images ** 1.5 * feature_factor / speedup
+
+
+def keyframe_count(clip, settings):
+    """Frames that are matched and mapped: with keyframes, about one per ``keyframe_motion`` of motion."""
+    frames = clip["frames"]
+    if not settings.get("keyframes"):
+        return frames
+    motion = clip.get("motion") or 0.0
+    step = (settings.get("keyframe_motion") or 0.05) / max(motion, 1e-6)
+    return max(2, min(frames, math.ceil(frames / max(step, 1.0))))
+
+
+def match_pairs(images, settings):
+    """Image pairs the matcher of ``settings`` compares."""
+    match_type = settings.get("match_type") or "exhaustive"
+    overlap = min(settings.get("overlap") or 15, images - 1)
+    if match_type == "exhaustive":
+        return images * (images - 1) / 2
+    if match_type == "sequential":
+        # COLMAP also matches frames 2^k apart (quadratic overlap).
+        return images * (overlap + math.log2(max(images, 2)))
+    if match_type == "spatial":
+        return images * min(settings.get("max_num_neighbors") or 50, images - 1)
+    if match_type == "retrieval":
+        return images * min(overlap + (settings.get("retrieval_neighbors") or 8), images - 1)
+    raise ValueError(f"Unknown match type: {match_type}")
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}min"
+    return f"{seconds / 3600:.1f}h"
+
+
+def format_estimate(stages):
+    """One line: total and per stage estimates."""
+    total = sum(stages.values())
+    parts = ", ".join(f"{stage} {format_duration(seconds)}" for stage, seconds in stages.items())
+    return f"~{format_duration(total)} ({parts})"
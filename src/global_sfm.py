@@ -0,0 +1,451 @@
+"""
+Global structure-from-motion.
+
+Instead of adding images one at a time, the focal length is self-calibrated
+from the fundamental matrices, all camera rotations are solved at once by
+rotation averaging over the verified image pairs, then all camera positions
+at once by translation averaging. The posed cameras are
+triangulated against the database and refined by a single global bundle
+adjustment.
+"""
+import heapq
+import os
+
+import numpy as np
+import pycolmap
+
+from checkpoints import check_cancelled
+from mappers import refine_model
+
+# Two-view configurations with a usable relative pose.
+POSE_CONFIGS = {
+    int(pycolmap.TwoViewGeometryConfiguration.CALIBRATED),
+    int(pycolmap.TwoViewGeometryConfiguration.UNCALIBRATED),
+    int(pycolmap.TwoViewGeometryConfiguration.PLANAR),
+    int(pycolmap.TwoViewGeometryConfiguration.PLANAR_OR_PANORAMIC),
+}
+# Two-view configurations whose fundamental matrix is used for self-calibration.
+FUNDAMENTAL_CONFIGS = {
+    int(pycolmap.TwoViewGeometryConfiguration.UNCALIBRATED),
+    int(pycolmap.TwoViewGeometryConfiguration.PLANAR_OR_PANORAMIC),
+}
+MIN_PAIR_INLIERS = 30
+MIN_CALIBRATION_PAIRS = 10
+CALIBRATION_SCALE = 0.01
+# Robust scale of the epipolar residual (sine of the angle) when re-estimating directions.
+EPIPOLAR_SCALE = 0.002
+# Pairs with less parallax only constrain rotations, not translation directions.
+MIN_TRANSLATION_ANGLE = np.deg2rad(1.0)
+# Angular scale of the robust (Cauchy) weights.
+ROTATION_SCALE = np.deg2rad(5.0)
+DIRECTION_SCALE = np.deg2rad(10.0)
+MAX_ROTATION_RESIDUAL = np.deg2rad(15.0)
+
+
+def project_to_rotation(matrices):
+    """Nearest rotation matrices (N, 3, 3) in the Frobenius sense."""
+    u, _, vt = np.linalg.svd(matrices)
+    det = np.sign(np.linalg.det(u @ vt))
+    u[:, :, -1] *= det[:, None]
+    return u @ vt
+
+
+def rotation_angle(matrices):
+    cos = (np.trace(matrices, axis1=1, axis2=2) - 1.0) / 2.0
+    return np.arccos(np.clip(cos, -1.0, 1.0))
+
+
+def focal_cost(focal, principal_point, fundamentals):
+    """Robust sum of how far each E = K^T F K is from having two equal singular values."""
+    K = np.array([[focal, 0, principal_point[0]], [0, focal, principal_point[1]], [0, 0, 1]])
+    singular = np.linalg.svd(K.T @ fundamentals @ K, compute_uv=False)
+    residual = ((singular[:, 0] - singular[:, 1]) / np.maximum(singular[:, 0] + singular[:, 1], 1e-12)) ** 2
+    return np.sum(residual / (1.0 + residual / CALIBRATION_SCALE))
+
+
+def calibrate_focal(camera, fundamentals):
+    """Focal length (pixels) that best turns the fundamental matrices into essential matrices."""
+    principal_point = (camera.principal_point_x, camera.principal_point_y)
+    prior = camera.mean_focal_length()
+    grid = prior * np.exp(np.linspace(np.log(0.25), np.log(4.0), 49))
+    costs = [focal_cost(f, principal_point, fundamentals) for f in grid]
+    best = int(np.argmin(costs))
+    low, high = grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)]
+
+    # Golden section search inside the best grid cell pair.
+    ratio = (np.sqrt(5) - 1) / 2
+    for _ in range(30):
+        a, b = high - ratio * (high - low), low + ratio * (high - low)
+        if focal_cost(a, principal_point, fundamentals) < focal_cost(b, principal_point, fundamentals):
+            high = b
+        else:
+            low = a
+    return (low + high) / 2
+
+
+def calibrate_cameras(cameras, images, pair_ids, geometries, log=print):
+    """
+    Self-calibrate the focal length of cameras without a focal length prior
+    from the fundamental matrices of pairs seen by that camera only, like
+    GLOMAP's view graph calibration. Updates ``cameras`` in place.
+    """
+    for camera_id, camera in cameras.items():
+        if camera.has_prior_focal_length:
+            continue
+        fundamentals = [
+            geometry.F for pair_id, geometry in zip(pair_ids, geometries)
+            if int(geometry.config) in FUNDAMENTAL_CONFIGS
+            and len(geometry.inlier_matches) >= MIN_PAIR_INLIERS
+            and all(images[i].camera_id == camera_id for i in pycolmap.pair_id_to_image_pair(pair_id))
+        ]
+        if len(fundamentals) < MIN_CALIBRATION_PAIRS:
+            continue
+        prior = camera.mean_focal_length()
+        focal = calibrate_focal(camera, np.asarray(fundamentals))
+        for idx in camera.focal_length_idxs():
+            camera.params[idx] = focal
+        log(f"🔭 Camera {camera_id}: focal length {prior:.0f}px -> {focal:.0f}px from {len(fundamentals)} pair(s).")
+
+
+def relative_poses(db, log=print):
+    """
+    Relative poses of the verified pairs, after self-calibrating the cameras.
+    Returns the calibrated cameras by id and a dict of arrays: image ``pairs``
+    (M, 2), ``rotations`` R_21 (M, 3, 3), unit ``translations`` t_21 (M, 3),
+    inlier counts ``weights`` (M,), triangulation ``angles`` (M,) and the
+    normalized inlier ``rays`` of both images per pair.
+    """
+    cameras = {camera.camera_id: camera for camera in db.read_all_cameras()}
+    images = {image.image_id: image for image in db.read_all_images()}
+    pair_ids, geometries = db.read_two_view_geometries()
+    calibrate_cameras(cameras, images, pair_ids, geometries, log=log)
+    keypoints = {}
+
+    def points(image_id):
+        if image_id not in keypoints:
+            keypoints[image_id] = db.read_keypoints(image_id)[:, :2].astype(np.float64)
+        return keypoints[image_id]
+
+    def rays(image_id, idx):
+        camera = cameras[images[image_id].camera_id]
+        xy = camera.cam_from_img(points(image_id)[idx])
+        return np.hstack([xy, np.ones((len(xy), 1))])
+
+    result = {"pairs": [], "rotations": [], "translations": [], "weights": [], "angles": [], "rays": []}
+    for pair_id, geometry in zip(pair_ids, geometries):
+        if int(geometry.config) not in POSE_CONFIGS or len(geometry.inlier_matches) < MIN_PAIR_INLIERS:
+            continue
+        id1, id2 = pycolmap.pair_id_to_image_pair(pair_id)
+        matches = geometry.inlier_matches
+        ok = pycolmap.estimate_two_view_geometry_pose(
+            cameras[images[id1].camera_id], points(id1)[matches[:, 0]],
+            cameras[images[id2].camera_id], points(id2)[matches[:, 1]],
+            geometry
+        )
+        if not ok:
+            continue
+        pose = geometry.cam2_from_cam1
+        R = pose.rotation.matrix()
+        rays1, rays2 = rays(id1, matches[:, 0]), rays(id2, matches[:, 1])
+        # The sign of the decomposed translation is not reliable across
+        # configurations, so settle it with the cheirality of the inliers.
+        t = cheiral_translation(R, np.asarray(pose.translation, dtype=np.float64), rays1, rays2)
+        result["pairs"].append((id1, id2))
+        result["rotations"].append(R)
+        result["translations"].append(t / max(np.linalg.norm(t), 1e-12))
+        result["weights"].append(len(matches))
+        result["angles"].append(geometry.tri_angle)
+        result["rays"].append((rays1, rays2))
+
+    log(f"🔗 {len(result['pairs'])} usable relative pose(s) out of {len(pair_ids)} verified pair(s).")
+    result["pairs"] = np.asarray(result["pairs"], dtype=np.int64).reshape(-1, 2)
+    result["rotations"] = np.asarray(result["rotations"], dtype=np.float64).reshape(-1, 3, 3)
+    result["translations"] = np.asarray(result["translations"], dtype=np.float64).reshape(-1, 3)
+    result["weights"] = np.asarray(result["weights"], dtype=np.float64)
+    result["angles"] = np.asarray(result["angles"], dtype=np.float64)
+    return cameras, result
+
+
+def point_depths(R, t, rays1, rays2):
+    """Depths (lambda1, lambda2) with lambda2 * x2 = R (lambda1 * x1) + t, least squares per match."""
+    a = rays1 @ R.T
+    b = rays2
+    # Normal equations of || lambda1 a + t - lambda2 b ||^2, solved in closed form per row.
+    aa, bb, ab = np.sum(a * a, axis=1), np.sum(b * b, axis=1), np.sum(a * b, axis=1)
+    at, bt = a @ t, b @ t
+    det = np.maximum(aa * bb - ab * ab, 1e-12)
+    depth1 = (ab * bt - bb * at) / det
+    depth2 = (aa * bt - ab * at) / det
+    return depth1, depth2
+
+
+def cheiral_translation(R, t, rays1, rays2):
+    """Return ``t`` or ``-t``, whichever puts most matched points in front of both cameras."""
+    depth1, depth2 = point_depths(R, t, rays1, rays2)
+    in_front = np.count_nonzero((depth1 > 0) & (depth2 > 0))
+    behind = np.count_nonzero((depth1 < 0) & (depth2 < 0))
+    return t if in_front >= behind else -t
+
+
+def translation_direction(R, rays1, rays2, iterations=5):
+    """
+    Unit t_21 for a known relative rotation: every match gives the epipolar
+    constraint t . (R x1 x x2) = 0, solved by robust (IRLS) total least squares.
+    """
+    normals = np.cross(rays1 @ R.T, rays2)
+    normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+    weights = np.ones(len(normals))
+    for _ in range(iterations):
+        _, _, vt = np.linalg.svd(normals * weights[:, None], full_matrices=False)
+        t = vt[-1]
+        residual = np.abs(normals @ t)
+        weights = 1.0 / np.sqrt(1.0 + (residual / EPIPOLAR_SCALE) ** 2)
+    return cheiral_translation(R, t, rays1, rays2)
+
+
+def spanning_tree_rotations(num_nodes, edges, rotations, weights):
+    """Initial absolute rotations by chaining along a maximum spanning tree."""
+    neighbours = [[] for _ in range(num_nodes)]
+    for k, (i, j) in enumerate(edges):
+        neighbours[i].append((k, j, False))
+        neighbours[j].append((k, i, True))
+
+    root = int(np.argmax([len(n) for n in neighbours]))
+    absolute = np.full((num_nodes, 3, 3), np.nan)
+    absolute[root] = np.eye(3)
+    heap = [(-weights[k], k, root, j, inverse) for k, j, inverse in neighbours[root]]
+    heapq.heapify(heap)
+    while heap:
+        _, k, i, j, inverse = heapq.heappop(heap)
+        if not np.isnan(absolute[j, 0, 0]):
+            continue
+        # R_j = R_ij R_i for an edge stored as i -> j.
+        R = rotations[k].T if inverse else rotations[k]
+        absolute[j] = R @ absolute[i]
+        for k2, n, inv2 in neighbours[j]:
+            if np.isnan(absolute[n, 0, 0]):
+                heapq.heappush(heap, (-weights[k2], k2, j, n, inv2))
+    return absolute
+
+
+def average_rotations(num_nodes, edges, rotations, weights, iterations=50):
+    """Robust chordal rotation averaging (IRLS Jacobi sweeps from a spanning tree)."""
+    absolute = spanning_tree_rotations(num_nodes, edges, rotations, weights)
+    i, j = edges[:, 0], edges[:, 1]
+
+    for _ in range(iterations):
+        # Residual of each edge: R_ij R_i R_j^T should be identity.
+        residual = rotation_angle(rotations @ absolute[i] @ absolute[j].transpose(0, 2, 1))
+        robust = weights / (1.0 + (residual / ROTATION_SCALE) ** 2)
+
+        estimate = np.zeros((num_nodes, 3, 3))
+        np.add.at(estimate, j, robust[:, None, None] * (rotations @ absolute[i]))
+        np.add.at(estimate, i, robust[:, None, None] * (rotations.transpose(0, 2, 1) @ absolute[j]))
+        updated = project_to_rotation(estimate)
+        if np.max(rotation_angle(updated @ absolute.transpose(0, 2, 1))) < 1e-7:
+            absolute = updated
+            break
+        absolute = updated
+
+    residual = rotation_angle(rotations @ absolute[i] @ absolute[j].transpose(0, 2, 1))
+    return absolute, residual
+
+
+def solve_baselines(num_nodes, edges, directions, weights, free, anchor, centers, iterations=500):
+    """
+    Weighted least squares centers for c_j - c_i = s_ij d_ij with one node held
+    at zero: s_ij = 1 on fixed edges, while a ``free`` edge only penalizes the
+    part of its baseline off d_ij. Block Jacobi preconditioned conjugate
+    gradient, started from ``centers``.
+    """
+    i, j = edges[:, 0], edges[:, 1]
+    d = directions[free]
+
+    def apply(x):
+        diff = x[j] - x[i]
+        diff[free] -= d * np.sum(diff[free] * d, axis=1, keepdims=True)
+        diff *= weights[:, None]
+        out = np.column_stack([
+            np.bincount(j, diff[:, k], num_nodes) - np.bincount(i, diff[:, k], num_nodes) for k in range(3)
+        ])
+        out[anchor] = x[anchor]
+        return out
+
+    term = np.where(free[:, None], 0.0, weights[:, None] * directions)
+    b = np.column_stack([
+        np.bincount(j, term[:, k], num_nodes) - np.bincount(i, term[:, k], num_nodes) for k in range(3)
+    ])
+    b[anchor] = 0.0
+
+    # Each node's 3x3 block of the operator, inverted.
+    blocks = np.broadcast_to(np.eye(3), (len(edges), 3, 3)).copy()
+    blocks[free] -= d[:, :, None] * d[:, None, :]
+    blocks = (weights[:, None, None] * blocks).reshape(-1, 9)
+    diagonal = np.column_stack([
+        np.bincount(i, blocks[:, k], num_nodes) + np.bincount(j, blocks[:, k], num_nodes) for k in range(9)
+    ]).reshape(-1, 3, 3)
+    diagonal[anchor] = np.eye(3)
+    inverse = np.linalg.inv(diagonal + 1e-12 * np.eye(3))
+
+    x = centers.copy()
+    x[anchor] = 0.0
+    r = b - apply(x)
+    z = np.einsum("nab,nb->na", inverse, r)
+    p = z.copy()
+    rz = np.sum(r * z)
+    tolerance = 1e-24 * max(np.sum(b * b), 1e-30)
+    for _ in range(iterations):
+        if np.sum(r * r) <= tolerance or rz <= 0.0:
+            break
+        Ap = apply(p)
+        alpha = rz / max(np.sum(p * Ap), 1e-30)
+        x += alpha * p
+        r -= alpha * Ap
+        z = np.einsum("nab,nb->na", inverse, r)
+        rz_new = np.sum(r * z)
+        p = z + (rz_new / rz) * p
+        rz = rz_new
+    return x
+
+
+def average_translations(num_nodes, edges, directions, weights, iterations=30):
+    """
+    Camera centers from unit world directions c_j - c_i ~ d_ij: least squares
+    on c_j - c_i = s_ij d_ij with edge scales s_ij >= 1, which fix the global
+    scale. Alternates between a solve for the centers with the scales above 1
+    left free (so each solve finds centers and scales together) and updating
+    which scales are free and the robust weights.
+    """
+    i, j = edges[:, 0], edges[:, 1]
+    anchor = int(np.bincount(edges.ravel(), minlength=num_nodes).argmax())
+    centers = np.zeros((num_nodes, 3))
+    free = np.zeros(len(edges), bool)
+    robust = weights.copy()
+
+    for _ in range(iterations):
+        previous = centers
+        centers = solve_baselines(num_nodes, edges, directions, robust, free, anchor, centers)
+        if np.max(np.abs(centers - previous)) < 1e-9 * max(np.max(np.abs(centers)), 1.0):
+            break
+
+        baseline = centers[j] - centers[i]
+        along = np.sum(baseline * directions, axis=1)
+        free = along > 1.0
+        # The shortest baseline keeps its scale at 1, or the centers could all shrink together.
+        free[np.argmin(along)] = False
+        length = np.maximum(np.linalg.norm(baseline, axis=1), 1e-12)
+        angle = np.arccos(np.clip(along / length, -1.0, 1.0))
+        robust = weights / (1.0 + (angle / DIRECTION_SCALE) ** 2)
+
+    return centers
+
+
+def largest_component(num_nodes, edges):
+    """Boolean mask of the nodes in the largest connected component."""
+    parent = np.arange(num_nodes)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in edges:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[ra] = rb
+    roots = np.array([find(x) for x in range(num_nodes)])
+    return roots == np.bincount(roots).argmax()
+
+
+def solve_global_poses(db_path, log=print):
+    """
+    Return the self-calibrated cameras by id and {image_id: cam_from_world
+    Rigid3d} for the largest solvable component.
+    """
+    with pycolmap.Database.open(db_path) as db:
+        cameras, relative = relative_poses(db, log=log)
+
+    if len(relative["pairs"]) == 0:
+        return cameras, {}
+
+    image_ids, edges = np.unique(relative["pairs"], return_inverse=True)
+    edges = edges.reshape(-1, 2)
+    keep = largest_component(len(image_ids), edges)
+    edge_mask = keep[edges[:, 0]] & keep[edges[:, 1]]
+    image_ids = image_ids[keep]
+    remap = np.cumsum(keep) - 1
+    edges = remap[edges[edge_mask]]
+    rotations, weights, angles = relative["rotations"][edge_mask], relative["weights"][edge_mask], \
+        relative["angles"][edge_mask]
+    rays = [r for r, kept in zip(relative["rays"], edge_mask) if kept]
+    num_nodes = len(image_ids)
+
+    log(f"🧭 Averaging rotations of {num_nodes} image(s) over {len(edges)} pair(s)…")
+    absolute, residual = average_rotations(num_nodes, edges, rotations, weights)
+
+    # Re-estimate every translation direction with the averaged rotations,
+    # which are far more reliable than the two-view decompositions.
+    usable = np.nonzero((residual < MAX_ROTATION_RESIDUAL) & (angles > MIN_TRANSLATION_ANGLE))[0]
+    t_edges = edges[usable]
+    directions = np.empty((len(usable), 3))
+    for row, k in enumerate(usable):
+        i, j = edges[k]
+        R = absolute[j] @ absolute[i].T
+        t = translation_direction(R, *rays[k])
+        # World direction of the baseline: c_j - c_i = -R_j^T t_ij.
+        directions[row] = -absolute[j].T @ t
+
+    t_keep = largest_component(num_nodes, t_edges) if len(t_edges) else np.zeros(num_nodes, bool)
+    t_mask = t_keep[t_edges[:, 0]] & t_keep[t_edges[:, 1]]
+    log(f"📐 Averaging translations of {int(t_keep.sum())} image(s) over {int(t_mask.sum())} pair(s)…")
+    if not t_mask.any():
+        return cameras, {}
+    t_remap = np.cumsum(t_keep) - 1
+    centers = average_translations(
+        int(t_keep.sum()), t_remap[t_edges[t_mask]], directions[t_mask], weights[usable][t_mask]
+    )
+
+    poses = {}
+    for node, image_id in enumerate(image_ids):
+        if not t_keep[node]:
+            continue
+        R = absolute[node]
+        t = -R @ centers[t_remap[node]]
+        poses[int(image_id)] = pycolmap.Rigid3d(pycolmap.Rotation3d(R), t)
+    return cameras, poses
+
+
+def global_mapping(db_path, frames_path, output_path, num_threads=-1, extract_colors=True, log=print, cancel=None,
+                   refine_intrinsics=True):
+    """Global SfM of ``db_path`` into ``output_path/0``; returns the number of models."""
+    cameras, poses = solve_global_poses(db_path, log=log)
+    check_cancelled(cancel)
+    if len(poses) < 2:
+        log("⚠️ Global mapping could not pose enough images.")
+        return 0
+
+    reconstruction = pycolmap.Reconstruction()
+    with pycolmap.Database.open(db_path) as db:
+        for camera in cameras.values():
+            reconstruction.add_camera(camera)
+        for rig in db.read_all_rigs():
+            reconstruction.add_rig(rig)
+        # Database images do not carry their frame id, the frames list their images instead.
+        frames = {data_id.id: frame for frame in db.read_all_frames() for data_id in frame.data_ids}
+        for image in db.read_all_images():
+            if image.image_id not in poses:
+                continue
+            frame = frames[image.image_id]
+            # Single-camera rigs: the rig pose is the camera pose.
+            frame.rig_from_world = poses[image.image_id]
+            reconstruction.add_frame(frame)
+            image.frame_id = frame.frame_id
+            reconstruction.add_image(image)
+            reconstruction.register_frame(frame.frame_id)
+
+    model_dir = os.path.join(output_path, "0")
+    os.makedirs(model_dir, exist_ok=True)
+    refine_model(reconstruction, db_path, frames_path, model_dir, num_threads=num_threads,
+                 extract_colors=extract_colors, log=log, refine_intrinsics=refine_intrinsics)
+    return 1
@@ -0,0 +1,248 @@
+"""
+Adaptive keyframe selection.
+
+Frames are compared with the last keyframe using a subset of their SIFT
+features: once the median image motion or the loss of shared features
+passes a threshold, the frame becomes a new keyframe. Only keyframes are
+matched and mapped; every other frame is registered to the finished model
+afterwards (or has its pose interpolated) so the export still has a pose
+for every frame.
+"""
+import os
+
+import numpy as np
+import pycolmap
+
+# Features used per frame to measure motion; the largest-scale ones are kept.
+MOTION_FEATURES = 1024
+# Features per frame matched against the model when registering it.
+REGISTRATION_FEATURES = 4096
+MATCH_RATIO = 0.8
+MIN_REGISTRATION_INLIERS = 30
+
+
+def strongest_indices(keypoints, limit):
+    """Indices of the ``limit`` largest-scale keypoints (all of them if there are fewer)."""
+    if len(keypoints) <= limit:
+        return np.arange(len(keypoints))
+    scale = np.hypot(keypoints[:, 2], keypoints[:, 4]) if keypoints.shape[1] >= 6 else np.ones(len(keypoints))
+    return np.argsort(-scale, kind="stable")[:limit]
+
+
+def normalize_descriptors(descriptors):
+    descriptors = descriptors.astype(np.float32)
+    descriptors /= np.maximum(np.linalg.norm(descriptors, axis=1, keepdims=True), 1e-6)
+    return descriptors
+
+
+def strongest_features(keypoints, descriptors, limit):
+    """Keep the ``limit`` largest-scale features, with L2-normalized float descriptors."""
+    if len(keypoints) > limit:
+        keep = strongest_indices(keypoints, limit)
+        keypoints, descriptors = keypoints[keep], descriptors[keep]
+    return keypoints[:, :2].astype(np.float64), normalize_descriptors(descriptors)
+
+
+def match_descriptors(desc1, desc2, ratio=MATCH_RATIO):
+    """Mutual nearest neighbour matches passing the ratio test, as an (M, 2) index array."""
+    if len(desc1) < 2 or len(desc2) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    similarity = desc1 @ desc2.T
+    # For unit vectors, distance^2 = 2 - 2 * similarity.
+    top2 = np.argpartition(-similarity, 1, axis=1)[:, :2]
+    best = np.take_along_axis(similarity, top2, axis=1)
+    order = np.argsort(-best, axis=1)
+    best = np.take_along_axis(best, order, axis=1)
+    nearest = np.take_along_axis(top2, order, axis=1)[:, 0]
+
+    d1 = np.sqrt(np.maximum(2 - 2 * best[:, 0], 0))
+    d2 = np.sqrt(np.maximum(2 - 2 * best[:, 1], 0))
+    passes = d1 < ratio * d2
+    mutual = np.argmax(similarity, axis=0)[nearest] == np.arange(len(desc1))
+
+    idx1 = np.nonzero(passes & mutual)[0]
+    return np.stack([idx1, nearest[idx1]], axis=1)
+
+
+def select_keyframes(db_path, min_motion=0.05, min_overlap=0.5, log=print):
+    """
+    Return the names of the keyframes in ``db_path``, in frame order.
+    ``min_motion`` is the median feature displacement, as a fraction of the
+    image diagonal, that starts a new keyframe. ``min_overlap`` is the fraction
+    of the keyframe's features that must still match before one is forced.
+    """
+    with pycolmap.Database.open(db_path) as db:
+        images = sorted(db.read_all_images(), key=lambda image: image.name)
+        cameras = {camera.camera_id: camera for camera in db.read_all_cameras()}
+
+        def load(image):
+            return strongest_features(
+                db.read_keypoints(image.image_id), db.read_descriptors(image.image_id), MOTION_FEATURES
+            )
+
+        if len(images) <= 2:
+            return [image.name for image in images]
+
+        keyframes = [images[0].name]
+        ref_xy, ref_desc = load(images[0])
+
+        for image in images[1:]:
+            camera = cameras[image.camera_id]
+            diagonal = np.hypot(camera.width, camera.height)
+            xy, desc = load(image)
+            matches = match_descriptors(ref_desc, desc)
+
+            overlap = len(matches) / max(1, min(len(ref_desc), len(desc)))
+            if len(matches):
+                motion = np.median(np.linalg.norm(ref_xy[matches[:, 0]] - xy[matches[:, 1]], axis=1)) / diagonal
+            else:
+                motion = np.inf
+
+            if motion >= min_motion or overlap < min_overlap:
+                keyframes.append(image.name)
+                ref_xy, ref_desc = xy, desc
+
+        if keyframes[-1] != images[-1].name:
+            keyframes.append(images[-1].name)
+
+    log(f"🔑 Selected {len(keyframes)} keyframe(s) out of {len(images)} frame(s).")
+    return keyframes
+
+
+def build_keyframe_database(db_path, keyframe_db_path, names):
+    """Copy cameras and the features of the given images into a new database."""
+    if os.path.exists(keyframe_db_path):
+        os.remove(keyframe_db_path)
+
+    with pycolmap.Database.open(db_path) as src, pycolmap.Database.open(keyframe_db_path) as dst:
+        rig_ids = {}
+        for camera in src.read_all_cameras():
+            dst.write_camera(camera, use_camera_id=True)
+            rig = pycolmap.Rig()
+            rig.add_ref_sensor(camera.sensor_id)
+            rig_ids[camera.camera_id] = dst.write_rig(rig)
+
+        for name in names:
+            image = src.read_image_with_name(name)
+            image_id = dst.write_image(pycolmap.Image(name=name, camera_id=image.camera_id))
+            frame = pycolmap.Frame(rig_id=rig_ids[image.camera_id])
+            frame.add_data_id(pycolmap.data_t(
+                sensor_id=pycolmap.sensor_t(type=pycolmap.SensorType.CAMERA, id=image.camera_id), id=image_id
+            ))
+            dst.write_frame(frame)
+            dst.write_keypoints(image_id, src.read_keypoints(image.image_id))
+            dst.write_descriptors(image_id, src.read_descriptors(image.image_id))
+
+
+def add_posed_image(reconstruction, name, camera_id, cam_from_world):
+    """Add a registered image with a pose (and no observations) to a reconstruction."""
+    rig_id = next(
+        rig.rig_id for rig in reconstruction.rigs.values()
+        if rig.ref_sensor_id.id == camera_id
+    )
+    frame_id = max(reconstruction.frames.keys(), default=0) + 1
+    image_id = max(reconstruction.images.keys(), default=0) + 1
+
+    frame = pycolmap.Frame(frame_id=frame_id, rig_id=rig_id)
+    frame.add_data_id(pycolmap.data_t(
+        sensor_id=pycolmap.sensor_t(type=pycolmap.SensorType.CAMERA, id=camera_id), id=image_id
+    ))
+    frame.rig_from_world = cam_from_world
+    reconstruction.add_frame(frame)
+    reconstruction.add_image(pycolmap.Image(name=name, camera_id=camera_id, image_id=image_id, frame_id=frame_id))
+    reconstruction.register_frame(frame_id)
+
+
+def observed_features(db, image):
+    """Descriptors and 3D points of the keypoints a registered image observes."""
+    observed = [(i, p.point3D_id) for i, p in enumerate(image.points2D) if p.has_point3D()]
+    if not observed:
+        return None, None
+    idx, point3D_ids = map(np.asarray, zip(*observed))
+    db_image = db.read_image_with_name(image.name)
+    _, descriptors = strongest_features(
+        db.read_keypoints(db_image.image_id)[idx], db.read_descriptors(db_image.image_id)[idx], len(idx)
+    )
+    return descriptors, point3D_ids
+
+
+def register_remaining_frames(model_dir, db_path, keyframes, log=print):
+    """
+    Give every frame in ``db_path`` that is missing from the model a pose, by
+    absolute pose estimation against its neighbouring keyframes or, failing
+    that, by interpolating between them. Frames past the model's first and last
+    keyframe are only taken up to the next keyframe, which may belong to
+    another model. The model is rewritten in place.
+    """
+    reconstruction = pycolmap.Reconstruction(model_dir)
+    registered = {image.name: image for image in reconstruction.images.values() if image.has_pose}
+    if not registered:
+        return
+
+    registered_names = sorted(registered)
+    cache = {}
+    num_estimated = num_interpolated = 0
+
+    with pycolmap.Database.open(db_path) as db:
+        names = sorted(image.name for image in db.read_all_images())
+        index = {name: i for i, name in enumerate(names)}
+
+        # Frames owned by this model: between the keyframes just outside it.
+        keyframe_index = sorted(index[name] for name in keyframes if name in index)
+        first, last = index[registered_names[0]], index[registered_names[-1]]
+        start = max([i for i in keyframe_index if i < first], default=-1) + 1
+        end = min([i for i in keyframe_index if i > last], default=len(names))
+
+        def keyframe_features(name):
+            if name not in cache:
+                cache[name] = observed_features(db, registered[name])
+            return cache[name]
+
+        for name in names[start:end]:
+            if name in registered:
+                continue
+
+            pos = np.searchsorted(registered_names, name)
+            before = registered_names[pos - 1] if pos > 0 else None
+            after = registered_names[pos] if pos < len(registered_names) else None
+            neighbours = [n for n in (before, after) if n]
+
+            db_image = db.read_image_with_name(name)
+            camera = reconstruction.cameras[db_image.camera_id]
+            xy, descriptors = strongest_features(
+                db.read_keypoints(db_image.image_id), db.read_descriptors(db_image.image_id), REGISTRATION_FEATURES
+            )
+
+            points2D, points3D = [], []
+            for neighbour in neighbours:
+                kf_descriptors, point3D_ids = keyframe_features(neighbour)
+                if kf_descriptors is None:
+                    continue
+                matches = match_descriptors(descriptors, kf_descriptors)
+                points2D.append(xy[matches[:, 0]])
+                points3D.append([reconstruction.points3D[i].xyz for i in point3D_ids[matches[:, 1]]])
+
+            cam_from_world = None
+            if points2D and sum(len(p) for p in points2D) >= MIN_REGISTRATION_INLIERS:
+                result = pycolmap.estimate_and_refine_absolute_pose(
+                    np.concatenate(points2D), np.concatenate([np.reshape(p, (-1, 3)) for p in points3D]), camera
+                )
+                if result is not None and result["num_inliers"] >= MIN_REGISTRATION_INLIERS:
+                    cam_from_world = result["cam_from_world"]
+                    num_estimated += 1
+
+            if cam_from_world is None:
+                if before and after:
+                    t = (index[name] - index[before]) / (index[after] - index[before])
+                    cam_from_world = pycolmap.interpolate_camera_poses(
+                        registered[before].cam_from_world(), registered[after].cam_from_world(), t
+                    )
+                else:
+                    cam_from_world = registered[neighbours[0]].cam_from_world()
+                num_interpolated += 1
+
+            add_posed_image(reconstruction, name, db_image.camera_id, cam_from_world)
+
+    reconstruction.write(model_dir)
+    log(f"📌 Registered {num_estimated} frame(s) to the model, interpolated {num_interpolated}.")
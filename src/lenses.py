@@ -0,0 +1,200 @@
+"""
+Local library of solved lens intrinsics, reused as priors by new shots.
+
+Calibrations are stored per lens name (a camera and lens combination, e.g.
+"A7S3 24mm") and resolution in a JSON file, by default
+``~/.methventrack/lenses.json`` (``METHVENTRACK_LENSES`` points elsewhere,
+e.g. at a shared drive for a render farm). Each calibration keeps samples:
+the intrinsics of finished reconstructions (one per project, replaced when
+it is tracked again) and imported grid shoots. The prior is the per
+parameter median of the samples, of the grid samples only when there are
+any. A calibration at another resolution with the same aspect ratio is
+scaled to the shot.
+"""
+import json
+import os
+import statistics
+from datetime import datetime
+
+LIBRARY_FILE = os.path.join("~", ".methventrack", "lenses.json")
+# Most recent samples kept per calibration.
+MAX_SAMPLES = 10
+# Models solved from fewer images, or with a larger mean reprojection error, are not sampled.
+MIN_CALIBRATION_IMAGES = 20
+MAX_CALIBRATION_ERROR = 1.0
+ASPECT_TOLERANCE = 0.01
+LENS_MODES = ("prior", "fixed")
+
+
+def library_path():
+    return os.path.expanduser(os.environ.get("METHVENTRACK_LENSES") or LIBRARY_FILE)
+
+
+def resolution_key(width, height):
+    return f"{width}x{height}"
+
+
+def param_names(model):
+    """COLMAP parameter names of a camera model, e.g. ["f", "cx", "cy", "k"]."""
+    import pycolmap
+
+    camera = pycolmap.Camera.create(0, pycolmap.CameraModelId(model), 1.0, 1, 1)
+    return camera.params_info.split(", ")
+
+
+def convert_params(model, params, width, height, target_model, target_width, target_height):
+    """
+    Intrinsics of a ``model`` camera as ``target_model`` parameters at the
+    target resolution: focal lengths and principal point are scaled,
+    distortion is kept where both models share the coefficient (``k`` and
+    ``k1`` are the same first radial term) and zero otherwise.
+    """
+    values = dict(zip(param_names(model), params))
+    if "f" in values:
+        values.setdefault("fx", values["f"])
+        values.setdefault("fy", values["f"])
+    else:
+        values["f"] = (values["fx"] + values["fy"]) / 2
+    if ("k" in values) != ("k1" in values):
+        values.setdefault("k", values.get("k1"))
+        values.setdefault("k1", values.get("k"))
+    # Fisheye and perspective distortion terms do not mean the same thing.
+    same_family = ("FISHEYE" in model) == ("FISHEYE" in target_model)
+
+    scale_x, scale_y = target_width / width, target_height / height
+    scales = {"f": (scale_x + scale_y) / 2, "fx": scale_x, "cx": scale_x, "fy": scale_y, "cy": scale_y}
+    converted = []
+    for name in param_names(target_model):
+        if name in scales:
+            converted.append(values[name] * scales[name])
+        else:
+            converted.append(values.get(name, 0.0) if same_family else 0.0)
+    return converted
+
+
+def calibration_from_model(model_dir):
+    """
+    (model, width, height, params, images, mean reprojection error) of the
+    camera seen by most images of a model folder.
+    """
+    from colmap_binary import read_cameras, read_images, read_points3D
+
+    cameras = read_cameras(model_dir)
+    camera_ids = list(read_images(model_dir)["camera_ids"])
+    camera_id = max(cameras, key=camera_ids.count)
+    camera = cameras[camera_id]
+    errors = read_points3D(model_dir)["errors"]
+    error = float(errors.mean()) if len(errors) else 0.0
+    return (camera["model"], int(camera["width"]), int(camera["height"]),
+            [float(p) for p in camera["params"]], camera_ids.count(camera_id), error)
+
+
+def read_calibration(path):
+    """
+    Intrinsics to import, as returned by ``calibration_from_model``: from a
+    COLMAP model folder, or a JSON file ``{"model": "OPENCV", "width": 1920,
+    "height": 1080, "params": [fx, fy, cx, cy, k1, k2, p1, p2]}`` (e.g. the
+    result of a grid calibration).
+    """
+    if os.path.isdir(path):
+        return calibration_from_model(path)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    params = [float(p) for p in data["params"]]
+    if len(params) != len(param_names(data["model"])):
+        raise ValueError(f"{data['model']} takes {len(param_names(data['model']))} parameters, got {len(params)}")
+    return data["model"], int(data["width"]), int(data["height"]), params, data.get("images"), data.get("error")
+
+
+class LensLibrary:
+    """The lens calibration library file; changes are written on ``save``."""
+
+    def __init__(self, path=None):
+        self.path = path or library_path()
+        self.data = {"lenses": {}}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                pass  # unreadable library: start over, the next save replaces it
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def names(self):
+        return sorted(self.data["lenses"])
+
+    def calibrations(self, name):
+        """{"<width>x<height>": calibration} of a lens."""
+        return self.data["lenses"].get(name, {})
+
+    def add_sample(self, name, model, width, height, params, source, kind="track", images=None, error=None):
+        """Add solved intrinsics to a lens; a new sample from the same ``source`` replaces the old one."""
+        calibration = self.data["lenses"].setdefault(name, {}).setdefault(resolution_key(width, height), {
+            "width": width, "height": height, "samples": []
+        })
+        samples = [s for s in calibration["samples"] if s["source"] != source]
+        samples.append({
+            "model": model,
+            "params": [round(p, 8) for p in params],
+            "kind": kind,
+            "source": source,
+            "images": images,
+            "error": round(error, 4) if error is not None else None,
+            "date": datetime.now().isoformat(timespec="seconds"),
+        })
+        calibration["samples"] = samples[-MAX_SAMPLES:]
+
+    def remove(self, name, resolution=None):
+        """Remove a lens, or one of its resolutions; returns whether anything was removed."""
+        lenses = self.data["lenses"]
+        if name not in lenses:
+            return False
+        if resolution is None:
+            del lenses[name]
+            return True
+        removed = lenses[name].pop(resolution, None) is not None
+        if not lenses[name]:
+            del lenses[name]
+        return removed
+
+    def find_calibration(self, name, width, height):
+        """The lens calibration at ``width`` x ``height``, else the largest one with the same aspect ratio."""
+        calibrations = self.calibrations(name)
+        if resolution_key(width, height) in calibrations:
+            return calibrations[resolution_key(width, height)]
+        aspect = width / height
+        matching = [
+            c for c in calibrations.values()
+            if abs(c["width"] / c["height"] - aspect) <= ASPECT_TOLERANCE * aspect
+        ]
+        return max(matching, key=lambda c: c["width"]) if matching else None
+
+    def prior(self, name, model, width, height):
+        """Prior ``model`` parameters of a lens for ``width`` x ``height`` images, or None."""
+        calibration = self.find_calibration(name, width, height)
+        if calibration is None or not calibration["samples"]:
+            return None
+        samples = [s for s in calibration["samples"] if s["kind"] == "grid"] or calibration["samples"]
+        converted = [
+            convert_params(s["model"], s["params"], calibration["width"], calibration["height"], model, width, height)
+            for s in samples
+        ]
+        return [statistics.median(values) for values in zip(*converted)]
+
+
+def describe_calibration(name, calibration):
+    """One line summary of a calibration for listings."""
+    samples = calibration["samples"]
+    latest = samples[-1] if samples else None
+    kinds = sorted({s["kind"] for s in samples})
+    line = f"{name} {resolution_key(calibration['width'], calibration['height'])}: {len(samples)} sample(s)"
+    if latest:
+        params = ", ".join(f"{p:.6g}" for p in latest["params"])
+        line += f" ({'/'.join(kinds)}), latest {latest['model']} [{params}]"
+    return line
@@ -0,0 +1,206 @@
+"""
+Capture of everything the process prints, including native output.
+
+COLMAP (glog), ffmpeg and mapping subprocesses write straight to file
+descriptors 1 and 2, past Python's ``sys.stdout``. LogCapture points both
+descriptors at a pipe read by a background thread, which splits the output
+into lines, echoes it to the original terminal, appends it to the current
+run's log file and keeps the last lines in a ring buffer. The GUI collects new
+lines with ``drain`` on a timer, so it repaints once per frame however fast
+the pipeline logs, and progress parsed from COLMAP's lines drives its
+progress bar.
+"""
+import os
+import re
+import sys
+import threading
+from collections import deque
+
+RING_LINES = 200000
+# Lines waiting for the GUI beyond this are skipped in the view (they stay in the log file).
+PENDING_LINES = 20000
+READ_SIZE = 65536
+# Written by ``stop`` after the last captured output: the reader ends there, not at the end of
+# the pipe, which other processes (e.g. multiprocessing's resource tracker) may hold open.
+END_MARKER = b"\0log-capture-end\0"
+
+# (label, pattern): the pattern's groups give the current item and the total.
+PROGRESS_PATTERNS = [
+    ("Extracting features", re.compile(r"Processed file \[(\d+)/(\d+)\]")),
+    ("Matching", re.compile(r"Processing image \[(\d+)/(\d+)\]")),
+    ("Matching", re.compile(r"Processing block \[(\d+)/(\d+), (\d+)/(\d+)\]")),
+    ("Registering", re.compile(r"Registering image #\d+ \(num_reg_frames=(\d+)\)")),
+]
+
+
+def parse_progress(line, last_total=None):
+    """Return (label, current, total or None) for a COLMAP progress line, else None."""
+    for label, pattern in PROGRESS_PATTERNS:
+        match = pattern.search(line)
+        if not match:
+            continue
+        numbers = [int(n) for n in match.groups()]
+        if len(numbers) == 4:
+            # Block (i/n, j/m) of a blocked exhaustive matching
+            row, rows, column, columns = numbers
+            return label, (row - 1) * columns + column, rows * columns
+        if len(numbers) == 2:
+            return label, numbers[0], numbers[1]
+        # The mapper does not log how many frames there are: use the last stage's count.
+        return label, numbers[0], last_total
+    return None
+
+
+class LogCapture:
+    """
+    Process wide capture of stdout and stderr; ``start`` once, ``write`` log
+    messages from Python, ``drain`` from the GUI thread.
+    """
+
+    def __init__(self, max_lines=RING_LINES, max_pending=PENDING_LINES, terminal=True):
+        self.lines = deque(maxlen=max_lines)
+        self.pending = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.progress = None
+        self.last_total = None
+        self.lock = threading.Lock()
+        self.log_file = None
+        self.read_fd = None
+        self.write_fd = None
+        self.saved_fds = {}
+        self.thread = None
+        # Echo to the terminal; a tracking process leaves that to the GUI it reports to.
+        self.terminal = terminal
+
+    # --- Capture ---
+
+    def start(self):
+        """Redirect file descriptors 1 and 2 into the capture pipe."""
+        if self.thread is not None:
+            return
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self.read_fd, self.write_fd = os.pipe()
+        for fd in (1, 2):
+            try:
+                self.saved_fds[fd] = os.dup(fd)
+            except OSError:
+                pass  # no console attached
+            os.dup2(self.write_fd, fd)
+        # stdout became a pipe: flush Python's prints line by line so they stay in order with native output.
+        sys.stdout.reconfigure(line_buffering=True)
+        self.thread = threading.Thread(target=self.read_loop, name="log-capture", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Restore stdout and stderr and wait for the last captured lines."""
+        if self.thread is None:
+            return
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for fd in (1, 2):
+            if fd in self.saved_fds:
+                os.dup2(self.saved_fds[fd], fd)
+            else:
+                os.close(fd)
+        os.write(self.write_fd, END_MARKER)
+        os.close(self.write_fd)
+        self.thread.join(timeout=5)
+        self.thread = None
+        os.close(self.read_fd)
+        for fd in self.saved_fds.values():
+            os.close(fd)
+        self.saved_fds.clear()
+
+    def read_loop(self):
+        partial = b""
+        while True:
+            chunk = os.read(self.read_fd, READ_SIZE)
+            if not chunk:
+                break
+            data = partial + chunk
+            end = data.find(END_MARKER)
+            if end >= 0:
+                data = data[:end]
+                chunk = chunk[:max(0, end - len(partial))]
+            self.echo(chunk)
+            # ffmpeg rewrites progress lines with carriage returns.
+            parts = data.replace(b"\r", b"\n").split(b"\n")
+            partial = parts.pop()
+            self.add_lines([part.decode("utf-8", "replace") for part in parts if part])
+            if end >= 0:
+                break
+        if partial:
+            self.add_lines([partial.decode("utf-8", "replace")])
+
+    def echo(self, data):
+        """Copy output to the terminal the process was started from."""
+        if not self.terminal:
+            return
+        fd = self.saved_fds.get(1) if self.thread is not None else 1
+        if fd is None:
+            return
+        try:
+            os.write(fd, data)
+        except OSError:
+            pass
+
+    # --- Lines ---
+
+    def add_lines(self, lines):
+        if not lines:
+            return
+        with self.lock:
+            for line in lines:
+                progress = parse_progress(line, self.last_total)
+                if progress is not None:
+                    self.progress = progress
+                    if progress[2]:
+                        self.last_total = progress[2]
+            if len(self.pending) + len(lines) > self.pending.maxlen:
+                self.dropped += len(self.pending) + len(lines) - self.pending.maxlen
+            self.lines.extend(lines)
+            self.pending.extend(lines)
+            if self.log_file is not None:
+                self.log_file.write("\n".join(lines) + "\n")
+
+    def write(self, message):
+        """Log a message from Python: captured like native output and echoed to the terminal."""
+        self.echo((message + "\n").encode("utf-8", "replace"))
+        self.add_lines(message.splitlines() or [""])
+
+    def drain(self, limit=None):
+        """
+        Return up to ``limit`` of the lines added since the last call, how many
+        were skipped because the GUI fell behind, and the latest progress.
+        """
+        with self.lock:
+            count = len(self.pending) if limit is None else min(limit, len(self.pending))
+            lines = [self.pending.popleft() for _ in range(count)]
+            dropped, self.dropped = self.dropped, 0
+            return lines, dropped, self.progress
+
+    def tail(self, count):
+        with self.lock:
+            return list(self.lines)[-count:]
+
+    # --- Runs ---
+
+    def start_run(self, log_path):
+        """Also write every line to ``log_path`` until ``end_run``, and reset the progress."""
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        with self.lock:
+            if self.log_file is not None:
+                self.log_file.close()
+            self.log_file = open(log_path, "w", encoding="utf-8", buffering=1024 * 1024)
+            self.progress = None
+            self.last_total = None
+
+    def end_run(self):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        with self.lock:
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
+            self.progress = None
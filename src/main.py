@@ -1,12 +1,38 @@
-from PySide6.QtWidgets import QApplication
-from PySide6.QtGui import QIcon
+import multiprocessing
 import sys
-from ui.mainwindow import MainWindow
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+
+    # Headless commands never load Qt, e.g. `MethvenTrack track <project>`.
+    if len(sys.argv) > 1 and sys.argv[1] in ("track", "batch", "compare", "lens", "plan", "shard-worker"):
+        from cli import main
+        sys.exit(main())
+
+    import os
+    from PySide6.QtCore import QCoreApplication, Qt
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtGui import QIcon
+    from ui.mainwindow import MainWindow
+
+    # Remote desktops and VMs without a GPU driver: draw the viewer with software OpenGL.
+    if os.environ.get("METHVENTRACK_SOFTWARE_GL"):
+        QCoreApplication.setAttribute(Qt.AA_UseSoftwareOpenGL)
+
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon("icon.ico"))  # use .ico on Windows, .png works too
 
     win = MainWindow()
+
+    # benchmarks/startup.py: report what was loaded at the first paint and quit.
+    if os.environ.get("METHVENTRACK_STARTUP_PROBE"):
+        import json
+        from ui.startup import FirstPaint, HEAVY_MODULES
+        probe = FirstPaint(win)  # installed last, so it sees the paint before the warmup starts
+        probe.painted.connect(lambda: (
+            print("STARTUP " + json.dumps({"loaded": [m for m in HEAVY_MODULES if m in sys.modules]}), flush=True),
+            app.quit(),
+        ))
+
     win.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    sys.exit(app.exec())
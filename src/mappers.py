@@ -0,0 +1,118 @@
+"""
+Mapper backends.
+
+Every backend maps the features and matches in a COLMAP database into one or
+more models under ``output_path/<i>``, like pycolmap.incremental_mapping, and
+is called as ``mapper(db_path, frames_path, output_path, num_threads=...,
+extract_colors=..., log=..., cancel=..., refine_intrinsics=..., **options)``;
+``cancel`` is a ``threading.Event`` checked at the backend's safe points, and
+without ``refine_intrinsics`` the camera intrinsics in the database are held
+fixed by every bundle adjustment.
+"""
+import os
+
+import numpy as np
+import pycolmap
+
+from checkpoints import Checkpointer, latest_checkpoint, remove_checkpoint
+
+# Same as COLMAP's mapper: points reprojecting worse than this are dropped.
+MAX_REPROJECTION_ERROR = 4.0
+REFINE_ROUNDS = 2
+
+
+def filter_points(reconstruction, max_error=MAX_REPROJECTION_ERROR):
+    """Delete 3D points with a large (or non-finite) mean reprojection error; returns how many."""
+    reconstruction.update_point_3d_errors()
+    bad = [
+        point3D_id for point3D_id, point in reconstruction.points3D.items()
+        if not np.isfinite(point.error) or point.error > max_error
+    ]
+    for point3D_id in bad:
+        reconstruction.delete_point3D(point3D_id)
+    return len(bad)
+
+
+def refine_model(reconstruction, db_path, frames_path, model_dir, num_threads=-1, extract_colors=True, log=print,
+                 refine_intrinsics=True):
+    """
+    Triangulate a posed reconstruction against the database and refine it with
+    global bundle adjustment, re-triangulating from the refined poses and
+    dropping outlier points between rounds.
+    """
+    options = pycolmap.IncrementalPipelineOptions(num_threads=num_threads, extract_colors=extract_colors)
+    ba_options = pycolmap.BundleAdjustmentOptions()
+    ba_options.solver_options.num_threads = num_threads
+    ba_options.refine_focal_length = ba_options.refine_extra_params = refine_intrinsics
+
+    refined = reconstruction
+    for _ in range(REFINE_ROUNDS):
+        refined = pycolmap.triangulate_points(
+            refined, db_path, frames_path, model_dir, clear_points=True, options=options
+        )
+        pycolmap.bundle_adjustment(refined, ba_options)
+        filter_points(refined)
+    pycolmap.bundle_adjustment(refined, ba_options)
+    filter_points(refined)
+    refined.write(model_dir)
+    log(f"✅ Model {os.path.basename(model_dir)}: {refined.num_reg_images()} image(s), {refined.num_points3D()} point(s).")
+    return refined
+
+
+def incremental_backend(db_path, frames_path, output_path, num_threads=-1, extract_colors=True, log=print,
+                        cancel=None, refine_intrinsics=True, preview=None):
+    """
+    COLMAP's incremental mapper, checkpointed and resumed from ``output_path/_checkpoint``.
+    ``preview`` is called with ``(reconstruction, model_index)`` after every registered image.
+    """
+    options = pycolmap.IncrementalPipelineOptions(
+        num_threads=num_threads, extract_colors=extract_colors,
+        ba_refine_focal_length=refine_intrinsics, ba_refine_extra_params=refine_intrinsics
+    )
+    manager = pycolmap.ReconstructionManager()
+    checkpoint = latest_checkpoint(output_path)
+    if checkpoint:
+        # COLMAP continues a single model, the other checkpointed ones are mapped again.
+        manager.read(checkpoint)
+        log(f"⏯️ Resuming mapping from a checkpoint with {manager.get(0).num_reg_images()} image(s).")
+
+    pipeline = pycolmap.IncrementalPipeline(options, frames_path, db_path, manager)
+    pipeline.add_callback(
+        pycolmap.IncrementalMapperCallback.NEXT_IMAGE_REG_CALLBACK,
+        Checkpointer(manager, output_path, cancel=cancel, on_image=preview, log=log)
+    )
+    pipeline.run()
+    for i in range(manager.size()):
+        os.makedirs(os.path.join(output_path, str(i)), exist_ok=True)
+    manager.write(output_path)
+    remove_checkpoint(output_path)
+
+
+def chunked_backend(db_path, frames_path, output_path, num_threads=-1, extract_colors=True, log=print,
+                    cancel=None, refine_intrinsics=True, chunk_size=300, chunk_overlap=30):
+    from chunked import map_chunked
+
+    map_chunked(db_path, frames_path, output_path, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                num_threads=num_threads, extract_colors=extract_colors, log=log, cancel=cancel,
+                refine_intrinsics=refine_intrinsics)
+
+
+def global_backend(db_path, frames_path, output_path, num_threads=-1, extract_colors=True, log=print,
+                   cancel=None, refine_intrinsics=True):
+    from global_sfm import global_mapping
+
+    global_mapping(db_path, frames_path, output_path, num_threads=num_threads,
+                   extract_colors=extract_colors, log=log, cancel=cancel, refine_intrinsics=refine_intrinsics)
+
+
+MAPPERS = {
+    "incremental": incremental_backend,
+    "chunked": chunked_backend,
+    "global": global_backend,
+}
+
+
+def run_mapper(name, db_path, frames_path, output_path, **kwargs):
+    if name not in MAPPERS:
+        raise ValueError(f"Unknown mapper: {name}")
+    MAPPERS[name](db_path, frames_path, output_path, **kwargs)
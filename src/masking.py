@@ -0,0 +1,350 @@
+"""
+Masks of moving objects and garbage mattes for feature extraction.
+
+People, cars or water produce features that only survive until geometric
+verification or end up as outliers in mapping. Masked regions get no
+keypoints: the masks are written in COLMAP's ``mask_path`` layout
+(``<project>/masks/<image name>.png``, black = no features).
+
+Motion masks come from a low resolution grayscale pass over the video. The
+camera motion between a frame and its neighbours is fitted as a homography
+to block-wise phase correlation shifts, the neighbours are warped onto the
+frame and what still differs from both of them is moving. User mattes (e.g.
+roto exported from compositing, white = excluded) are added on top.
+"""
+import os
+import re
+import subprocess
+
+import imageio_ffmpeg
+import numpy as np
+import pycolmap
+
+MASK_DIR = "masks"
+MATTE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".exr", ".bmp")
+ANALYSIS_WIDTH = 320
+# Neighbours compared with each frame are this many frames away.
+FRAME_STEP = 1
+BLOCK_SIZE = 32
+MIN_BLOCKS = 8
+# Per-pixel difference (0-255) that always counts as background.
+MIN_DIFFERENCE = 12.0
+DIFFERENCE_FACTOR = 4.0
+DILATE_PIXELS = 4
+# More than this much motion means the camera model failed, not that half the frame moves.
+MAX_MASKED_FRACTION = 0.5
+
+
+def analysis_size(width, height, analysis_width=ANALYSIS_WIDTH):
+    """Size frames are analysed at, keeping the aspect ratio (even dimensions for ffmpeg)."""
+    analysis_width = min(analysis_width, width)
+    return analysis_width // 2 * 2, max(2, round(height * analysis_width / width) // 2 * 2)
+
+
+def decode_gray(source, width, height, fps=24, num_threads=-1, start=None, max_frames=None):
+    """
+    Yield the frames of ``source`` at ``fps`` as (height, width) float32
+    grayscale arrays, optionally from ``start`` seconds and at most ``max_frames``.
+    """
+    threads = ["-threads", str(num_threads)] if num_threads > 0 else []
+    seek = ["-ss", f"{start:.3f}"] if start else []
+    limit = ["-frames:v", str(max_frames)] if max_frames else []
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(), "-loglevel", "error", *threads, *seek, "-i", str(source),
+        "-vf", f"fps={fps},scale={width}:{height}:flags=area", *limit,
+        "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1",
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    frame_bytes = width * height
+    try:
+        while True:
+            buffer = process.stdout.read(frame_bytes)
+            if len(buffer) < frame_bytes:
+                break
+            yield np.frombuffer(buffer, dtype=np.uint8).reshape(height, width).astype(np.float32)
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+def box_filter(image, radius):
+    """Mean over a (2 * radius + 1) square window, with edge padding."""
+    if radius <= 0:
+        return image
+    size = 2 * radius + 1
+    padded = np.pad(image, radius + 1, mode="edge").astype(np.float64)
+    summed = padded.cumsum(axis=0).cumsum(axis=1)
+    window = summed[size:, size:] - summed[:-size, size:] - summed[size:, :-size] + summed[:-size, :-size]
+    return (window / size ** 2)[:image.shape[0], :image.shape[1]]
+
+
+def phase_correlation(a, b):
+    """
+    Shift (dx, dy) with b(x) ~ a(x - d) of every pair of patches in the
+    (..., n, n) stacks ``a`` and ``b``, and the strength of each peak.
+    """
+    size = a.shape[-1]
+    window = np.outer(np.hanning(size), np.hanning(size)).astype(np.float32)
+    spectrum_a = np.fft.rfft2((a - a.mean(axis=(-2, -1), keepdims=True)) * window)
+    spectrum_b = np.fft.rfft2((b - b.mean(axis=(-2, -1), keepdims=True)) * window)
+    cross = np.conj(spectrum_a) * spectrum_b
+    correlation = np.fft.irfft2(cross / (np.abs(cross) + 1e-9), s=a.shape[-2:])
+
+    flat = correlation.reshape(*correlation.shape[:-2], -1)
+    peak = flat.argmax(axis=-1)
+    strength = np.take_along_axis(flat, peak[..., None], axis=-1)[..., 0]
+    peak_y, peak_x = np.divmod(peak, size)
+
+    def neighbour(dy, dx):
+        index = ((peak_y + dy) % size) * size + (peak_x + dx) % size
+        return np.take_along_axis(flat, index[..., None], axis=-1)[..., 0]
+
+    def parabola(before, after):
+        # Sub-pixel peak: vertex of the parabola through the peak and its two neighbours.
+        denominator = before - 2 * strength + after
+        curved = np.abs(denominator) > 1e-9
+        offset = 0.5 * (before - after) / np.where(curved, denominator, 1.0)
+        return np.clip(np.where(curved, offset, 0.0), -0.5, 0.5)
+
+    offset_x = parabola(neighbour(0, -1), neighbour(0, 1))
+    offset_y = parabola(neighbour(-1, 0), neighbour(1, 0))
+    # Peaks past the middle are negative shifts.
+    shift_x = (peak_x + size // 2) % size - size // 2 + offset_x
+    shift_y = (peak_y + size // 2) % size - size // 2 + offset_y
+    return np.stack([shift_x, shift_y], axis=-1), strength
+
+
+def block_motion(frame, other, block_size=BLOCK_SIZE):
+    """Block centers in ``frame`` (N, 2), where they are in ``other`` (N, 2), and a weight per block."""
+    height, width = frame.shape
+    # Remove the global shift first so block shifts stay within a block.
+    crop = min(height, width) // 2 * 2
+    global_shift, _ = phase_correlation(frame[:crop, :crop], other[:crop, :crop])
+    dx, dy = np.round(global_shift).astype(int)
+    shifted = np.roll(other, (-dy, -dx), axis=(0, 1))
+
+    rows, cols = height // block_size, width // block_size
+
+    def blocks(image):
+        cropped = image[:rows * block_size, :cols * block_size]
+        return cropped.reshape(rows, block_size, cols, block_size).transpose(0, 2, 1, 3)
+
+    frame_blocks = blocks(frame)
+    shifts, strength = phase_correlation(frame_blocks, blocks(shifted))
+    ys, xs = np.mgrid[0:rows, 0:cols]
+    centers = np.stack([xs, ys], axis=-1) * block_size + block_size / 2
+
+    # Flat blocks and blocks that wrapped around the frame border are unreliable.
+    texture = frame_blocks.std(axis=(-2, -1))
+    weights = np.clip(strength, 0, None) * (texture > 2.0)
+    inside = (centers[..., 0] + dx >= 0) & (centers[..., 0] + dx < width) & \
+             (centers[..., 1] + dy >= 0) & (centers[..., 1] + dy < height)
+    weights = weights * inside
+    targets = centers + shifts + np.array([dx, dy])
+    return centers.reshape(-1, 2), targets.reshape(-1, 2), weights.reshape(-1)
+
+
+def fit_homography(src, dst, weights, iterations=5, scale=1.0):
+    """Robust (iteratively reweighted, Cauchy) homography mapping ``src`` onto ``dst``, or None."""
+    if np.count_nonzero(weights > 0) < MIN_BLOCKS:
+        return None
+    # Normalize both point sets for a well conditioned DLT.
+    center = src[weights > 0].mean(axis=0)
+    spread = np.sqrt(2) / max(np.linalg.norm(src[weights > 0] - center, axis=1).mean(), 1e-9)
+    normalize = np.array([[spread, 0, -spread * center[0]], [0, spread, -spread * center[1]], [0, 0, 1]])
+    s = (src - center) * spread
+    d = (dst - center) * spread
+
+    zeros = np.zeros(len(s))
+    ones = np.ones(len(s))
+    rows_x = np.stack([-s[:, 0], -s[:, 1], -ones, zeros, zeros, zeros, d[:, 0] * s[:, 0], d[:, 0] * s[:, 1], d[:, 0]], 1)
+    rows_y = np.stack([zeros, zeros, zeros, -s[:, 0], -s[:, 1], -ones, d[:, 1] * s[:, 0], d[:, 1] * s[:, 1], d[:, 1]], 1)
+
+    robust = weights.astype(np.float64)
+    homography = None
+    for _ in range(iterations):
+        w = np.sqrt(robust)[:, None]
+        _, _, vt = np.linalg.svd(np.concatenate([rows_x * w, rows_y * w]), full_matrices=False)
+        normalized = vt[-1].reshape(3, 3)
+        homography = np.linalg.inv(normalize) @ normalized @ normalize
+        residuals = np.linalg.norm(apply_homography(homography, src) - dst, axis=1)
+        robust = weights / (1 + (residuals / scale) ** 2)
+    return homography / homography[2, 2]
+
+
+def estimate_motion(frame, other):
+    """Homography taking ``frame`` pixels to ``other`` pixels, refined once on the pre-aligned frames."""
+    homography = fit_homography(*block_motion(frame, other))
+    if homography is None:
+        return None
+    # Phase correlation is most accurate around zero shift: measure what the first fit left.
+    aligned, _ = warp(other, homography)
+    src, dst, weights = block_motion(frame, aligned)
+    return fit_homography(src, apply_homography(homography, dst), weights)
+
+
+def apply_homography(homography, points):
+    projected = points @ homography[:, :2].T + homography[:, 2]
+    return projected[:, :2] / projected[:, 2:3]
+
+
+def warp(image, homography):
+    """Sample ``image`` at homography(x) for every pixel x (bilinear), and where that is inside it."""
+    height, width = image.shape
+    ys, xs = np.mgrid[0:height, 0:width]
+    points = apply_homography(homography, np.stack([xs.ravel(), ys.ravel()], axis=1).astype(np.float64))
+    x, y = points[:, 0], points[:, 1]
+    valid = (x >= 0) & (x <= width - 1) & (y >= 0) & (y <= height - 1)
+    x0 = np.clip(np.floor(x).astype(int), 0, width - 2)
+    y0 = np.clip(np.floor(y).astype(int), 0, height - 2)
+    fx, fy = np.clip(x - x0, 0, 1), np.clip(y - y0, 0, 1)
+    top = image[y0, x0] * (1 - fx) + image[y0, x0 + 1] * fx
+    bottom = image[y0 + 1, x0] * (1 - fx) + image[y0 + 1, x0 + 1] * fx
+    return (top * (1 - fy) + bottom * fy).reshape(height, width), valid.reshape(height, width)
+
+
+def motion_mask(frame, neighbours):
+    """
+    Boolean mask of what moves in ``frame`` relative to the camera motion
+    towards its ``neighbours`` (earlier and later frames, None when missing).
+    """
+    differences = []
+    for other in neighbours:
+        if other is None:
+            continue
+        homography = estimate_motion(frame, other)
+        if homography is None:
+            continue
+        warped, valid = warp(other, homography)
+        difference = np.abs(frame - warped)
+        difference[~valid] = np.inf
+        differences.append(difference)
+    if not differences:
+        return np.zeros(frame.shape, dtype=bool)
+
+    # Moving objects differ from both neighbours, uncovered background only from one.
+    difference = np.minimum.reduce(differences)
+    difference[np.isinf(difference)] = 0
+    difference = box_filter(difference, 2)
+    threshold = max(MIN_DIFFERENCE, DIFFERENCE_FACTOR * float(np.median(difference)))
+    mask = box_filter((difference > threshold).astype(np.float32), 2) > 0.5  # drop specks
+    mask = box_filter(mask.astype(np.float32), DILATE_PIXELS) > 0
+    if mask.mean() > MAX_MASKED_FRACTION:
+        return np.zeros(frame.shape, dtype=bool)
+    return mask
+
+
+def resize_nearest(mask, width, height):
+    rows = np.minimum((np.arange(height) + 0.5) * mask.shape[0] / height, mask.shape[0] - 1).astype(int)
+    cols = np.minimum((np.arange(width) + 0.5) * mask.shape[1] / width, mask.shape[1] - 1).astype(int)
+    return mask[rows[:, None], cols]
+
+
+def find_mattes(mattes_dir):
+    """
+    ({frame number: path}, path or None) of a mattes folder: files with a
+    number in their name (``frame_000012.png``, ``roto.0012.exr``) matte that
+    frame, a file without one mattes every frame.
+    """
+    per_frame, every_frame = {}, None
+    if not mattes_dir or not os.path.isdir(mattes_dir):
+        return per_frame, every_frame
+    for name in sorted(os.listdir(mattes_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in MATTE_EXTENSIONS:
+            continue
+        numbers = re.findall(r"\d+", stem)
+        if numbers:
+            per_frame[int(numbers[-1])] = os.path.join(mattes_dir, name)
+        else:
+            every_frame = os.path.join(mattes_dir, name)
+    return per_frame, every_frame
+
+
+def mattes_signature(mattes_dir):
+    """Names, sizes and modification times of the mattes, for stage fingerprints."""
+    per_frame, every_frame = find_mattes(mattes_dir)
+    paths = sorted(per_frame.values()) + ([every_frame] if every_frame else [])
+    return [(os.path.basename(path), os.path.getsize(path), os.stat(path).st_mtime_ns) for path in paths]
+
+
+def read_matte(path, width, height):
+    """Boolean (height, width) matte: True where the image is bright (excluded)."""
+    bitmap = pycolmap.Bitmap.read(path, False)
+    if bitmap is None:
+        raise ValueError(f"Could not read matte {path}")
+    return resize_nearest(bitmap.to_array() > 127, width, height)
+
+
+def mask_path(mask_dir, image_name):
+    """COLMAP looks for the mask of ``image_name`` at ``<mask_path>/<image_name>.png``."""
+    return os.path.join(mask_dir, image_name + ".png")
+
+
+def read_mask(mask_dir, image_name):
+    """Mask of one image as a (height, width) bool array (True keeps features), or None."""
+    path = mask_path(mask_dir, image_name)
+    if not os.path.exists(path):
+        return None
+    return pycolmap.Bitmap.read(path, False).to_array() > 0
+
+
+def build_masks(source, mask_dir, width, height, motion=True, mattes_dir=None, fps=24,
+                dest_name="frame_%06d.jpg", num_threads=-1, cancel=None, log=print):
+    """
+    Write a ``width`` x ``height`` mask per frame of ``source`` to
+    ``mask_dir``, excluding moving objects (``motion``) and the mattes in
+    ``mattes_dir``. Returns the mean fraction of the frames that is masked.
+    """
+    from checkpoints import check_cancelled
+
+    os.makedirs(mask_dir, exist_ok=True)
+    probe = imageio_ffmpeg.read_frames(str(source))
+    try:
+        source_width, source_height = probe.__next__()["size"]
+    finally:
+        probe.close()
+    work_width, work_height = analysis_size(source_width, source_height)
+    per_frame, every_frame = find_mattes(mattes_dir)
+    static_matte = read_matte(every_frame, width, height) if every_frame else None
+    if mattes_dir:
+        log(f"🎭 {len(per_frame)} per-frame matte(s)" + (", one matte for every frame." if every_frame else "."))
+
+    masked = []
+
+    def write(index, moving):
+        excluded = resize_nearest(moving, width, height) if moving is not None else np.zeros((height, width), bool)
+        if static_matte is not None:
+            excluded |= static_matte
+        if index in per_frame:
+            excluded |= read_matte(per_frame[index], width, height)
+        masked.append(excluded.mean())
+        keep = np.where(excluded, 0, 255).astype(np.uint8)
+        pycolmap.Bitmap.from_array(keep).write(mask_path(mask_dir, os.path.basename(dest_name % index)))
+
+    # Sliding window of frames: FRAME_STEP before and after the one being masked.
+    window = []
+    index = 0
+    for frame in decode_gray(source, work_width, work_height, fps=fps, num_threads=num_threads):
+        window.append(frame)
+        if len(window) > 2 * FRAME_STEP + 1:
+            window.pop(0)
+        center = len(window) - 1 - FRAME_STEP
+        if center < 0:
+            continue
+        index += 1
+        check_cancelled(cancel)
+        before = window[center - FRAME_STEP] if center >= FRAME_STEP else None
+        write(index, motion_mask(window[center], (before, window[-1])) if motion else None)
+
+    # The last frames have no later neighbour.
+    for center in range(max(len(window) - FRAME_STEP, 0), len(window)):
+        index += 1
+        before = window[center - FRAME_STEP] if center >= FRAME_STEP else None
+        write(index, motion_mask(window[center], (before, None)) if motion else None)
+
+    mean_masked = float(np.mean(masked)) if masked else 0.0
+    log(f"🎭 Masked {index} frame(s), {mean_masked * 100:.1f}% of the image on average.")
+    return mean_masked
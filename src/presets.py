@@ -0,0 +1,127 @@
+"""
+Fast / Balanced / Quality settings presets, planned per clip.
+
+``probe_clip`` measures what the cost of a run depends on: frame count,
+resolution, camera motion (sampled from a few pairs of consecutive frames)
+and cores. ``plan_preset`` turns a preset into tracking settings for that
+clip: the tracking resolution is capped per preset, keyframes are used when
+the camera moves slowly, and the most thorough matcher and mapper whose
+estimated time (see ``cost_model``) fits the preset's budget are picked.
+"""
+import math
+import os
+
+PRESETS = ("fast", "balanced", "quality")
+MOTION_SAMPLES = 8
+# Longest side of the frames features are extracted from (None: full resolution).
+MAX_TRACKING_SIZE = {"fast": 1280, "balanced": 1920, "quality": None}
+# The proxy scales offered by the GUI.
+PROXY_SCALES = (1.0, 0.5, 0.25)
+# Keyframes pay off when the camera moves this little per frame (fraction of the diagonal).
+KEYFRAME_MOTION = 0.05
+KEYFRAME_MAX_MOTION = {"fast": KEYFRAME_MOTION / 2, "balanced": KEYFRAME_MOTION / 4, "quality": KEYFRAME_MOTION / 8}
+# Seconds a matcher or mapper choice may take to be picked; the last candidate is the fallback.
+MATCHING_BUDGET = {"fast": 10 * 60, "balanced": 30 * 60, "quality": 4 * 3600}
+MAPPING_BUDGET = {"fast": 10 * 60, "balanced": 60 * 60, "quality": 8 * 3600}
+MATCHERS = {
+    "fast": [{"match_type": "sequential", "overlap": 10}],
+    "balanced": [
+        {"match_type": "retrieval", "overlap": 15, "retrieval_neighbors": 8},
+        {"match_type": "sequential", "overlap": 15},
+    ],
+    "quality": [
+        {"match_type": "exhaustive"},
+        {"match_type": "retrieval", "overlap": 20, "retrieval_neighbors": 16},
+        {"match_type": "sequential", "overlap": 20},
+    ],
+}
+MAPPERS = {
+    "fast": ["incremental", "global"],
+    "balanced": ["incremental", "chunked", "global"],
+    "quality": ["incremental", "chunked"],
+}
+# Below this many mapped frames, sequential matching already sees every revisit.
+RETRIEVAL_MIN_FRAMES = 300
+
+
+def estimate_clip_motion(video_path, width, height, duration, fps=24, samples=MOTION_SAMPLES):
+    """Median image motion between consecutive frames, as a fraction of the image diagonal."""
+    import numpy as np
+    from masking import analysis_size, apply_homography, decode_gray, estimate_motion
+
+    width, height = analysis_size(width, height)
+    corners = np.array([[0, 0], [width - 1, 0], [0, height - 1], [width - 1, height - 1]], dtype=np.float64)
+    motions = []
+    for i in range(samples):
+        start = duration * (i + 0.5) / samples
+        pair = list(decode_gray(video_path, width, height, fps=fps, start=start, max_frames=2))
+        if len(pair) < 2:
+            continue
+        homography = estimate_motion(*pair)
+        if homography is not None:
+            motions.append(np.linalg.norm(apply_homography(homography, corners) - corners, axis=1).mean())
+    return float(np.median(motions)) / math.hypot(width, height) if motions else 0.0
+
+
+def probe_clip(video_path, fps=24, cores=None):
+    """Frame count, plate size, camera ``motion`` per frame and ``cores`` of a clip, for planning."""
+    from proxy import probe_video
+
+    meta = probe_video(video_path)
+    width, height = meta["size"]
+    return {
+        "frames": max(1, round(meta["duration"] * fps)),
+        "width": width,
+        "height": height,
+        "motion": round(estimate_clip_motion(video_path, width, height, meta["duration"], fps=fps), 5),
+        "cores": cores if cores and cores > 0 else os.cpu_count() or 1,
+    }
+
+
+def tracking_scale(clip, max_size):
+    """Largest proxy scale that keeps the frames within ``max_size``."""
+    for scale in PROXY_SCALES:
+        if max_size is None or max(clip["width"], clip["height"]) * scale <= max_size:
+            return scale
+    return PROXY_SCALES[-1]
+
+
+def plan_preset(clip, preset, cost_model):
+    """Tracking settings (CLI config keys) of ``preset`` for a clip from ``probe_clip``."""
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown preset: {preset}")
+    settings = {
+        "proxy_scale": tracking_scale(clip, MAX_TRACKING_SIZE[preset]),
+        "keyframes": clip["motion"] < KEYFRAME_MAX_MOTION[preset],
+        "keyframe_motion": KEYFRAME_MOTION,
+        "mapper": "incremental",
+    }
+    from cost_model import keyframe_count
+
+    matchers = MATCHERS[preset]
+    if keyframe_count(clip, settings) < RETRIEVAL_MIN_FRAMES:
+        matchers = [m for m in matchers if m["match_type"] != "retrieval"]
+    for matcher in matchers:
+        settings.update(matcher)
+        if cost_model.estimate(clip, settings)["matching"] <= MATCHING_BUDGET[preset]:
+            break
+
+    for mapper in MAPPERS[preset]:
+        settings["mapper"] = mapper
+        if cost_model.estimate(clip, settings)["mapping"] <= MAPPING_BUDGET[preset]:
+            break
+    return settings
+
+
+def describe_settings(settings):
+    """Short summary of planned settings, e.g. "retrieval (15+8), incremental, 1/2 res, keyframes"."""
+    match_type = settings["match_type"]
+    if match_type == "sequential":
+        match_type += f" ({settings['overlap']})"
+    elif match_type == "retrieval":
+        match_type += f" ({settings['overlap']}+{settings['retrieval_neighbors']})"
+    scale = settings["proxy_scale"]
+    parts = [match_type, settings["mapper"], "full res" if scale == 1 else f"1/{round(1 / scale)} res"]
+    if settings["keyframes"]:
+        parts.append("keyframes")
+    return ", ".join(parts)
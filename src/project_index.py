@@ -0,0 +1,205 @@
+"""
+Per-project index of reconstructed models and an LRU cache of loaded models.
+
+``<project>/reconstructions.json`` keeps a summary of every model folder
+(images, points, mean reprojection error, frame coverage) keyed by its path
+relative to ``reconstruction/``. Entries are only recomputed when the model
+files change, so listing a project costs a few ``stat`` calls instead of
+loading every model.
+
+pycolmap and NumPy are imported on first use: the GUI builds its window from
+this module before they are loaded.
+"""
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+INDEX_FILE = "reconstructions.json"
+MODEL_FILES = ("cameras.bin", "images.bin", "points3D.bin")
+SORT_KEYS = ("name", "quality")
+
+
+def model_signature(model_dir):
+    """(size, mtime_ns) of the model files, which change whenever the model is rewritten."""
+    signature = []
+    for name in MODEL_FILES:
+        stat = os.stat(os.path.join(model_dir, name))
+        signature += [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def is_model(path):
+    return all(os.path.isfile(os.path.join(path, name)) for name in MODEL_FILES)
+
+
+def find_models(recon_root):
+    """Relative paths of the model folders: ``<run>/<model>`` (and bare ``<run>`` folders)."""
+    models = []
+    if not os.path.isdir(recon_root):
+        return models
+    for run in os.scandir(recon_root):
+        if not run.is_dir():
+            continue
+        if is_model(run.path):
+            models.append(run.name)
+        for model in os.scandir(run.path):
+            if model.is_dir() and is_model(model.path):
+                models.append(f"{run.name}/{model.name}")
+    return models
+
+
+def frame_number(name):
+    match = re.search(r"(\d+)", os.path.basename(name))
+    return int(match.group(1)) if match else None
+
+
+def summarize_model(model_dir, num_frames=None):
+    """Image, point, error and frame coverage summary of one model folder, read without loading the model."""
+    from colmap_binary import read_images, read_points3D
+
+    names = read_images(model_dir)["names"]
+    errors = read_points3D(model_dir)["errors"]
+    frames = sorted(n for n in map(frame_number, names) if n is not None)
+    span = frames[-1] - frames[0] + 1 if frames else 0
+    return {
+        "images": len(names),
+        "points": len(errors),
+        "mean_reprojection_error": round(float(errors.mean()), 4) if len(errors) else 0.0,
+        "first_frame": frames[0] if frames else None,
+        "last_frame": frames[-1] if frames else None,
+        # Fraction of the shot's frames that have a camera.
+        "coverage": round(len(frames) / (num_frames or span), 4) if frames else 0.0,
+    }
+
+
+def natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def quality_key(entry):
+    """Best first: most frames covered, then lowest reprojection error."""
+    summary = entry["summary"]
+    return (-summary["coverage"], -summary["images"], summary["mean_reprojection_error"])
+
+
+class ReconstructionIndex:
+    """Summaries of a project's models, stored in ``<project>/reconstructions.json``."""
+
+    def __init__(self, project_dir):
+        self.project_dir = project_dir
+        self.recon_root = os.path.join(project_dir, "reconstruction")
+        self.path = os.path.join(project_dir, INDEX_FILE)
+        self.data = {"models": {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data.update(json.load(f))
+            except (OSError, ValueError):
+                pass  # a corrupt index is rebuilt by refresh()
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def num_frames(self):
+        """Frames in the shot, from the feature database."""
+        db_path = os.path.join(self.project_dir, "database.db")
+        if not os.path.exists(db_path):
+            return None
+        import pycolmap
+        with pycolmap.Database.open(db_path) as db:
+            return db.num_images()
+
+    def refresh(self, log=print):
+        """Summarize new or rewritten models, drop deleted ones; returns self."""
+        models = self.data["models"]
+        found = set(find_models(self.recon_root))
+        changed = False
+        num_frames = None
+
+        for name in list(models):
+            if name not in found:
+                del models[name]
+                changed = True
+
+        for name in found:
+            model_dir = os.path.join(self.recon_root, name)
+            try:
+                signature = model_signature(model_dir)
+            except OSError:
+                continue  # being written right now
+            entry = models.get(name)
+            if entry and entry["signature"] == signature:
+                continue
+            if num_frames is None:
+                num_frames = self.num_frames() or 0
+            try:
+                summary = summarize_model(model_dir, num_frames)
+            except Exception as e:
+                log(f"⚠️ Could not read model {name}: {e}")
+                continue
+            models[name] = {"signature": signature, "summary": summary}
+            changed = True
+
+        if changed:
+            self.save()
+        return self
+
+    def entries(self, sort="name"):
+        """[(name, summary)] sorted by name or by quality (best first)."""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort: {sort}")
+        items = [{"name": name, **entry} for name, entry in self.data["models"].items()]
+        if sort == "quality":
+            items.sort(key=lambda item: (quality_key(item), natural_key(item["name"])))
+        else:
+            items.sort(key=lambda item: natural_key(item["name"]))
+        return [(item["name"], item["summary"]) for item in items]
+
+
+def describe(name, summary):
+    """One line description of a model for selectors and logs."""
+    return (
+        f"{name}  —  {summary['images']} img, {summary['points']} pts, "
+        f"{summary['mean_reprojection_error']:.2f}px, {summary['coverage'] * 100:.0f}% of frames"
+    )
+
+
+class ModelCache:
+    """
+    Bounded LRU cache of loaded pycolmap.Reconstructions, keyed by model
+    folder and reloaded when the files on disk change. ``get`` may be called
+    from any thread (the viewer loads models off the GUI thread).
+    """
+
+    def __init__(self, max_models=4):
+        self.max_models = max_models
+        self.models = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, model_dir):
+        """Return the loaded model, loading it when it is not cached or changed on disk."""
+        model_dir = os.path.normpath(model_dir)
+        signature = model_signature(model_dir)
+        with self.lock:
+            cached = self.models.get(model_dir)
+            if cached and cached[0] == signature:
+                self.models.move_to_end(model_dir)
+                return cached[1]
+
+        import pycolmap
+        reconstruction = pycolmap.Reconstruction(model_dir)
+        with self.lock:
+            self.models[model_dir] = (signature, reconstruction)
+            self.models.move_to_end(model_dir)
+            while len(self.models) > self.max_models:
+                self.models.popitem(last=False)
+        return reconstruction
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
@@ -0,0 +1,110 @@
+"""
+Proxy-resolution tracking for large (4K, 6K) plates.
+
+Frames are decoded at a fraction of the source resolution, by several ffmpeg
+processes in parallel that each decode one time segment. Features are
+extracted, matched and mapped on these proxies, then the models are rescaled
+back to the plate resolution. Full resolution plates are only extracted when
+something needs them, e.g. the USD background image on export.
+"""
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import imageio_ffmpeg
+import pycolmap
+
+PROXY_DIR = "proxy"
+# Shorter segments spend more time seeking than decoding.
+MIN_SEGMENT_SECONDS = 2.0
+MAX_SEGMENTS = 4
+
+
+def probe_video(source):
+    """Return the ffmpeg metadata of a video: ``size`` (width, height), ``fps`` and ``duration``."""
+    reader = imageio_ffmpeg.read_frames(str(source))
+    try:
+        meta = reader.__next__()
+    finally:
+        reader.close()
+    return meta
+
+
+def proxy_size(width, height, scale):
+    """Size of the proxy frames for a ``scale`` in (0, 1]."""
+    if not 0 < scale <= 1:
+        raise ValueError(f"Proxy scale must be in (0, 1], got {scale}")
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def plan_segments(duration, fps, num_segments=0, num_threads=-1):
+    """
+    Split a clip into [(first_frame, num_frames)] time segments, one per
+    ffmpeg process; the last segment runs to the end (``num_frames`` None).
+    """
+    if num_segments <= 0:
+        cpu_count = num_threads if num_threads > 0 else (os.cpu_count() or 1)
+        num_segments = min(MAX_SEGMENTS, max(1, cpu_count // 2))
+    num_segments = max(1, min(num_segments, int(duration // MIN_SEGMENT_SECONDS)))
+
+    total = int(duration * fps)
+    step = total // num_segments
+    segments = [(i * step, step) for i in range(num_segments - 1)]
+    segments.append(((num_segments - 1) * step, None))
+    return segments
+
+
+def extract_frames(source, dest_dir, scale=1.0, fps=24, num_segments=0, num_threads=-1,
+                   dest_name="frame_%06d.jpg", log=print):
+    """
+    Decode ``source`` to ``fps`` JPEGs scaled by ``scale``, splitting the clip
+    into time segments decoded in parallel. Frame numbers match a single
+    ffmpeg pass (frame_000001.jpg is the first frame).
+    """
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    meta = probe_video(source)
+    width, height = proxy_size(*meta["size"], scale)
+    segments = plan_segments(meta.get("duration") or 0.0, fps, num_segments, num_threads)
+
+    ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
+    threads_per_segment = max(1, num_threads // len(segments)) if num_threads > 0 else 0
+    threads = ["-threads", str(threads_per_segment)] if threads_per_segment else []
+
+    def run_segment(segment):
+        first_frame, num_frames = segment
+        # Input seeking is frame accurate when re-encoding, and the fps filter
+        # restarts at the seek point, so segments line up with a single pass.
+        seek = ["-ss", f"{first_frame / fps:.6f}"] if first_frame else []
+        limit = ["-frames:v", str(num_frames)] if num_frames is not None else []
+        cmd = [
+            ffmpeg_path, "-y", "-loglevel", "error", *threads, *seek, "-i", str(source),
+            "-vf", f"fps={fps},scale={width}:{height}:flags=area",
+            "-qscale:v", "2", "-start_number", str(first_frame + 1), *limit,
+            str(dest_dir / dest_name)
+        ]
+        subprocess.run(cmd, check=True)
+
+    log(f"🎞️ Decoding {width}x{height} frames in {len(segments)} segment(s)…")
+    with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+        list(pool.map(run_segment, segments))
+
+
+def rescale_model(model_dir, width, height):
+    """Rescale a model's cameras and 2D observations to ``width`` x ``height`` images, in place."""
+    reconstruction = pycolmap.Reconstruction(model_dir)
+    scales = {}
+    for camera_id, camera in reconstruction.cameras.items():
+        scales[camera_id] = (width / camera.width, height / camera.height)
+        camera.rescale(width, height)
+
+    for image in reconstruction.images.values():
+        scale_x, scale_y = scales[image.camera_id]
+        for point2D in image.points2D:
+            x, y = point2D.xy
+            point2D.xy = (x * scale_x, y * scale_y)
+
+    reconstruction.update_point_3d_errors()
+    reconstruction.write(model_dir)
+    return reconstruction
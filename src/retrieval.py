@@ -0,0 +1,147 @@
+"""
+Retrieval-based pair selection for the "retrieval" match type.
+
+A small visual vocabulary is clustered with k-means from the SIFT
+descriptors already in the database, so nothing has to be downloaded. Each
+frame becomes a tf-idf weighted bag of visual words and is matched with its
+sequential neighbours plus its most similar frames anywhere else in the
+shot, which finds loop closures at close to linear cost. The retrieved pairs
+go through COLMAP's matcher and verification like every other pair (see
+``sharding.match_image_pairs``).
+"""
+import numpy as np
+import pycolmap
+
+from keyframes import normalize_descriptors, strongest_indices
+
+# Features per frame quantized into visual words (largest scale first).
+WORD_FEATURES = 512
+VOCABULARY_SIZE = 512
+VOCABULARY_SAMPLES = 100000
+KMEANS_ITERATIONS = 10
+
+
+class RetrievalPairingOptions:
+    """
+    Pairing options of the retrieval match type: sequential matching with
+    ``overlap`` plus ``num_neighbors`` retrieved frames per frame.
+    """
+
+    def __init__(self, overlap=15, num_neighbors=8, vocabulary_size=VOCABULARY_SIZE):
+        self.overlap = overlap
+        self.num_neighbors = num_neighbors
+        self.vocabulary_size = vocabulary_size
+
+    def todict(self):
+        return {"overlap": self.overlap, "num_neighbors": self.num_neighbors, "vocabulary_size": self.vocabulary_size}
+
+    def sequential_options(self):
+        return pycolmap.SequentialPairingOptions(overlap=self.overlap)
+
+
+def nearest_words(descriptors, words, chunk_size=16384):
+    """Index of the closest word of each unit descriptor."""
+    labels = np.empty(len(descriptors), dtype=np.int64)
+    for start in range(0, len(descriptors), chunk_size):
+        labels[start:start + chunk_size] = np.argmax(descriptors[start:start + chunk_size] @ words.T, axis=1)
+    return labels
+
+
+def build_vocabulary(samples, num_words=VOCABULARY_SIZE, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means: ``num_words`` unit-length centers of the unit descriptors in ``samples``."""
+    rng = np.random.default_rng(seed)
+    num_words = min(num_words, len(samples))
+    words = samples[rng.choice(len(samples), num_words, replace=False)]
+    for _ in range(iterations):
+        labels = nearest_words(samples, words)
+        sums = np.zeros_like(words)
+        np.add.at(sums, labels, samples)
+        empty = np.bincount(labels, minlength=num_words) == 0
+        # Restart empty clusters on random descriptors.
+        sums[empty] = samples[rng.choice(len(samples), int(empty.sum()))]
+        words = normalize_descriptors(sums)
+    return words
+
+
+def bag_of_words(labels, num_words):
+    """tf-idf weighted, L2-normalized (N, num_words) word histograms, one row per frame."""
+    histograms = np.stack([np.bincount(words, minlength=num_words) for words in labels]).astype(np.float32)
+    frequency = np.count_nonzero(histograms, axis=0)
+    idf = np.log(len(labels) / np.maximum(frequency, 1)).astype(np.float32)
+    histograms = histograms / np.maximum(histograms.sum(axis=1, keepdims=True), 1) * idf
+    histograms /= np.maximum(np.linalg.norm(histograms, axis=1, keepdims=True), 1e-12)
+    return histograms
+
+
+def retrieve_pairs(histograms, num_neighbors, min_gap, block_size=1024):
+    """(i, j) index pairs, i < j, of every frame and its most similar frames more than ``min_gap`` frames away."""
+    count = len(histograms)
+    num_neighbors = min(num_neighbors, count - 2 * min_gap - 1)
+    if num_neighbors <= 0:
+        return []
+
+    pairs = set()
+    columns = np.arange(count)
+    for start in range(0, count, block_size):
+        rows = columns[start:start + block_size]
+        scores = histograms[rows] @ histograms.T
+        scores[np.abs(rows[:, None] - columns[None, :]) <= min_gap] = -np.inf
+        top = np.argpartition(-scores, num_neighbors - 1, axis=1)[:, :num_neighbors]
+        for row, best in zip(rows, top):
+            for column in best:
+                if scores[row - start, column] > 0:
+                    pairs.add((min(row, column), max(row, column)))
+    return sorted(pairs)
+
+
+def retrieved_pairs(db_path, pairing_options, log=print):
+    """
+    (name1, name2) pairs of every frame of ``db_path`` and its most similar
+    frames beyond the sequential overlap, by name order.
+    """
+    with pycolmap.Database.open(db_path) as db:
+        images = sorted(db.read_all_images(), key=lambda image: image.name)
+        if len(images) <= 2 * pairing_options.overlap + 1:
+            log(f"🔎 Retrieval needs more than {2 * pairing_options.overlap + 1} frames with an overlap of "
+                f"{pairing_options.overlap}: the {len(images)} frame(s) are only matched sequentially.")
+            return []
+
+        def load(image):
+            keep = strongest_indices(db.read_keypoints(image.image_id), WORD_FEATURES)
+            return normalize_descriptors(db.read_descriptors(image.image_id)[keep])
+
+        word_descriptors = [load(image) for image in images]
+    samples = np.concatenate(word_descriptors)
+    if len(samples) == 0:
+        return []
+    if len(samples) > VOCABULARY_SAMPLES:
+        samples = samples[np.random.default_rng(0).choice(len(samples), VOCABULARY_SAMPLES, replace=False)]
+
+    words = build_vocabulary(samples, pairing_options.vocabulary_size)
+    histograms = bag_of_words([nearest_words(d, words) for d in word_descriptors], len(words))
+    pairs = retrieve_pairs(histograms, pairing_options.num_neighbors, pairing_options.overlap)
+    log(f"🔎 {len(words)} visual word(s): {len(pairs)} pair(s) retrieved beyond the sequential overlap.")
+    return [(images[i].name, images[j].name) for i, j in pairs]
+
+
+def match_retrieval(db_path, matching_options, pairing_options, log=print):
+    """
+    Match ``db_path`` sequentially, then match and verify every frame with
+    its retrieved frames with the same ``matching_options``. Returns the
+    number of retrieved pairs that were matched.
+    """
+    from sharding import match_image_pairs
+
+    pycolmap.match_sequential(
+        database_path=db_path,
+        matching_options=matching_options,
+        pairing_options=pairing_options.sequential_options()
+    )
+    pairs = retrieved_pairs(db_path, pairing_options, log=log)
+    with pycolmap.Database.open(db_path) as db:
+        image_ids = {image.name: image.image_id for image in db.read_all_images()}
+        # Frames 2^k apart were already matched by the sequential pass.
+        pairs = [pair for pair in pairs if not db.exists_matches(image_ids[pair[0]], image_ids[pair[1]])]
+    if pairs:
+        match_image_pairs(db_path, pairs, matching_options)
+    return len(pairs)
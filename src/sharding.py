@@ -0,0 +1,456 @@
+"""
+Sharded feature extraction and matching, across processes or farm nodes.
+
+The frames are split into ranges of ``FRAMES_PER_SHARD`` and the image pairs
+into blocks of pairs between two ranges of ``BLOCK_SIZE`` images. Every range
+or block is a task: a JSON file in ``<project>/shards`` that a worker claims
+by creating its ``.claim`` file, runs into its own shard database and marks
+``.done``. A running worker touches its claim every ``HEARTBEAT_INTERVAL``;
+a claim untouched for ``CLAIM_LEASE``, or whose process is gone on this
+host, is stale and its task is taken over by the next worker. Workers are local processes, and any node sharing the project
+folder can help with ``cli.py shard-worker PROJECT``. Once every task is
+done, the shards are merged into the project database before mapping: images
+and cameras get new IDs, matches follow their images by name.
+
+A matching shard holds the features of the images of its block. Every other
+pair of those images gets an empty matches row first, which COLMAP's matcher
+takes as already matched, so only the pairs of the block are matched and
+verified. The retrieval match type matches its retrieved pairs the same way
+(``match_image_pairs``), in this process when the run is not sharded.
+"""
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import combinations
+
+import numpy as np
+import pycolmap
+
+from checkpoints import check_cancelled
+from keyframes import build_keyframe_database
+
+SHARDS_DIR = "shards"
+FRAMES_PER_SHARD = 100
+BLOCK_SIZE = 50
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# Seconds between checks on tasks claimed by other workers.
+POLL_INTERVAL = 1.0
+# Seconds between touches of a running task's claim, and without one before it is taken over.
+HEARTBEAT_INTERVAL = 10.0
+CLAIM_LEASE = 120.0
+NO_MATCHES = np.empty((0, 2), dtype=np.uint32)
+
+
+def shards_dir(project_dir):
+    return os.path.join(project_dir, SHARDS_DIR)
+
+
+def task_path(project_dir, name, ext=".json"):
+    return os.path.join(shards_dir(project_dir), name + ext)
+
+
+def is_done(project_dir, name):
+    return os.path.isfile(task_path(project_dir, name, ".done"))
+
+
+def pid_alive(pid):
+    """Whether a local process runs, None where it cannot be checked."""
+    if os.name == "nt":
+        return None  # os.kill would terminate it
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's
+    return True
+
+
+def claim_is_stale(path):
+    """Whether a claim file outlived its worker: no heartbeat within the lease, or its local process is gone."""
+    try:
+        age = time.time() - os.path.getmtime(path)
+        with open(path, "r", encoding="utf-8") as f:
+            host, pid = f.read().rsplit(" ", 1)
+    except (OSError, ValueError):
+        return False  # gone, or still being written
+    if age > CLAIM_LEASE:
+        return True
+    return host == socket.gethostname() and pid_alive(int(pid)) is False
+
+
+def is_claimed(project_dir, name):
+    """Whether a live worker has the task."""
+    path = task_path(project_dir, name, ".claim")
+    return os.path.isfile(path) and not claim_is_stale(path)
+
+
+def release_stale_claim(project_dir, name):
+    """Remove the claim of a task if it is stale; returns whether it was."""
+    path = task_path(project_dir, name, ".claim")
+    if not claim_is_stale(path):
+        return False
+    # Renamed first: of several workers releasing it, one gets the file.
+    stale_path = f"{path}.{socket.gethostname()}.{os.getpid()}"
+    try:
+        mtime = os.path.getmtime(path)
+        os.rename(path, stale_path)
+    except OSError:
+        return False
+    if os.path.getmtime(stale_path) != mtime:
+        # Another worker released it and claimed the task in between: give it back.
+        os.replace(stale_path, path)
+        return False
+    os.remove(stale_path)
+    return True
+
+
+def remove_task_files(project_dir, name):
+    for ext in (".json", ".claim", ".done", ".db"):
+        if os.path.exists(task_path(project_dir, name, ext)):
+            os.remove(task_path(project_dir, name, ext))
+
+
+def stage_tasks(project_dir, stage):
+    """Names of the tasks of ``stage`` on disk, in order."""
+    if not os.path.isdir(shards_dir(project_dir)):
+        return []
+    names = [
+        name[:-len(".json")] for name in os.listdir(shards_dir(project_dir))
+        if name.startswith(stage + "_") and name.endswith(".json")
+    ]
+    return sorted(names, key=lambda name: int(name.rsplit("_", 1)[1]))
+
+
+def clear_tasks(project_dir, stage):
+    """Remove the tasks and shard databases of ``stage``."""
+    for name in stage_tasks(project_dir, stage):
+        remove_task_files(project_dir, name)
+
+
+def write_tasks(project_dir, stage, tasks):
+    """
+    Write the tasks of ``stage`` ("features" or "matches") and return their
+    names. Finished tasks identical to the new ones are kept, so an
+    interrupted stage only runs the shards it had not finished; claims of
+    unfinished tasks are left over from a stopped run and are dropped.
+    """
+    os.makedirs(shards_dir(project_dir), exist_ok=True)
+    names = []
+    for i, task in enumerate(tasks):
+        name = f"{stage}_{i}"
+        names.append(name)
+        try:
+            with open(task_path(project_dir, name), "r", encoding="utf-8") as f:
+                unchanged = json.load(f) == task
+        except (OSError, ValueError):
+            unchanged = False
+        if unchanged and is_done(project_dir, name):
+            continue
+        remove_task_files(project_dir, name)
+        tmp_path = task_path(project_dir, name, ".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(task, f)
+        os.replace(tmp_path, task_path(project_dir, name))
+    for name in stage_tasks(project_dir, stage)[len(tasks):]:
+        remove_task_files(project_dir, name)
+    return names
+
+
+def claim_task(project_dir, name):
+    """Atomically claim a task; False if another worker has it (a stale claim is taken over)."""
+    path = task_path(project_dir, name, ".claim")
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        if not release_stale_claim(project_dir, name):
+            return False
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(f"{socket.gethostname()} {os.getpid()}")
+    return True
+
+
+def heartbeat(path, stop):
+    """Touch a claim until ``stop`` is set, so other workers see it is alive."""
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+def run_task(project_dir, name, num_threads=-1):
+    """Worker entry point: claim and run one task. Returns False if it was claimed by another worker."""
+    if is_done(project_dir, name) or not claim_task(project_dir, name):
+        return False
+    stop = threading.Event()
+    threading.Thread(
+        target=heartbeat, args=(task_path(project_dir, name, ".claim"), stop), name="claim-heartbeat", daemon=True
+    ).start()
+    try:
+        with open(task_path(project_dir, name), "r", encoding="utf-8") as f:
+            task = json.load(f)
+        db_path = task_path(project_dir, name, ".db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        if task["stage"] == "features":
+            extract_shard(project_dir, task, db_path, num_threads)
+        else:
+            match_shard(project_dir, task, db_path, num_threads)
+    except BaseException:
+        # Let another worker retry it.
+        stop.set()
+        os.remove(task_path(project_dir, name, ".claim"))
+        raise
+    stop.set()
+    open(task_path(project_dir, name, ".done"), "w").close()
+    return True
+
+
+def work(project_dir, num_threads=-1, log=print):
+    """Run unclaimed tasks of a project until none are left (``cli.py shard-worker``); returns how many ran."""
+    ran = 0
+    while True:
+        pending = [
+            name for stage in ("features", "matches") for name in stage_tasks(project_dir, stage)
+            if not is_done(project_dir, name) and not is_claimed(project_dir, name)
+        ]
+        if not pending:
+            return ran
+        for name in pending:
+            if run_task(project_dir, name, num_threads):
+                ran += 1
+                log(f"🧩 Finished shard {name}.")
+
+
+def run_tasks(project_dir, names, jobs, num_threads=-1, cancel=None, log=print):
+    """Run tasks on ``jobs`` local processes, also waiting for the ones other workers claimed."""
+    cpu_count = num_threads if num_threads > 0 else (os.cpu_count() or 1)
+    jobs = max(1, min(jobs, len(names)))
+    threads_per_job = max(1, cpu_count // jobs)
+    remaining = [name for name in names if not is_done(project_dir, name)]
+    if len(remaining) < len(names):
+        log(f"⏯️ Reusing {len(names) - len(remaining)} shard(s) finished before.")
+    log(f"🧩 Running {len(remaining)} shard(s): {jobs} job(s) x {threads_per_job} thread(s)")
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+        pending = {}
+        waiting_logged = False
+        try:
+            while True:
+                remaining = [name for name in remaining if not is_done(project_dir, name)]
+                if not remaining or (cancel is not None and cancel.is_set()):
+                    break
+                # Unclaimed tasks are (re)queued: a worker that failed releases its claim,
+                # one that died leaves a stale claim behind.
+                queued = set(pending.values())
+                for name in remaining:
+                    if name in queued:
+                        continue
+                    if release_stale_claim(project_dir, name):
+                        log(f"♻️ Shard {name} was claimed by a worker that stopped, running it again.")
+                    if not is_claimed(project_dir, name):
+                        pending[pool.submit(run_task, project_dir, name, threads_per_job)] = name
+                if not pending:
+                    if not waiting_logged:
+                        log(f"⏳ Waiting for {len(remaining)} shard(s) claimed by other workers…")
+                        waiting_logged = True
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                done, _ = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.pop(future)
+                    future.result()
+        finally:
+            # Running tasks finish and are kept, the queued ones are dropped.
+            for future in pending:
+                future.cancel()
+    check_cancelled(cancel)
+
+
+def frame_names(frames_path):
+    return sorted(name for name in os.listdir(frames_path) if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def extract_shard(project_dir, task, db_path, num_threads=-1):
+    mask_path = task["mask_path"]
+    pycolmap.extract_features(
+        database_path=db_path,
+        image_path=os.path.join(project_dir, task["image_path"]),
+        image_names=task["image_names"],
+        camera_mode=pycolmap.CameraMode.SINGLE,
+        camera_model=task["camera_model"],
+        reader_options=pycolmap.ImageReaderOptions(mask_path=os.path.join(project_dir, mask_path) if mask_path else ""),
+        extraction_options=pycolmap.FeatureExtractionOptions(num_threads=num_threads)
+    )
+
+
+def merge_feature_shards(shard_paths, db_path):
+    """
+    Combine feature shards into a new ``db_path``. Cameras with the same
+    model, size and parameters (one per shard in single camera mode) become one.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    with pycolmap.Database.open(db_path) as dst, pycolmap.DatabaseTransaction(dst):
+        cameras = {}
+        for shard_path in shard_paths:
+            with pycolmap.Database.open(shard_path) as src:
+                camera_ids = {}
+                for camera in src.read_all_cameras():
+                    key = (str(camera.model), camera.width, camera.height, tuple(camera.params))
+                    if key not in cameras:
+                        camera_id = dst.write_camera(camera)
+                        rig = pycolmap.Rig()
+                        rig.add_ref_sensor(pycolmap.sensor_t(type=pycolmap.SensorType.CAMERA, id=camera_id))
+                        cameras[key] = (camera_id, dst.write_rig(rig))
+                    camera_ids[camera.camera_id] = cameras[key]
+
+                for image in sorted(src.read_all_images(), key=lambda image: image.name):
+                    camera_id, rig_id = camera_ids[image.camera_id]
+                    image_id = dst.write_image(pycolmap.Image(name=image.name, camera_id=camera_id))
+                    frame = pycolmap.Frame(rig_id=rig_id)
+                    frame.add_data_id(pycolmap.data_t(
+                        sensor_id=pycolmap.sensor_t(type=pycolmap.SensorType.CAMERA, id=camera_id), id=image_id
+                    ))
+                    dst.write_frame(frame)
+                    dst.write_keypoints(image_id, src.read_keypoints(image.image_id))
+                    dst.write_descriptors(image_id, src.read_descriptors(image.image_id))
+
+
+def extract_sharded(project_dir, db_path, frames_path, camera_model, jobs, num_threads=-1, mask_dir=None,
+                    cancel=None, log=print):
+    """Extract features of ``frames_path`` in frame range shards and merge them into ``db_path``."""
+    names = frame_names(frames_path)
+    tasks = [
+        {
+            "stage": "features",
+            "image_path": os.path.relpath(frames_path, project_dir),
+            "image_names": names[start:start + FRAMES_PER_SHARD],
+            "camera_model": camera_model,
+            "mask_path": os.path.relpath(mask_dir, project_dir) if mask_dir else None,
+        }
+        for start in range(0, len(names), FRAMES_PER_SHARD)
+    ]
+    task_names = write_tasks(project_dir, "features", tasks)
+    run_tasks(project_dir, task_names, jobs, num_threads=num_threads, cancel=cancel, log=log)
+    log(f"🧩 Merging {len(task_names)} feature shard(s)…")
+    merge_feature_shards([task_path(project_dir, name, ".db") for name in task_names], db_path)
+    clear_tasks(project_dir, "features")
+
+
+def pair_generator(match_type, pairing_options, db):
+    if match_type == "exhaustive":
+        return pycolmap.ExhaustivePairGenerator(pairing_options, db)
+    if match_type == "sequential":
+        return pycolmap.SequentialPairGenerator(pairing_options, db)
+    if match_type == "spatial":
+        return pycolmap.SpatialPairGenerator(pairing_options, db)
+    if match_type == "retrieval":
+        # The sequential pairs; match_sharded adds the retrieved ones.
+        return pycolmap.SequentialPairGenerator(pairing_options.sequential_options(), db)
+    raise ValueError(f"Unknown match type: {match_type}")
+
+
+def pair_blocks(names, pairs, block_size):
+    """Group (name1, name2) pairs by the ranges of ``block_size`` sorted ``names`` their images are in."""
+    index = {name: i for i, name in enumerate(names)}
+    blocks = {}
+    for pair in pairs:
+        i, j = sorted(index[name] for name in pair)
+        blocks.setdefault((i // block_size, j // block_size), []).append([names[i], names[j]])
+    return [blocks[key] for key in sorted(blocks)]
+
+
+def match_block(db_path, block_db_path, pairs, matching_options):
+    """Match and verify only ``pairs`` (name pairs in name order) of ``db_path``'s images into a new database."""
+    pairs = {tuple(pair) for pair in pairs}
+    names = sorted({name for pair in pairs for name in pair})
+    build_keyframe_database(db_path, block_db_path, names)
+    with pycolmap.Database.open(block_db_path) as db:
+        image_ids = {image.name: image.image_id for image in db.read_all_images()}
+        with pycolmap.DatabaseTransaction(db):
+            for name1, name2 in combinations(names, 2):
+                if (name1, name2) not in pairs:
+                    db.write_matches(image_ids[name1], image_ids[name2], NO_MATCHES)
+
+    pycolmap.match_exhaustive(
+        database_path=block_db_path,
+        matching_options=matching_options,
+        pairing_options=pycolmap.ExhaustivePairingOptions(block_size=BLOCK_SIZE)
+    )
+
+
+def match_shard(project_dir, task, db_path, num_threads=-1):
+    matching_options = pycolmap.FeatureMatchingOptions(task["matching_options"])
+    matching_options.num_threads = num_threads
+    match_block(os.path.join(project_dir, task["database"]), db_path, task["pairs"], matching_options)
+
+
+def match_image_pairs(db_path, pairs, matching_options):
+    """Match and verify a list of (name1, name2) pairs of ``db_path`` in this process, block by block."""
+    with pycolmap.Database.open(db_path) as db:
+        names = sorted(image.name for image in db.read_all_images())
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        block_db_path = os.path.join(tmp_dir, "block.db")
+        for block in pair_blocks(names, pairs, BLOCK_SIZE):
+            match_block(db_path, block_db_path, block, matching_options)
+            merge_match_shards([block_db_path], db_path)
+
+
+def merge_match_shards(shard_paths, db_path):
+    """Add the matches and two-view geometries of matching shards to ``db_path``, by image name."""
+    with pycolmap.Database.open(db_path) as dst, pycolmap.DatabaseTransaction(dst):
+        image_ids = {image.name: image.image_id for image in dst.read_all_images()}
+        for shard_path in shard_paths:
+            with pycolmap.Database.open(shard_path) as src:
+                names = {image.image_id: image.name for image in src.read_all_images()}
+
+                def project_ids(pair_id):
+                    id1, id2 = pycolmap.pair_id_to_image_pair(pair_id)
+                    return image_ids[names[id1]], image_ids[names[id2]]
+
+                for pair_id, matches in zip(*src.read_all_matches()):
+                    # Empty rows are the pairs outside the shard's block.
+                    if len(matches):
+                        dst.write_matches(*project_ids(pair_id), matches)
+                for pair_id, geometry in zip(*src.read_two_view_geometries()):
+                    dst.write_two_view_geometry(*project_ids(pair_id), geometry)
+
+
+def match_sharded(project_dir, db_path, match_type, matching_options, pairing_options, jobs, num_threads=-1,
+                  cancel=None, log=print):
+    """Match the pairs of ``match_type`` in ``db_path`` in pair block shards and merge the matches back."""
+    with pycolmap.Database.open(db_path) as db:
+        names = {image.image_id: image.name for image in db.read_all_images()}
+        pairs = [(names[id1], names[id2]) for id1, id2 in pair_generator(match_type, pairing_options, db).all_pairs()]
+    if match_type == "retrieval":
+        from retrieval import retrieved_pairs
+
+        pairs = sorted({tuple(sorted(pair)) for pair in pairs + retrieved_pairs(db_path, pairing_options, log=log)})
+
+    tasks = [
+        {
+            "stage": "matches",
+            "database": os.path.relpath(db_path, project_dir),
+            "pairs": block,
+            "matching_options": matching_options.todict(),
+        }
+        for block in pair_blocks(sorted(names.values()), pairs, BLOCK_SIZE)
+    ]
+    log(f"🧩 {len(pairs)} pair(s) in {len(tasks)} block(s) of up to {BLOCK_SIZE}x{BLOCK_SIZE} image(s).")
+    task_names = write_tasks(project_dir, "matches", tasks)
+    run_tasks(project_dir, task_names, jobs, num_threads=num_threads, cancel=cancel, log=log)
+    log(f"🧩 Merging {len(task_names)} match shard(s)…")
+    merge_match_shards([task_path(project_dir, name, ".db") for name in task_names], db_path)
+    clear_tasks(project_dir, "matches")
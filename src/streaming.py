@@ -0,0 +1,200 @@
+"""
+Streaming frame decode piped straight into SIFT feature extraction.
+
+ffmpeg decodes the source once and writes raw grayscale frames to a pipe. A
+reader thread feeds them into a bounded queue that SIFT workers consume, so
+decoding and feature extraction overlap and no JPEG is re-read from disk. The
+background plate JPEGs are written by the same ffmpeg process as a second
+output, or skipped entirely.
+"""
+import os
+import queue
+import subprocess
+import threading
+from pathlib import Path
+
+import imageio_ffmpeg
+import numpy as np
+import pycolmap
+
+from checkpoints import check_cancelled
+from masking import read_mask
+
+# COLMAP's default focal length prior, as a factor of the largest image side.
+DEFAULT_FOCAL_LENGTH_FACTOR = 1.2
+
+
+def probe_video_size(source):
+    """Return the (width, height) of the frames ffmpeg will produce for a video."""
+    reader = imageio_ffmpeg.read_frames(str(source))
+    try:
+        meta = reader.__next__()
+    finally:
+        reader.close()
+    return tuple(meta["size"])
+
+
+def stream_size(width, height, max_image_size):
+    """Size frames are decoded at for SIFT, limited like COLMAP's image reader."""
+    if max_image_size <= 0 or max(width, height) <= max_image_size:
+        return width, height
+    scale = max_image_size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def to_colmap_keypoints(keypoints, scale_x=1.0, scale_y=1.0):
+    """
+    Convert Sift (x, y, scale, orientation) rows into COLMAP's affine
+    keypoints, with the frame scaled by ``diag(scale_x, scale_y)``.
+    """
+    x, y, scale, orientation = keypoints.T
+    cos = scale * np.cos(orientation)
+    sin = scale * np.sin(orientation)
+    return np.stack([
+        x * scale_x, y * scale_y,
+        cos * scale_x, -sin * scale_x,
+        sin * scale_y, cos * scale_y,
+    ], axis=1).astype(np.float32)
+
+
+def to_colmap_descriptors(descriptors):
+    """Quantize normalized float descriptors the way COLMAP stores them."""
+    return np.minimum(np.round(descriptors * 512.0), 255).astype(np.uint8)
+
+
+def read_frames(stdout, frame_bytes, shape, frame_queue, stop):
+    """Reader thread: push (index, frame) pairs from the pipe, then a None sentinel."""
+    index = 1
+    try:
+        while not stop.is_set():
+            buffer = stdout.read(frame_bytes)
+            if len(buffer) < frame_bytes:
+                break
+            frame_queue.put((index, np.frombuffer(buffer, dtype=np.uint8).reshape(shape)))
+            index += 1
+    finally:
+        frame_queue.put(None)
+
+
+def mask_keypoints(keypoints, descriptors, mask):
+    """Drop the keypoints (plate pixels) that fall where ``mask`` is False, like COLMAP's mask_path."""
+    height, width = mask.shape
+    x = np.clip(keypoints[:, 0].astype(np.int64), 0, width - 1)
+    y = np.clip(keypoints[:, 1].astype(np.int64), 0, height - 1)
+    keep = mask[y, x]
+    return keypoints[keep], descriptors[keep]
+
+
+def stream_features(source, db_path, camera_model, frames_dir=None, dest_name="frame_%06d.jpg",
+                    fps=24, scale=1.0, queue_size=16, num_threads=-1, mask_dir=None, cancel=None, log=print):
+    """
+    Decode ``source`` through a pipe and extract SIFT features into ``db_path``
+    while decoding. JPEG plates go to ``frames_dir`` when one is given.
+    ``scale`` downsizes the frames SIFT sees; keypoints stay in plate pixels.
+    Keypoints are masked by the plate sized masks in ``mask_dir`` (see masking).
+    Setting ``cancel`` stops at the next frame. Returns the number of frames processed.
+    """
+    width, height = probe_video_size(source)
+    extraction_options = pycolmap.FeatureExtractionOptions()
+    sift_width, sift_height = stream_size(
+        max(1, round(width * scale)), max(1, round(height * scale)), extraction_options.max_image_size
+    )
+    scale_x, scale_y = width / sift_width, height / sift_height
+
+    ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
+    threads = ["-threads", str(num_threads)] if num_threads > 0 else []
+    cmd = [
+        ffmpeg_path, "-y", "-loglevel", "error", *threads, "-i", str(source),
+        "-vf", f"fps={fps},scale={sift_width}:{sift_height}",
+        "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1",
+    ]
+    if frames_dir:
+        Path(frames_dir).mkdir(parents=True, exist_ok=True)
+        cmd += ["-vf", f"fps={fps}", "-qscale:v", "2", *threads, str(Path(frames_dir) / dest_name)]
+
+    num_workers = num_threads if num_threads > 0 else (os.cpu_count() or 1)
+    frame_queue = queue.Queue(maxsize=max(queue_size, num_workers))
+    stop = threading.Event()
+    db_lock = threading.Lock()
+    errors = []
+    counts = []
+
+    database = pycolmap.Database.open(str(db_path))
+    camera = pycolmap.Camera.create(
+        1, pycolmap.CameraModelId(camera_model),
+        DEFAULT_FOCAL_LENGTH_FACTOR * max(width, height), width, height
+    )
+    camera_id = database.write_camera(camera)
+    rig = pycolmap.Rig()
+    rig.add_ref_sensor(pycolmap.sensor_t(type=pycolmap.SensorType.CAMERA, id=camera_id))
+    rig_id = database.write_rig(rig)
+
+    def extract_worker():
+        sift = pycolmap.Sift(extraction_options)
+        processed = 0
+        try:
+            while True:
+                item = frame_queue.get()
+                if item is None:
+                    frame_queue.put(None)  # let the other workers see the sentinel
+                    break
+                check_cancelled(cancel)
+                index, frame = item
+                name = Path(dest_name % index).name
+                keypoints, descriptors = sift.extract(frame)
+                keypoints = to_colmap_keypoints(keypoints, scale_x, scale_y)
+                descriptors = to_colmap_descriptors(descriptors)
+                mask = read_mask(mask_dir, name) if mask_dir else None
+                if mask is not None:
+                    keypoints, descriptors = mask_keypoints(keypoints, descriptors, mask)
+
+                with db_lock:
+                    image = pycolmap.Image(name=name, camera_id=camera_id, image_id=index)
+                    image_id = database.write_image(image, use_image_id=True)
+                    frame_record = pycolmap.Frame(frame_id=index, rig_id=rig_id)
+                    frame_record.add_data_id(pycolmap.data_t(sensor_id=camera.sensor_id, id=image_id))
+                    database.write_frame(frame_record, use_frame_id=True)
+                    database.write_keypoints(image_id, keypoints)
+                    database.write_descriptors(image_id, descriptors)
+                processed += 1
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+            # Keep draining so the reader thread never blocks on a full queue.
+            while frame_queue.get() is not None:
+                pass
+            frame_queue.put(None)
+        finally:
+            counts.append(processed)
+
+    log(f"[FFmpeg] Streaming frames from embedded binary: {ffmpeg_path}")
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    reader = threading.Thread(
+        target=read_frames,
+        args=(process.stdout, sift_width * sift_height, (sift_height, sift_width), frame_queue, stop),
+        daemon=True
+    )
+    workers = [threading.Thread(target=extract_worker, daemon=True) for _ in range(num_workers)]
+
+    try:
+        reader.start()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        reader.join()
+    finally:
+        if stop.is_set() and process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        return_code = process.wait()
+        database.close()
+
+    if errors:
+        raise errors[0]
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, cmd)
+
+    num_frames = sum(counts)
+    log(f"🎞️ Streamed {num_frames} frame(s) into feature extraction.")
+    return num_frames
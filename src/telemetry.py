@@ -0,0 +1,318 @@
+"""
+Per-stage performance telemetry.
+
+A RunReport times every pipeline stage (wall time, CPU time including waited
+child processes such as ffmpeg and mapping workers, and the peak resident
+memory sampled while the stage runs) next to the
+numbers that explain it: frames, features per image, verified pairs,
+registered images and reprojection error. The report is saved as
+``report.json`` in the reconstruction folder so runs can be compared later.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+REPORT_NAME = "report.json"
+# Seconds between memory samples while a stage runs.
+MEMORY_INTERVAL = 0.2
+MB = 1024 * 1024
+
+
+def cpu_seconds():
+    """User + system CPU time of this process and its waited-for children."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def process_tree(pid):
+    """``pid`` and the pids of its descendants, from /proc."""
+    pids = [pid]
+    for parent in pids:  # grows while it is walked
+        try:
+            tasks = os.listdir(f"/proc/{parent}/task")
+        except OSError:
+            continue
+        for task in tasks:
+            try:
+                with open(f"/proc/{parent}/task/{task}/children", "r") as f:
+                    pids += [int(child) for child in f.read().split()]
+            except OSError:
+                pass
+    return pids
+
+
+def rss_mb():
+    """
+    Resident memory in use now, in MB: this process and its child processes
+    (ffmpeg, mapping and shard workers) on Linux, this process on Windows,
+    None elsewhere.
+    """
+    if os.path.isdir("/proc/self"):
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        total = 0
+        for pid in process_tree(os.getpid()):
+            try:
+                with open(f"/proc/{pid}/statm", "r") as f:
+                    total += int(f.read().split()[1]) * page_size
+            except (OSError, IndexError, ValueError):
+                pass  # exited meanwhile
+        return total / MB
+
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize / MB
+    return None
+
+
+class MemorySampler:
+    """Samples ``rss_mb`` on a background thread while in use; ``peak`` is the largest sample."""
+
+    def __init__(self, interval=MEMORY_INTERVAL):
+        self.interval = interval
+        self.peak = None
+        self.stop = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        rss = rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def run(self):
+        while not self.stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        if self.peak is not None:
+            self.thread = threading.Thread(target=self.run, name="memory-sampler", daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.sample()
+        return False
+
+
+class RunReport:
+    """
+    Collects stage timings and metrics for one tracking run. ``on_stage`` is
+    called with ``(name, None)`` when a stage starts and ``(name, stats)``
+    when it ends.
+    """
+
+    def __init__(self, settings=None, on_stage=None):
+        self.on_stage = on_stage
+        self.data = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "platform": sys.platform,
+            "cpu_count": os.cpu_count(),
+            "settings": settings or {},
+            "stages": {},
+            "metrics": {},
+        }
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a stage. The yielded dict takes extra stage metrics (e.g. ``skipped``)
+        and holds the timings once the stage is done.
+        """
+        stats = {}
+        if self.on_stage is not None:
+            self.on_stage(name, None)
+        wall, cpu = time.perf_counter(), cpu_seconds()
+        memory = MemorySampler()
+        try:
+            with memory:
+                yield stats
+        finally:
+            stats["wall_s"] = round(time.perf_counter() - wall, 3)
+            stats["cpu_s"] = round(cpu_seconds() - cpu, 3)
+            stats["peak_rss_mb"] = round(memory.peak, 1) if memory.peak is not None else None
+            self.data["stages"][name] = stats
+            if self.on_stage is not None:
+                self.on_stage(name, stats)
+
+    def save(self, folder):
+        path = os.path.join(folder, REPORT_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+        return path
+
+
+def database_metrics(db_path):
+    """Frame, feature and verified pair counts of a COLMAP database."""
+    import pycolmap
+
+    if not os.path.exists(db_path):
+        return {}
+    with pycolmap.Database.open(db_path) as db:
+        num_images = db.num_images()
+        return {
+            "frames": num_images,
+            "features_per_image": round(db.num_keypoints() / num_images, 1) if num_images else 0,
+            "matched_pairs": db.num_matched_image_pairs(),
+            "verified_pairs": db.num_verified_image_pairs(),
+        }
+
+
+def model_metrics(recon_dir):
+    """Registered images, points and mean reprojection error of each model in a reconstruction folder."""
+    import pycolmap
+
+    models = {}
+    for name in sorted(os.listdir(recon_dir)):
+        model_dir = os.path.join(recon_dir, name)
+        if not os.path.isfile(os.path.join(model_dir, "images.bin")):
+            continue
+        reconstruction = pycolmap.Reconstruction(model_dir)
+        models[name] = {
+            "registered_images": reconstruction.num_reg_images(),
+            "points": reconstruction.num_points3D(),
+            "mean_reprojection_error": round(reconstruction.compute_mean_reprojection_error(), 4),
+        }
+    return models
+
+
+def find_report(path):
+    """Report path for a report file, reconstruction folder or model folder, or None."""
+    if os.path.isfile(path):
+        return path
+    for folder in (path, os.path.dirname(os.path.normpath(path))):
+        candidate = os.path.join(folder, REPORT_NAME)
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def load_report(path):
+    report_path = find_report(path)
+    if report_path is None:
+        raise FileNotFoundError(f"No {REPORT_NAME} found at {path}")
+    with open(report_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@contextmanager
+def record_stage(model_dir, name):
+    """Time a stage run after tracking (e.g. export) and add it to the model's report."""
+    report = RunReport()
+    report_path = find_report(model_dir)
+    if report_path:
+        with open(report_path, "r", encoding="utf-8") as f:
+            report.data = json.load(f)
+    with report.stage(name) as stats:
+        yield stats
+    report.save(os.path.dirname(report_path) if report_path else model_dir)
+
+
+def format_seconds(seconds):
+    if seconds >= 60:
+        return f"{int(seconds // 60)}m{seconds % 60:04.1f}s"
+    return f"{seconds:.1f}s"
+
+
+def format_summary(data):
+    """Human readable summary lines of a report."""
+    lines = ["📊 Run summary"]
+    total = 0.0
+    for name, stage in data["stages"].items():
+        total += stage["wall_s"]
+        rss = f", peak {stage['peak_rss_mb']:.0f} MB" if stage.get("peak_rss_mb") is not None else ""
+        note = " (reused)" if stage.get("skipped") else ""
+        lines.append(
+            f"  {name:<10} {format_seconds(stage['wall_s']):>9} wall, {format_seconds(stage['cpu_s']):>9} CPU{rss}{note}"
+        )
+    lines.append(f"  {'total':<10} {format_seconds(total):>9} wall")
+
+    metrics = data.get("metrics", {})
+    if "frames" in metrics:
+        lines.append(
+            f"  {metrics['frames']} frame(s), {metrics['features_per_image']:.0f} feature(s)/image, "
+            f"{metrics['verified_pairs']} verified pair(s)"
+        )
+    for name, model in metrics.get("models", {}).items():
+        lines.append(
+            f"  model {name}: {model['registered_images']} image(s), {model['points']} point(s), "
+            f"{model['mean_reprojection_error']:.3f} px mean reprojection error"
+        )
+    return lines
+
+
+def flatten(data):
+    """Comparable numbers of a report as {"stage.field": value}."""
+    values = {}
+    for name, stage in data["stages"].items():
+        for field in ("wall_s", "cpu_s", "peak_rss_mb"):
+            if stage.get(field) is not None:
+                values[f"{name}.{field}"] = stage[field]
+    metrics = data.get("metrics", {})
+    for key, value in metrics.items():
+        if isinstance(value, (int, float)):
+            values[key] = value
+    for name, model in metrics.get("models", {}).items():
+        for key, value in model.items():
+            values[f"model_{name}.{key}"] = value
+    return values
+
+
+def format_value(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def compare_reports(before, after):
+    """Lines diffing two reports: every number with its relative change, then changed settings."""
+    a, b = flatten(before), flatten(after)
+    keys = list(a) + [key for key in b if key not in a]
+    width = max([len(key) for key in keys] + [6])
+
+    lines = [f"{'metric':<{width}} {'before':>12} {'after':>12} {'change':>9}"]
+    for key in keys:
+        old, new = a.get(key), b.get(key)
+        if old is None or new is None:
+            change = "new" if old is None else "gone"
+        elif old == 0:
+            change = "" if new == 0 else "+inf"
+        else:
+            change = f"{(new - old) / abs(old) * 100:+.1f}%"
+        lines.append(f"{key:<{width}} {format_value(old):>12} {format_value(new):>12} {change:>9}")
+
+    settings_before, settings_after = before.get("settings", {}), after.get("settings", {})
+    for key in sorted(set(settings_before) | set(settings_after)):
+        if settings_before.get(key) != settings_after.get(key):
+            lines.append(f"setting {key}: {settings_before.get(key)} -> {settings_after.get(key)}")
+    return lines
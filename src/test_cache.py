@@ -0,0 +1,84 @@
+import os
+
+import pycolmap
+
+from cache import (
+    CACHE_FILE, CHECKPOINT_FILE, StageCache, find_checkpoint, find_reconstruction, fingerprint, options_dict,
+    write_fingerprint,
+)
+from tracking import frames_fingerprint
+
+
+def stage_keys(cache, video_path, fps=24, camera_model="SIMPLE_RADIAL", num_threads=-1):
+    """The key chain of run_tracking, from frames to mapping."""
+    frames = frames_fingerprint(cache, video_path, fps)
+    features = fingerprint(frames, camera_model=camera_model, decode="jpeg")
+    matches = fingerprint(
+        features, match_type="sequential",
+        matching_options=options_dict(pycolmap.FeatureMatchingOptions(num_threads=num_threads))
+    )
+    mapping = fingerprint(matches, mapper="incremental")
+    return {"frames": frames, "features": features, "matches": matches, "mapping": mapping}
+
+
+def write_clip(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_upstream_changes_change_every_downstream_key(tmp_path):
+    video_path = str(tmp_path / "source.mp4")
+    write_clip(video_path, b"clip")
+    cache = StageCache(str(tmp_path))
+    keys = stage_keys(cache, video_path)
+
+    # Threads change speed, not results.
+    assert stage_keys(cache, video_path, num_threads=3) == keys
+
+    other_fps = stage_keys(cache, video_path, fps=25)
+    assert all(other_fps[stage] != keys[stage] for stage in keys)
+
+    other_model = stage_keys(cache, video_path, camera_model="OPENCV")
+    assert other_model["frames"] == keys["frames"]
+    assert all(other_model[stage] != keys[stage] for stage in ("features", "matches", "mapping"))
+
+    write_clip(video_path, b"another clip")
+    os.utime(video_path, ns=(1, 1))
+    new_source = stage_keys(cache, video_path)
+    assert all(new_source[stage] != keys[stage] for stage in keys)
+
+
+def test_unchanged_inputs_keep_stages_fresh(tmp_path):
+    video_path = str(tmp_path / "source.mp4")
+    write_clip(video_path, b"clip")
+    cache = StageCache(str(tmp_path))
+    keys = stage_keys(cache, video_path)
+    for stage, key in keys.items():
+        cache.store(stage, key)
+
+    reopened = StageCache(str(tmp_path))
+    assert all(reopened.is_fresh(stage, key) for stage, key in stage_keys(reopened, video_path).items())
+    assert not reopened.is_fresh("features", stage_keys(reopened, video_path, camera_model="OPENCV")["features"])
+
+    reopened.invalidate("matches")
+    assert not StageCache(str(tmp_path)).is_fresh("matches", keys["matches"])
+
+
+def test_a_corrupt_cache_only_costs_a_rerun(tmp_path):
+    (tmp_path / CACHE_FILE).write_text("{not json")
+
+    assert not StageCache(str(tmp_path)).is_fresh("frames", "key")
+
+
+def test_finished_and_unfinished_reconstructions_are_told_apart(tmp_path):
+    recon_root = tmp_path / "reconstruction"
+    finished, unfinished = recon_root / "0", recon_root / "1"
+    os.makedirs(finished / "0")
+    os.makedirs(unfinished)
+    write_fingerprint(str(finished), "done-key")
+    write_fingerprint(str(unfinished), "started-key", name=CHECKPOINT_FILE)
+
+    assert find_reconstruction(str(recon_root), "done-key") == str(finished)
+    assert find_reconstruction(str(recon_root), "started-key") is None
+    assert find_checkpoint(str(recon_root), "started-key") == str(unfinished)
+    assert find_checkpoint(str(recon_root), "done-key") is None
@@ -0,0 +1,59 @@
+import numpy as np
+import pycolmap
+
+from chunked import MIN_SHARED_FRAMES, estimate_join, split_chunks
+
+NAMES = [f"frame_{i:06d}.jpg" for i in range(10)]
+
+
+def reconstruction(centers):
+    """A single-camera model with frames looking down +z from ``centers`` ({image_id: center})."""
+    recon = pycolmap.Reconstruction()
+    camera = pycolmap.Camera(model="SIMPLE_PINHOLE", width=640, height=480, params=[500.0, 320.0, 240.0],
+                             camera_id=1)
+    recon.add_camera(camera)
+    rig = pycolmap.Rig(rig_id=1)
+    rig.add_ref_sensor(camera.sensor_id)
+    recon.add_rig(rig)
+    for image_id, center in centers.items():
+        frame = pycolmap.Frame(frame_id=image_id, rig_id=1)
+        frame.add_data_id(pycolmap.data_t(sensor_id=camera.sensor_id, id=image_id))
+        frame.rig_from_world = pycolmap.Rigid3d(pycolmap.Rotation3d(), -np.asarray(center))
+        recon.add_frame(frame)
+        recon.add_image(pycolmap.Image(name=NAMES[image_id], camera_id=1, image_id=image_id, frame_id=image_id))
+        recon.register_frame(image_id)
+    return recon
+
+
+def test_split_chunks_overlaps_and_keeps_the_short_tail():
+    assert split_chunks(NAMES, 4, 1) == [NAMES[0:4], NAMES[1:5], NAMES[2:6], NAMES[3:7], NAMES[4:8],
+                                         NAMES[5:9], NAMES[6:10]]  # overlap raised to MIN_SHARED_FRAMES
+    assert split_chunks(NAMES, 6, 3) == [NAMES[0:6], NAMES[3:9], NAMES[6:10]]
+    assert split_chunks(NAMES, 8, 4) == [NAMES[0:8], NAMES[4:10]]
+    assert split_chunks(NAMES, 20, 5) == [NAMES]
+    assert split_chunks(NAMES[:1], 300, 30) == [NAMES[:1]]
+
+
+def test_estimate_join_recovers_the_similarity_between_chunks():
+    angles = np.linspace(0, np.pi, 10)
+    path = np.column_stack([np.cos(angles), np.sin(angles), 0.1 * np.arange(10)])
+    rotation = pycolmap.Rotation3d(np.array([0.1, -0.3, 0.2, 0.9]) / np.linalg.norm([0.1, -0.3, 0.2, 0.9]))
+    tgt_from_src = pycolmap.Sim3d(2.5, rotation, [1.0, -2.0, 0.5])
+    src_from_tgt = tgt_from_src.inverse()
+    merged = reconstruction({i: path[i] for i in range(7)})
+    chunk = reconstruction({i: src_from_tgt * path[i] for i in range(2, 10)})
+
+    join = estimate_join(merged, chunk)
+
+    assert abs(join.scale - 2.5) < 1e-6
+    np.testing.assert_allclose(join.rotation.matrix(), rotation.matrix(), atol=1e-6)
+    np.testing.assert_allclose(join.translation, [1.0, -2.0, 0.5], atol=1e-6)
+    np.testing.assert_allclose(join * (src_from_tgt * path[9]), path[9], atol=1e-6)
+
+
+def test_estimate_join_needs_shared_frames():
+    path = np.column_stack([np.arange(10), np.arange(10) ** 2, np.zeros(10)]).astype(float)
+    merged = reconstruction({i: path[i] for i in range(5)})
+    chunk = reconstruction({i: path[i] for i in range(5 - MIN_SHARED_FRAMES + 1, 10)})
+
+    assert estimate_join(merged, chunk) is None
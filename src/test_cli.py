@@ -0,0 +1,28 @@
+import json
+import os
+
+import cli
+from cli import plan_jobs
+
+
+def test_plan_jobs_splits_the_cpus():
+    assert plan_jobs(10, cpu_count=16) == (4, 4)
+    assert plan_jobs(2, cpu_count=16) == (2, 8)
+    assert plan_jobs(10, jobs=3, cpu_count=16) == (3, 5)
+    assert plan_jobs(10, threads_per_job=2, cpu_count=16) == (8, 2)
+    assert plan_jobs(1, cpu_count=1) == (1, 1)
+
+
+def test_batch_plans_presets_for_each_jobs_threads(tmp_path, monkeypatch):
+    manifest = tmp_path / "shots.json"
+    manifest.write_text(json.dumps({"shots": [{"project": "a", "preset": "fast"}, {"project": "b"}, {"project": "c"}]}))
+    planned = []
+    batches = []
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(cli, "apply_preset", lambda config, *layers, log: planned.append(config["num_threads"]) or config)
+    monkeypatch.setattr(cli, "run_batch", lambda shots, jobs, threads_per_job: batches.append((jobs, threads_per_job)) or [])
+
+    assert cli.main(["batch", str(manifest)]) == 0
+
+    assert planned == [4, 4, 4]
+    assert batches == [(2, 4)]
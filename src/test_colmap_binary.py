@@ -0,0 +1,60 @@
+import numpy as np
+import pycolmap
+
+from colmap_binary import read_cameras, read_count, read_images, read_points3D
+
+
+def write_model(path):
+    options = pycolmap.SyntheticDatasetOptions(num_rigs=1, num_frames_per_rig=4, num_points3D=50)
+    reconstruction = pycolmap.synthesize_dataset(options)
+    reconstruction.write(str(path))
+    return reconstruction
+
+
+def test_cameras_and_images_match_pycolmap(tmp_path):
+    reconstruction = write_model(tmp_path)
+
+    cameras = read_cameras(str(tmp_path))
+    for camera_id, camera in reconstruction.cameras.items():
+        assert cameras[camera_id]["model"] == camera.model.name
+        assert (cameras[camera_id]["width"], cameras[camera_id]["height"]) == (camera.width, camera.height)
+        np.testing.assert_allclose(cameras[camera_id]["params"], camera.params)
+
+    images = read_images(str(tmp_path))
+    assert read_count(str(tmp_path / "images.bin")) == len(images["ids"]) == reconstruction.num_images()
+    for i, image_id in enumerate(images["ids"]):
+        image = reconstruction.images[int(image_id)]
+        assert images["names"][i] == image.name
+        assert images["camera_ids"][i] == image.camera_id
+        pose = image.cam_from_world()
+        np.testing.assert_allclose(images["quats"][i], pose.rotation.quat)
+        np.testing.assert_allclose(images["translations"][i], pose.translation)
+
+
+def test_points_and_tracks_match_pycolmap(tmp_path):
+    reconstruction = write_model(tmp_path)
+
+    points = read_points3D(str(tmp_path), with_tracks=True)
+    assert len(points["ids"]) == reconstruction.num_points3D()
+    start = 0
+    for i, point3D_id in enumerate(points["ids"]):
+        point = reconstruction.points3D[int(point3D_id)]
+        np.testing.assert_allclose(points["xyz"][i], point.xyz)
+        np.testing.assert_array_equal(points["rgb"][i], point.color)
+        length = points["track_lengths"][i]
+        track = points["tracks"][start:start + length]
+        assert sorted(map(tuple, track.tolist())) == sorted(
+            (element.image_id, element.point2D_idx) for element in point.track.elements
+        )
+        start += length
+    assert start == len(points["tracks"])
+
+
+def test_empty_points_file(tmp_path):
+    reconstruction = write_model(tmp_path)
+    for point3D_id in list(reconstruction.points3D):
+        reconstruction.delete_point3D(point3D_id)
+    reconstruction.write(str(tmp_path))
+
+    points = read_points3D(str(tmp_path), with_tracks=True)
+    assert len(points["ids"]) == 0 and points["tracks"].shape == (0, 2)
@@ -0,0 +1,56 @@
+import json
+import platform
+
+import pytest
+
+from cost_model import REFERENCE, CostModel, format_estimate, keyframe_count, match_pairs
+
+
+def reference_model(tmp_path):
+    """A cost model of a machine exactly as fast as the reference one."""
+    path = tmp_path / "cost_model.json"
+    path.write_text(json.dumps({
+        "machine": platform.node(),
+        "benchmark_sift": REFERENCE["benchmark_sift"],
+        "benchmark_match": REFERENCE["benchmark_match"],
+    }))
+    return CostModel(str(path))
+
+
+def test_match_pairs_per_matcher():
+    assert match_pairs(100, {"match_type": "exhaustive"}) == 4950
+    assert match_pairs(64, {"match_type": "sequential", "overlap": 10}) == 64 * (10 + 6)
+    assert match_pairs(100, {"match_type": "spatial", "max_num_neighbors": 20}) == 2000
+    assert match_pairs(100, {"match_type": "retrieval", "overlap": 15, "retrieval_neighbors": 8}) == 2300
+    # Short clips: a frame has at most every other frame as a neighbour.
+    assert match_pairs(10, {"match_type": "retrieval", "overlap": 15, "retrieval_neighbors": 8}) == 90
+    with pytest.raises(ValueError):
+        match_pairs(10, {"match_type": "vocab_tree"})
+
+
+def test_keyframe_count_follows_motion():
+    clip = {"frames": 100, "motion": 0.01}
+    assert keyframe_count(clip, {"keyframes": False}) == 100
+    assert keyframe_count(clip, {"keyframes": True, "keyframe_motion": 0.05}) == 20
+    assert keyframe_count({"frames": 100, "motion": 0.0}, {"keyframes": True}) == 2
+    assert keyframe_count({"frames": 100, "motion": 0.5}, {"keyframes": True}) == 100
+
+
+def test_estimate_scales_with_cores_and_keyframes(tmp_path):
+    model = reference_model(tmp_path)
+    clip = {"frames": 240, "width": 1920, "height": 1080, "motion": 0.01}
+    settings = {"match_type": "sequential", "overlap": 10, "mapper": "incremental"}
+
+    one_core = model.estimate(clip, settings, cores=1)
+    eight_cores = model.estimate(clip, settings, cores=8)
+    keyframes = model.estimate(clip, {**settings, "keyframes": True}, cores=1)
+
+    assert "register" not in one_core and "masks" not in one_core
+    assert eight_cores["features"] == pytest.approx(one_core["features"] / (8 * 0.7))
+    assert eight_cores["mapping"] < one_core["mapping"]
+    assert keyframes["matching"] < one_core["matching"] and keyframes["register"] > 0
+
+
+def test_format_estimate():
+    assert format_estimate({"features": 30, "matching": 90, "mapping": 7200}) == \
+        "~2.0h (features 30s, matching 2min, mapping 2.0h)"
@@ -0,0 +1,93 @@
+import numpy as np
+import pycolmap
+
+from global_sfm import (
+    MAX_ROTATION_RESIDUAL, average_rotations, average_translations, calibrate_focal, cheiral_translation,
+    rotation_angle, translation_direction,
+)
+
+
+def random_rotations(rng, count, scale=np.pi):
+    """Rotations about random axes by angles up to ``scale``."""
+    axes = rng.normal(size=(count, 3))
+    axes /= np.linalg.norm(axes, axis=1, keepdims=True)
+    angles = rng.uniform(-scale, scale, count)
+    K = np.zeros((count, 3, 3))
+    K[:, 0, 1], K[:, 0, 2], K[:, 1, 2] = -axes[:, 2], axes[:, 1], -axes[:, 0]
+    K -= K.transpose(0, 2, 1)
+    return np.eye(3) + np.sin(angles)[:, None, None] * K + (1 - np.cos(angles))[:, None, None] * K @ K
+
+
+def skew(v):
+    return np.array([[0, -v[2], v[1]], [v[2], 0, -v[0]], [-v[1], v[0], 0]])
+
+
+def all_edges(count):
+    return np.array([(i, j) for i in range(count) for j in range(i + 1, count)], dtype=np.int64)
+
+
+def two_views(rng, count=200):
+    """Rays of points seen by camera 1 (at the origin) and camera 2 = (R, t)."""
+    R = random_rotations(rng, 1, scale=0.2)[0]
+    t = np.array([1.0, 0.2, -0.1])
+    points = np.column_stack([rng.uniform(-2, 2, (count, 2)), rng.uniform(4, 8, count)])
+    seen = points @ R.T + t
+    return R, t / np.linalg.norm(t), points / points[:, 2:], seen / seen[:, 2:]
+
+
+def test_rotations_are_recovered_up_to_gauge_and_an_outlier_edge_is_down_weighted():
+    rng = np.random.default_rng(1)
+    truth = random_rotations(rng, 8)
+    edges = all_edges(8)
+    i, j = edges[:, 0], edges[:, 1]
+    relative = truth[j] @ truth[i].transpose(0, 2, 1) @ random_rotations(rng, len(edges), scale=0.002)
+    wrong = np.array([[np.cos(0.8), -np.sin(0.8), 0], [np.sin(0.8), np.cos(0.8), 0], [0, 0, 1]])
+    relative[3] = wrong @ relative[3]  # a pair 46 degrees off
+
+    absolute, residual = average_rotations(8, edges, relative, np.full(len(edges), 100.0))
+
+    gauge = absolute[0].T @ truth[0]
+    assert np.max(np.rad2deg(rotation_angle(absolute @ gauge @ truth.transpose(0, 2, 1)))) < 1.0
+    assert residual[3] > MAX_ROTATION_RESIDUAL
+    assert np.max(np.delete(residual, 3)) < np.deg2rad(1.0)
+
+
+def test_centers_are_recovered_up_to_gauge_and_an_outlier_edge_is_down_weighted():
+    rng = np.random.default_rng(2)
+    truth = rng.normal(size=(8, 3)) * 5
+    edges = all_edges(8)
+    directions = truth[edges[:, 1]] - truth[edges[:, 0]]
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    directions[5] = -directions[5]  # a wrong pair
+
+    centers = average_translations(8, edges, directions, np.full(len(edges), 100.0))
+
+    def normalized(c):
+        c = c - c.mean(axis=0)
+        return c / np.linalg.norm(c)
+
+    np.testing.assert_allclose(normalized(centers), normalized(truth), atol=0.02)
+    baselines = centers[edges[:, 1]] - centers[edges[:, 0]]
+    assert np.sum(baselines[5] * directions[5]) < 0  # outvoted, not followed
+
+
+def test_translation_direction_follows_the_matches():
+    R, t, rays1, rays2 = two_views(np.random.default_rng(3))
+
+    np.testing.assert_allclose(translation_direction(R, rays1, rays2), t, atol=1e-6)
+    assert np.allclose(cheiral_translation(R, -t, rays1, rays2), t)
+    assert np.allclose(cheiral_translation(R, t, rays1, rays2), t)
+
+
+def test_focal_is_recovered_from_fundamental_matrices():
+    rng = np.random.default_rng(4)
+    K = np.array([[800.0, 0, 320], [0, 800.0, 240], [0, 0, 1]])
+    K_inv = np.linalg.inv(K)
+    fundamentals = []
+    for R in random_rotations(rng, 12, scale=0.3):
+        t = rng.normal(size=3)
+        fundamentals.append(K_inv.T @ skew(t / np.linalg.norm(t)) @ R @ K_inv)
+    # The prior is 25% off.
+    camera = pycolmap.Camera.create(0, pycolmap.CameraModelId.SIMPLE_PINHOLE, 1000.0, 640, 480)
+
+    assert abs(calibrate_focal(camera, np.asarray(fundamentals)) - 800.0) < 8.0
@@ -0,0 +1,41 @@
+import numpy as np
+import pycolmap
+
+from keyframes import select_keyframes
+
+
+def write_frames(path, offsets, num_features=200, seed=0, replaced=()):
+    """Frames seeing the same features shifted right by ``offsets`` pixels; ``replaced`` frames see other ones."""
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform([50, 50], [300, 400], (num_features, 2))
+    descriptors = rng.integers(0, 256, (num_features, 128), dtype=np.uint8)
+    other = rng.integers(0, 256, (num_features, 128), dtype=np.uint8)
+    names = [f"frame_{k:06d}.jpg" for k in range(len(offsets))]
+    with pycolmap.Database.open(path) as db:
+        camera_id = db.write_camera(pycolmap.Camera.create(0, pycolmap.CameraModelId.SIMPLE_RADIAL, 500.0, 640, 480))
+        for k, (name, offset) in enumerate(zip(names, offsets)):
+            image_id = db.write_image(pycolmap.Image(name=name, camera_id=camera_id))
+            db.write_keypoints(image_id, (xy + [offset, 0]).astype(np.float32))
+            db.write_descriptors(image_id, other if k in replaced else descriptors)
+    return names
+
+
+def test_static_stretches_are_skipped_until_the_motion_adds_up(tmp_path):
+    # 640x480 frames, so min_motion 0.05 is 40 pixels of the 800 pixel diagonal.
+    # Near static, then moving 15 pixels a frame, then near static again.
+    offsets = [0, 1, 2, 3, 4, 20, 35, 50, 65, 80, 81, 82]
+    names = write_frames(str(tmp_path / "database.db"), offsets)
+
+    keyframes = select_keyframes(str(tmp_path / "database.db"), min_motion=0.05, log=lambda message: None)
+
+    # Frame 7 is the first 40 pixels (0.0625 of the diagonal) from frame 0; the last frame is always kept.
+    assert keyframes == [names[0], names[7], names[11]]
+
+
+def test_lost_features_force_a_keyframe(tmp_path):
+    names = write_frames(str(tmp_path / "database.db"), [0, 1, 2, 3, 4, 5], replaced={3})
+
+    keyframes = select_keyframes(str(tmp_path / "database.db"), min_motion=0.05, log=lambda message: None)
+
+    # Frame 3 shares no features with frame 0, and frame 4 none with frame 3.
+    assert keyframes == [names[0], names[3], names[4], names[5]]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from lenses import LensLibrary, MAX_SAMPLES, convert_params, read_calibration
+
+
+def test_convert_params_scales_and_maps_distortion():
+    # SIMPLE_RADIAL at 1920x1080: f, cx, cy, k.
+    params = convert_params("SIMPLE_RADIAL", [1500.0, 960.0, 540.0, -0.05], 1920, 1080, "OPENCV", 960, 540)
+    # OPENCV: fx, fy, cx, cy, k1, k2, p1, p2; ``k`` is the first radial term.
+    assert params == pytest.approx([750.0, 750.0, 480.0, 270.0, -0.05, 0.0, 0.0, 0.0])
+
+    back = convert_params("OPENCV", params, 960, 540, "SIMPLE_RADIAL", 1920, 1080)
+    assert back == pytest.approx([1500.0, 960.0, 540.0, -0.05])
+
+
+def test_convert_params_drops_distortion_across_families():
+    params = convert_params("OPENCV_FISHEYE", [800.0, 800.0, 640.0, 360.0, 0.1, 0.01, 0.0, 0.0], 1280, 720,
+                            "OPENCV", 1280, 720)
+    assert params == pytest.approx([800.0, 800.0, 640.0, 360.0, 0.0, 0.0, 0.0, 0.0])
+
+
+def test_prior_prefers_grid_samples_and_scales_to_the_shot(tmp_path):
+    library = LensLibrary(str(tmp_path / "lenses.json"))
+    for i, f in enumerate((1500.0, 1510.0, 1520.0)):
+        library.add_sample("A7S3 24mm", "SIMPLE_RADIAL", 1920, 1080, [f, 960.0, 540.0, 0.0], source=f"shot{i}")
+    assert library.prior("A7S3 24mm", "SIMPLE_RADIAL", 1920, 1080) == pytest.approx([1510.0, 960.0, 540.0, 0.0])
+
+    library.add_sample("A7S3 24mm", "SIMPLE_RADIAL", 1920, 1080, [1400.0, 960.0, 540.0, 0.0], source="grid", kind="grid")
+    # Same aspect ratio at half the size: the full resolution calibration is scaled down.
+    assert library.prior("A7S3 24mm", "SIMPLE_RADIAL", 960, 540) == pytest.approx([700.0, 480.0, 270.0, 0.0])
+    assert library.prior("A7S3 24mm", "SIMPLE_RADIAL", 1440, 1080) is None
+    assert library.prior("unknown", "SIMPLE_RADIAL", 1920, 1080) is None
+
+
+def test_samples_replace_their_source_and_are_capped(tmp_path):
+    library = LensLibrary(str(tmp_path / "lenses.json"))
+    for i in range(MAX_SAMPLES + 5):
+        library.add_sample("lens", "SIMPLE_PINHOLE", 640, 480, [500.0 + i, 320.0, 240.0], source=f"shot{i}")
+    library.add_sample("lens", "SIMPLE_PINHOLE", 640, 480, [600.0, 320.0, 240.0], source=f"shot{MAX_SAMPLES + 4}")
+    library.save()
+
+    samples = LensLibrary(library.path).calibrations("lens")["640x480"]["samples"]
+    assert len(samples) == MAX_SAMPLES
+    assert [s["source"] for s in samples].count(f"shot{MAX_SAMPLES + 4}") == 1
+    assert samples[-1]["params"][0] == 600.0
+
+
+def test_read_calibration_checks_the_parameter_count(tmp_path):
+    path = tmp_path / "grid.json"
+    path.write_text(json.dumps({"model": "PINHOLE", "width": 640, "height": 480, "params": [500, 500, 320, 240]}))
+    assert read_calibration(str(path))[:4] == ("PINHOLE", 640, 480, [500.0, 500.0, 320.0, 240.0])
+
+    path.write_text(json.dumps({"model": "PINHOLE", "width": 640, "height": 480, "params": [500, 320, 240]}))
+    with pytest.raises(ValueError):
+        read_calibration(str(path))
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+import time
+
+from log_capture import LogCapture, parse_progress
+
+
+def test_stop_does_not_wait_for_processes_holding_the_pipe():
+    capture = LogCapture(terminal=False)
+    capture.start()
+    # Inherits the captured stdout and stderr, like multiprocessing's resource tracker does.
+    holder = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        os.write(2, b"native line\nProcessed file [3/10]\npartial")
+        start = time.monotonic()
+        capture.stop()
+        elapsed = time.monotonic() - start
+    finally:
+        holder.kill()
+        holder.wait()
+
+    lines, dropped, progress = capture.drain()
+    assert lines == ["native line", "Processed file [3/10]", "partial"] and not dropped
+    assert progress == ("Extracting features", 3, 10)
+    assert elapsed < 1.0
+
+
+def test_parse_progress():
+    assert parse_progress("Processing block [2/3, 4/5]") == ("Matching", 9, 15)
+    assert parse_progress("Registering image #12 (num_reg_frames=7)", last_total=48) == ("Registering", 7, 48)
+    assert parse_progress("Elapsed time: 0.331 [minutes]") is None
@@ -0,0 +1,83 @@
+import os
+import threading
+
+import numpy as np
+import pycolmap
+import pytest
+
+from checkpoints import CHECKPOINT_DIR, TrackingCancelled, latest_checkpoint
+from mappers import incremental_backend
+
+NUM_IMAGES = 12
+
+
+def synthetic_database(path, num_points=400, seed=0):
+    """Keypoints and verified matches of points seen by a camera moving sideways."""
+    rng = np.random.default_rng(seed)
+    points = np.column_stack([rng.uniform(-3, 3, (num_points, 2)), rng.uniform(6, 10, num_points)])
+    camera = pycolmap.Camera.create(0, pycolmap.CameraModelId.SIMPLE_PINHOLE, 500.0, 640, 480)
+    matches = np.column_stack([np.arange(num_points), np.arange(num_points)]).astype(np.uint32)
+    with pycolmap.Database.open(path) as db:
+        camera.camera_id = db.write_camera(camera)
+        rig = pycolmap.Rig()
+        rig.add_ref_sensor(camera.sensor_id)
+        rig_id = db.write_rig(rig)
+        image_ids = []
+        for k in range(NUM_IMAGES):
+            center = np.array([0.25 * k, 0.05 * np.sin(k), 0.0])
+            image_id = db.write_image(pycolmap.Image(name=f"frame_{k:06d}.jpg", camera_id=camera.camera_id))
+            frame = pycolmap.Frame(rig_id=rig_id)
+            frame.add_data_id(pycolmap.data_t(sensor_id=camera.sensor_id, id=image_id))
+            db.write_frame(frame)
+            db.write_keypoints(image_id, camera.img_from_cam(points - center).astype(np.float32))
+            image_ids.append(image_id)
+        for a in range(NUM_IMAGES):
+            for b in range(a + 1, min(NUM_IMAGES, a + 4)):
+                db.write_matches(image_ids[a], image_ids[b], matches)
+                db.write_two_view_geometry(image_ids[a], image_ids[b], pycolmap.TwoViewGeometry(
+                    config=pycolmap.TwoViewGeometryConfiguration.CALIBRATED, inlier_matches=matches
+                ))
+
+
+def test_cancelled_mapping_resumes_from_its_checkpoint(tmp_path):
+    db_path = str(tmp_path / "database.db")
+    synthetic_database(db_path)
+    output_path = str(tmp_path / "reconstruction")
+    os.makedirs(output_path)
+    cancel = threading.Event()
+
+    def cancel_at_five(reconstruction, index):
+        if reconstruction.num_reg_images() >= 5:
+            cancel.set()
+
+    with pytest.raises(TrackingCancelled):
+        incremental_backend(db_path, str(tmp_path), output_path, num_threads=1, extract_colors=False,
+                            log=lambda message: None, cancel=cancel, preview=cancel_at_five)
+
+    checkpoint = latest_checkpoint(output_path)
+    assert checkpoint is not None
+    assert pycolmap.Reconstruction(checkpoint).num_reg_images() == 5
+
+    logged = []
+    incremental_backend(db_path, str(tmp_path), output_path, num_threads=1, extract_colors=False, log=logged.append)
+
+    assert logged[0] == "⏯️ Resuming mapping from a checkpoint with 5 image(s)."
+    assert pycolmap.Reconstruction(os.path.join(output_path, "0")).num_reg_images() == NUM_IMAGES
+    assert not os.path.exists(os.path.join(output_path, CHECKPOINT_DIR))
+
+
+def test_latest_checkpoint_survives_an_interrupted_replace(tmp_path):
+    db_path = str(tmp_path / "database.db")
+    synthetic_database(db_path)
+    output_path = str(tmp_path / "reconstruction")
+    os.makedirs(output_path)
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(TrackingCancelled):
+        incremental_backend(db_path, str(tmp_path), output_path, num_threads=1, extract_colors=False,
+                            log=lambda message: None, cancel=cancel)
+
+    # Crashed after removing the old checkpoint, before renaming the new one.
+    os.replace(os.path.join(output_path, CHECKPOINT_DIR), os.path.join(output_path, CHECKPOINT_DIR + ".tmp"))
+
+    assert latest_checkpoint(output_path) == os.path.join(output_path, CHECKPOINT_DIR + ".tmp", "0")
@@ -0,0 +1,67 @@
+import numpy as np
+
+from masking import apply_homography, estimate_motion, find_mattes, fit_homography, motion_mask, resize_nearest
+
+
+def texture(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    image = np.zeros((height, width), dtype=np.float32)
+    for size in (4, 16):
+        blocks = rng.random((height // size + 2, width // size + 2)).astype(np.float32)
+        image += np.kron(blocks, np.ones((size, size), dtype=np.float32))[:height, :width]
+    return image * (255.0 / image.max())
+
+
+def test_find_mattes_splits_per_frame_and_whole_shot_mattes(tmp_path):
+    for name in ("frame_000012.png", "roto.0013.exr", "garbage.png", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+
+    per_frame, every_frame = find_mattes(str(tmp_path))
+
+    assert per_frame == {12: str(tmp_path / "frame_000012.png"), 13: str(tmp_path / "roto.0013.exr")}
+    assert every_frame == str(tmp_path / "garbage.png")
+    assert find_mattes(None) == ({}, None)
+    assert find_mattes(str(tmp_path / "missing")) == ({}, None)
+
+
+def test_resize_nearest_keeps_blocks():
+    mask = np.array([[True, False], [False, True]])
+    resized = resize_nearest(mask, 4, 4)
+    assert resized.shape == (4, 4)
+    assert resized[:2, :2].all() and resized[2:, 2:].all() and not resized[:2, 2:].any()
+
+
+def test_fit_homography_recovers_a_known_one():
+    homography = np.array([[1.02, 0.01, 3.0], [-0.01, 0.98, -2.0], [1e-5, 0.0, 1.0]])
+    rng = np.random.default_rng(0)
+    src = rng.uniform(0, 320, (64, 2))
+    dst = apply_homography(homography, src)
+
+    fitted = fit_homography(src, dst, np.ones(len(src)))
+
+    np.testing.assert_allclose(apply_homography(fitted, src), dst, atol=1e-6)
+
+
+def test_estimate_motion_follows_a_pan():
+    scene = texture(360, 200)
+    frame, panned = scene[20:200, 20:340], scene[17:197, 25:345]
+
+    homography = estimate_motion(frame, panned)
+
+    # A pixel of ``frame`` is found 5 px left and 3 px down in ``panned``.
+    np.testing.assert_allclose(apply_homography(homography, np.array([[160.0, 90.0]])), [[155.0, 93.0]], atol=0.5)
+
+
+def test_motion_mask_finds_an_object_moving_against_the_pan():
+    scene = texture(400, 220)
+    square = texture(40, 40, seed=1)
+    frames = []
+    for i in range(3):
+        frame = scene[20:200, 20 + 4 * i:340 + 4 * i].copy()
+        frame[70:110, 100 + 12 * i:140 + 12 * i] = square
+        frames.append(frame)
+
+    mask = motion_mask(frames[1], [frames[0], frames[2]])
+
+    assert mask[80:100, 120:145].mean() > 0.8
+    assert mask.mean() < 0.15
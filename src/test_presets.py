@@ -0,0 +1,64 @@
+import pytest
+
+from presets import MATCHING_BUDGET, describe_settings, plan_preset, tracking_scale
+
+
+class FakeCostModel:
+    """Stage estimates from per matcher and per mapper tables."""
+
+    def __init__(self, matching, mapping):
+        self.matching = matching
+        self.mapping = mapping
+
+    def estimate(self, clip, settings):
+        return {"matching": self.matching[settings["match_type"]], "mapping": self.mapping[settings["mapper"]]}
+
+
+def clip(frames=1000, width=3840, height=2160, motion=0.05):
+    return {"frames": frames, "width": width, "height": height, "motion": motion, "cores": 8}
+
+
+def test_tracking_scale_fits_the_longest_side():
+    assert tracking_scale(clip(), None) == 1.0
+    assert tracking_scale(clip(), 1920) == 0.5
+    assert tracking_scale(clip(), 800) == 0.25
+    assert tracking_scale(clip(width=1280, height=720), 1280) == 1.0
+
+
+def test_plan_preset_picks_the_first_choice_within_budget():
+    cost_model = FakeCostModel(
+        matching={"exhaustive": 10 * 3600, "retrieval": 3600, "sequential": 600},
+        mapping={"incremental": 10 * 3600, "chunked": 3600, "global": 600},
+    )
+
+    settings = plan_preset(clip(), "quality", cost_model)
+
+    assert settings["match_type"] == "retrieval" and settings["retrieval_neighbors"] == 16
+    assert settings["mapper"] == "chunked"
+    assert settings["proxy_scale"] == 1.0 and not settings["keyframes"]
+
+
+def test_plan_preset_falls_back_to_the_last_choice():
+    over = MATCHING_BUDGET["quality"] * 10
+    cost_model = FakeCostModel(
+        matching={"exhaustive": over, "retrieval": over, "sequential": over},
+        mapping={"incremental": over, "chunked": over},
+    )
+
+    settings = plan_preset(clip(), "quality", cost_model)
+
+    assert (settings["match_type"], settings["mapper"]) == ("sequential", "chunked")
+
+
+def test_plan_preset_skips_retrieval_on_short_clips():
+    cost_model = FakeCostModel(
+        matching={"retrieval": 0, "sequential": 0},
+        mapping={"incremental": 0},
+    )
+
+    settings = plan_preset(clip(frames=120, motion=0.001), "balanced", cost_model)
+
+    assert settings["match_type"] == "sequential" and settings["keyframes"]
+    assert describe_settings(settings) == "sequential (15), incremental, 1/2 res, keyframes"
+    with pytest.raises(ValueError):
+        plan_preset(clip(), "ultra", cost_model)
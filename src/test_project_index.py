@@ -0,0 +1,42 @@
+import os
+
+from project_index import MODEL_FILES, ReconstructionIndex, describe, find_models, frame_number, natural_key
+
+
+def make_model(path):
+    os.makedirs(path, exist_ok=True)
+    for name in MODEL_FILES:
+        open(os.path.join(path, name), "wb").close()
+
+
+def summary(images, coverage, error):
+    return {"images": images, "points": 10, "mean_reprojection_error": error, "coverage": coverage}
+
+
+def test_find_models_lists_run_and_model_folders(tmp_path):
+    make_model(tmp_path / "0" / "0")
+    make_model(tmp_path / "0" / "1")
+    make_model(tmp_path / "1")
+    os.makedirs(tmp_path / "2" / "_checkpoint")
+
+    assert sorted(find_models(str(tmp_path))) == ["0/0", "0/1", "1"]
+    assert find_models(str(tmp_path / "missing")) == []
+
+
+def test_names_sort_naturally():
+    assert sorted(["10/0", "2/0", "1/1"], key=natural_key) == ["1/1", "2/0", "10/0"]
+    assert frame_number("frame_000042.jpg") == 42
+    assert frame_number("plate.jpg") is None
+
+
+def test_entries_sort_by_quality(tmp_path):
+    index = ReconstructionIndex(str(tmp_path))
+    index.data["models"] = {
+        "0/0": {"summary": summary(40, 0.8, 0.3)},
+        "1/0": {"summary": summary(48, 1.0, 0.5)},
+        "2/0": {"summary": summary(48, 1.0, 0.4)},
+    }
+
+    assert [name for name, _ in index.entries()] == ["0/0", "1/0", "2/0"]
+    assert [name for name, _ in index.entries(sort="quality")] == ["2/0", "1/0", "0/0"]
+    assert describe("2/0", summary(48, 1.0, 0.4)) == "2/0  —  48 img, 10 pts, 0.40px, 100% of frames"
@@ -0,0 +1,50 @@
+import numpy as np
+import pycolmap
+import pytest
+
+from proxy import proxy_size, rescale_model
+
+
+def test_proxy_size():
+    assert proxy_size(3840, 2160, 0.25) == (960, 540)
+    assert proxy_size(6144, 3160, 1 / 3) == (2048, 1053)
+    with pytest.raises(ValueError):
+        proxy_size(1920, 1080, 0)
+
+
+def test_rescaled_model_has_plate_intrinsics_and_the_same_poses(tmp_path):
+    # Mapped on 960x540 proxies of a 3840x2160 plate.
+    recon = pycolmap.Reconstruction()
+    camera = pycolmap.Camera(model="SIMPLE_RADIAL", width=960, height=540, params=[400.0, 480.0, 270.0, 0.02],
+                             camera_id=1)
+    recon.add_camera(camera)
+    rig = pycolmap.Rig(rig_id=1)
+    rig.add_ref_sensor(camera.sensor_id)
+    recon.add_rig(rig)
+    pose = pycolmap.Rigid3d(pycolmap.Rotation3d(np.array([0.1, 0.0, 0.0, 1.0]) / np.hypot(0.1, 1.0)), [0.5, -0.2, 1.0])
+    frame = pycolmap.Frame(frame_id=1, rig_id=1)
+    frame.add_data_id(pycolmap.data_t(sensor_id=camera.sensor_id, id=1))
+    frame.rig_from_world = pose
+    recon.add_frame(frame)
+    xyz = np.array([[0.3, 0.1, 5.0], [-1.0, 0.4, 6.0]])
+    proxy_xy = camera.img_from_cam(xyz @ pose.rotation.matrix().T + pose.translation)
+    recon.add_image(pycolmap.Image(name="frame_000001.jpg", camera_id=1, image_id=1, frame_id=1,
+                                   points2D=pycolmap.Point2DList([pycolmap.Point2D(xy) for xy in proxy_xy])))
+    recon.register_frame(1)
+    for i, point in enumerate(xyz):
+        track = pycolmap.Track()
+        track.add_element(1, i)
+        recon.add_point3D(point, track)
+    recon.write(str(tmp_path))
+
+    rescale_model(str(tmp_path), 3840, 2160)
+
+    rescaled = pycolmap.Reconstruction(str(tmp_path))
+    plate_camera = rescaled.cameras[1]
+    assert (plate_camera.width, plate_camera.height) == (3840, 2160)
+    np.testing.assert_allclose(plate_camera.params, [1600.0, 1920.0, 1080.0, 0.02])
+    image = rescaled.images[1]
+    np.testing.assert_allclose(image.cam_from_world().matrix(), pose.matrix())
+    np.testing.assert_allclose([p.xy for p in image.points2D], proxy_xy * 4)
+    # The observations still agree with the points.
+    assert all(0 <= point.error < 1e-6 for point in rescaled.points3D.values())
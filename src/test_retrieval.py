@@ -0,0 +1,36 @@
+import numpy as np
+
+from retrieval import bag_of_words, build_vocabulary, nearest_words, retrieve_pairs
+
+
+def test_retrieve_pairs_finds_revisits_beyond_the_overlap():
+    # Frames 0-9 walk through words 0-9, then frame 10 comes back to word 1.
+    labels = [np.array([i]) for i in range(10)] + [np.array([1])]
+    histograms = bag_of_words(labels, 10)
+
+    pairs = retrieve_pairs(histograms, num_neighbors=1, min_gap=2)
+
+    assert pairs == [(1, 10)]
+    assert all(j - i > 2 for i, j in pairs)
+
+
+def test_retrieve_pairs_needs_frames_beyond_the_overlap():
+    histograms = bag_of_words([np.array([0])] * 5, 4)
+    assert retrieve_pairs(histograms, num_neighbors=8, min_gap=2) == []
+
+
+def test_bag_of_words_rows_are_unit_length():
+    histograms = bag_of_words([np.array([0, 0, 1]), np.array([1, 2]), np.array([3])], 4)
+    np.testing.assert_allclose(np.linalg.norm(histograms, axis=1), 1.0, rtol=1e-6)
+
+
+def test_vocabulary_words_are_unit_centers():
+    rng = np.random.default_rng(1)
+    centers = np.eye(8, dtype=np.float32)[:3]
+    samples = np.repeat(centers, 50, axis=0) + rng.normal(0, 0.01, (150, 8)).astype(np.float32)
+    samples /= np.linalg.norm(samples, axis=1, keepdims=True)
+
+    words = build_vocabulary(samples, num_words=3)
+
+    np.testing.assert_allclose(np.linalg.norm(words, axis=1), 1.0, rtol=1e-5)
+    assert len(set(nearest_words(centers, words))) == 3
@@ -0,0 +1,126 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pycolmap
+import pytest
+
+import sharding
+from sharding import (
+    CLAIM_LEASE, claim_task, heartbeat, is_claimed, merge_feature_shards, merge_match_shards, pair_blocks, task_path,
+)
+
+
+def write_shard(path, names, focal=500.0):
+    """A feature shard: one camera, and a few keypoints and descriptors per image."""
+    with pycolmap.Database.open(str(path)) as db:
+        camera_id = db.write_camera(pycolmap.Camera.create(0, pycolmap.CameraModelId.SIMPLE_RADIAL, focal, 640, 480))
+        image_ids = {}
+        for i, name in enumerate(names):
+            image_id = db.write_image(pycolmap.Image(name=name, camera_id=camera_id))
+            db.write_keypoints(image_id, np.full((4, 2), i, dtype=np.float32))
+            db.write_descriptors(image_id, np.full((4, 128), i, dtype=np.uint8))
+            image_ids[name] = image_id
+    return image_ids
+
+
+def claim_file(project_dir, name, owner):
+    os.makedirs(os.path.dirname(task_path(project_dir, name)), exist_ok=True)
+    with open(task_path(project_dir, name, ".claim"), "w", encoding="utf-8") as f:
+        f.write(owner)
+    return task_path(project_dir, name, ".claim")
+
+
+def test_pair_blocks_groups_pairs_by_image_ranges():
+    names = [f"frame_{i:06d}.jpg" for i in range(6)]
+    pairs = [(names[1], names[0]), (names[4], names[1]), (names[5], names[4]), (names[2], names[3])]
+
+    blocks = pair_blocks(names, pairs, block_size=3)
+
+    assert blocks == [
+        [[names[0], names[1]]],
+        [[names[1], names[4]], [names[2], names[3]]],
+        [[names[4], names[5]]],
+    ]
+
+
+def test_merged_shards_share_cameras_and_keep_matches_by_name(tmp_path):
+    write_shard(tmp_path / "a.db", ["f0.jpg", "f1.jpg"])
+    write_shard(tmp_path / "b.db", ["f2.jpg"])
+    write_shard(tmp_path / "c.db", ["f3.jpg"], focal=800.0)
+    db_path = str(tmp_path / "database.db")
+    merge_feature_shards([str(tmp_path / name) for name in ("a.db", "b.db", "c.db")], db_path)
+
+    # A matching shard numbers its images in another order.
+    shard_ids = write_shard(tmp_path / "m.db", ["f2.jpg", "f0.jpg", "f1.jpg"])
+    with pycolmap.Database.open(str(tmp_path / "m.db")) as db:
+        db.write_matches(shard_ids["f2.jpg"], shard_ids["f0.jpg"], np.array([[0, 1], [2, 3]], dtype=np.uint32))
+        db.write_matches(shard_ids["f2.jpg"], shard_ids["f1.jpg"], sharding.NO_MATCHES)
+    merge_match_shards([str(tmp_path / "m.db")], db_path)
+
+    with pycolmap.Database.open(db_path) as db:
+        images = {image.name: image for image in db.read_all_images()}
+        assert len(db.read_all_cameras()) == 2
+        assert images["f0.jpg"].camera_id == images["f2.jpg"].camera_id != images["f3.jpg"].camera_id
+        np.testing.assert_array_equal(db.read_descriptors(images["f2.jpg"].image_id), np.full((4, 128), 0))
+        np.testing.assert_array_equal(
+            db.read_matches(images["f2.jpg"].image_id, images["f0.jpg"].image_id), [[0, 1], [2, 3]]
+        )
+        # Empty rows only kept the shard's matcher off the pairs outside its block.
+        assert len(db.read_all_matches()[0]) == 1
+
+
+def test_live_claims_block_other_workers(tmp_path):
+    project_dir = str(tmp_path)
+    os.makedirs(sharding.shards_dir(project_dir))
+
+    assert claim_task(project_dir, "features_0")
+    assert is_claimed(project_dir, "features_0") and not claim_task(project_dir, "features_0")
+
+    claim_file(project_dir, "features_1", "farm-node-7 1234")
+    assert is_claimed(project_dir, "features_1") and not claim_task(project_dir, "features_1")
+
+
+def test_stale_claims_are_taken_over(tmp_path):
+    project_dir = str(tmp_path)
+    path = claim_file(project_dir, "matches_0", "farm-node-7 1234")
+    expired = time.time() - CLAIM_LEASE - 1
+    os.utime(path, (expired, expired))
+
+    assert not is_claimed(project_dir, "matches_0")
+    assert claim_task(project_dir, "matches_0")
+    with open(path, "r", encoding="utf-8") as f:
+        assert f.read() == f"{socket.gethostname()} {os.getpid()}"
+    # The released claim is not left behind.
+    assert sorted(os.listdir(os.path.dirname(path))) == ["matches_0.claim"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="local processes are not checked on Windows")
+def test_claims_of_stopped_local_workers_are_stale(tmp_path):
+    project_dir = str(tmp_path)
+    worker = subprocess.Popen([sys.executable, "-c", "pass"])
+    worker.wait()
+    claim_file(project_dir, "features_0", f"{socket.gethostname()} {worker.pid}")
+
+    assert not is_claimed(project_dir, "features_0")
+    assert claim_task(project_dir, "features_0")
+
+
+def test_heartbeat_touches_the_claim(tmp_path, monkeypatch):
+    monkeypatch.setattr(sharding, "HEARTBEAT_INTERVAL", 0.01)
+    path = claim_file(str(tmp_path), "features_0", "farm-node-7 1234")
+    expired = time.time() - CLAIM_LEASE - 1
+    os.utime(path, (expired, expired))
+    stop = threading.Event()
+    thread = threading.Thread(target=heartbeat, args=(path, stop))
+
+    thread.start()
+    time.sleep(0.1)
+    stop.set()
+    thread.join()
+
+    assert is_claimed(str(tmp_path), "features_0")
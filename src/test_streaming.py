@@ -0,0 +1,35 @@
+import numpy as np
+
+from streaming import mask_keypoints, stream_size, to_colmap_keypoints
+
+
+def test_keypoints_follow_an_anisotropic_scale():
+    keypoints = np.array([[10.0, 20.0, 2.0, 0.3], [5.0, 7.0, 1.5, -2.0]], dtype=np.float32)
+    scale_x, scale_y = 2.0, 3.0
+
+    converted = to_colmap_keypoints(keypoints, scale_x, scale_y)
+
+    for (x, y, scale, angle), row in zip(keypoints, converted):
+        rotation = scale * np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        expected = np.diag([scale_x, scale_y]) @ rotation
+        np.testing.assert_allclose(row[:2], [x * scale_x, y * scale_y], rtol=1e-6)
+        np.testing.assert_allclose(row[2:].reshape(2, 2), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_stream_size_keeps_the_aspect_ratio():
+    assert stream_size(1920, 1080, 3200) == (1920, 1080)
+    assert stream_size(6400, 3600, 3200) == (3200, 1800)
+    assert stream_size(6400, 3600, 0) == (6400, 3600)
+
+
+def test_mask_keypoints_drops_masked_points():
+    keypoints = np.array([[1.0, 1.0], [3.0, 0.0], [9.0, 9.0]], dtype=np.float32)
+    descriptors = np.arange(3, dtype=np.uint8)[:, None]
+    mask = np.ones((4, 4), dtype=bool)
+    mask[0, 3] = False
+
+    kept, kept_descriptors = mask_keypoints(keypoints, descriptors, mask)
+
+    # Points outside the mask are clamped to its border.
+    np.testing.assert_array_equal(kept, keypoints[[0, 2]])
+    np.testing.assert_array_equal(kept_descriptors[:, 0], [0, 2])
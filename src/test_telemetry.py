@@ -0,0 +1,52 @@
+import time
+
+import numpy as np
+
+from telemetry import RunReport, compare_reports, flatten, format_summary, rss_mb
+
+
+def test_stage_peaks_are_per_stage():
+    if rss_mb() is None:
+        return  # memory cannot be read on this platform
+    report = RunReport()
+    with report.stage("big"):
+        block = np.ones(200 * 1024 * 1024 // 8)
+        time.sleep(0.5)
+        del block
+    with report.stage("small"):
+        time.sleep(0.5)
+
+    stages = report.data["stages"]
+    assert stages["big"]["peak_rss_mb"] - stages["small"]["peak_rss_mb"] > 150
+
+
+def test_on_stage_reports_start_and_end():
+    calls = []
+    report = RunReport(on_stage=lambda name, stats: calls.append((name, stats is None)))
+    with report.stage("frames") as stats:
+        stats["skipped"] = True
+
+    assert calls == [("frames", True), ("frames", False)]
+    assert report.data["stages"]["frames"]["skipped"]
+
+
+def test_compare_reports_lists_changes_and_settings():
+    before = {"stages": {"mapping": {"wall_s": 10.0, "cpu_s": 20.0}}, "metrics": {"frames": 48},
+              "settings": {"mapper": "incremental"}}
+    after = {"stages": {"mapping": {"wall_s": 5.0, "cpu_s": 20.0}}, "metrics": {"frames": 48},
+             "settings": {"mapper": "global"}}
+
+    assert flatten(after) == {"mapping.wall_s": 5.0, "mapping.cpu_s": 20.0, "frames": 48}
+    lines = compare_reports(before, after)
+    assert any(line.startswith("mapping.wall_s") and line.endswith("-50.0%") for line in lines)
+    assert lines[-1] == "setting mapper: incremental -> global"
+
+
+def test_summary_shows_peaks_when_known():
+    data = {"stages": {"frames": {"wall_s": 1.0, "cpu_s": 2.0, "peak_rss_mb": 120.4},
+                       "export": {"wall_s": 1.0, "cpu_s": 1.0, "peak_rss_mb": None}}}
+
+    lines = format_summary(data)
+
+    assert lines[1].endswith("peak 120 MB")
+    assert "peak" not in lines[2]
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pycolmap
+from pxr import Usd, UsdGeom
+
+from cache import CHECKPOINT_FILE, new_run_dir, write_fingerprint
+from tracking import VARIANTS_DIR, adopt_variant, create_usd, setup_project, setup_variant
+
+
+def test_new_run_dir_takes_the_first_gap(tmp_path):
+    os.makedirs(tmp_path / "0")
+    os.makedirs(tmp_path / "2")
+    assert new_run_dir(str(tmp_path)) == str(tmp_path / "1")
+    assert new_run_dir(str(tmp_path)) == str(tmp_path / "3")
+
+
+def test_variants_hand_finished_reconstructions_to_the_project(tmp_path):
+    project_dir = str(tmp_path / "shot")
+    setup_project(project_dir)
+    with open(os.path.join(project_dir, "source.mp4"), "wb") as f:
+        f.write(b"video")
+    os.makedirs(os.path.join(project_dir, "reconstruction", "0"))
+
+    variant_dir = setup_variant(project_dir)
+    assert variant_dir == os.path.join(project_dir, VARIANTS_DIR, "0")
+    with open(os.path.join(variant_dir, "source.mp4"), "rb") as f:
+        assert f.read() == b"video"
+    finished = new_run_dir(os.path.join(variant_dir, "reconstruction"))
+    write_fingerprint(finished, "key")
+    unfinished = new_run_dir(os.path.join(variant_dir, "reconstruction"))
+    write_fingerprint(unfinished, "other", name=CHECKPOINT_FILE)
+
+    moved = adopt_variant(variant_dir, project_dir, log=lambda message: None)
+
+    assert moved == {finished: os.path.join(project_dir, "reconstruction", "1")}
+    assert sorted(os.listdir(os.path.join(project_dir, "reconstruction", "1"))) == ["fingerprint"]
+    assert not os.path.exists(os.path.join(project_dir, VARIANTS_DIR))
+    assert os.path.isfile(os.path.join(project_dir, "source.mp4"))
+
+
+def two_camera_model(num_points=50):
+    """Frames 1 and 2, each from its own SIMPLE_RADIAL camera, and a few points."""
+    recon = pycolmap.Reconstruction()
+    poses = {
+        1: pycolmap.Rigid3d(pycolmap.Rotation3d(), [0.0, 0.0, 0.0]),
+        2: pycolmap.Rigid3d(pycolmap.Rotation3d(np.array([0.0, np.sin(0.25), 0.0, np.cos(0.25)])), [-1.0, 0.5, 0.2]),
+    }
+    for i, focal in ((1, 500.0), (2, 800.0)):
+        camera = pycolmap.Camera(model="SIMPLE_RADIAL", width=640, height=480, params=[focal, 320.0, 240.0, 0.01 * i],
+                                 camera_id=i)
+        recon.add_camera(camera)
+        rig = pycolmap.Rig(rig_id=i)
+        rig.add_ref_sensor(camera.sensor_id)
+        recon.add_rig(rig)
+        frame = pycolmap.Frame(frame_id=i, rig_id=i)
+        frame.add_data_id(pycolmap.data_t(sensor_id=camera.sensor_id, id=i))
+        frame.rig_from_world = poses[i]
+        recon.add_frame(frame)
+        recon.add_image(pycolmap.Image(name=f"frame_{i:06d}.jpg", camera_id=i, image_id=i, frame_id=i))
+        recon.register_frame(i)
+    for xyz in np.random.default_rng(0).normal(size=(num_points, 3)):
+        recon.add_point3D(xyz, pycolmap.Track(), np.array([255, 128, 0], dtype=np.uint8))
+    return recon, poses
+
+
+def test_usd_export_animates_the_cameras_and_payloads_the_points(tmp_path):
+    recon, poses = two_camera_model()
+    export_path = str(tmp_path / "track.usda")
+
+    create_usd(str(tmp_path), recon, export_path)
+
+    stage = Usd.Stage.Open(export_path)
+    camera = UsdGeom.Camera(stage.GetPrimAtPath("/track/Camera"))
+    transform = camera.GetOrderedXformOps()[0]
+    for frame, pose in poses.items():
+        world_from_cam = pose.inverse()
+        matrix = np.array(transform.Get(frame))  # row vectors: camera to /track
+        np.testing.assert_allclose(matrix[3, :3], world_from_cam.translation, atol=1e-6)
+        # USD cameras look down -Z, COLMAP cameras down +Z.
+        np.testing.assert_allclose(-matrix[2, :3], world_from_cam.rotation.matrix()[:, 2], atol=1e-6)
+    assert camera.GetFocalLengthAttr().Get(1) == 500.0 * 20.0 / 640
+    assert camera.GetFocalLengthAttr().Get(2) == 800.0 * 20.0 / 640
+
+    points = UsdGeom.Points(stage.GetPrimAtPath("/track/PointCloud"))
+    assert stage.GetPrimAtPath("/track/PointCloud").HasPayload()
+    assert len(points.GetPointsAttr().Get()) == 50
@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+from tracking_process import close_job, contain, kill_tree, lead_process_group
+
+
+def start_worker(conn):
+    """Stands in for ``run_child``: leads its group and starts a process of its own, like a shard worker."""
+    lead_process_group()
+    worker = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    conn.send(worker.pid)
+    time.sleep(60)
+
+
+def alive(pid):
+    if os.name == "nt":
+        result = subprocess.run(["tasklist", "/FI", f"PID eq {pid}", "/NH"], capture_output=True, text=True)
+        return str(pid) in result.stdout
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A killed child of a process that is gone is reaped by init; until then it is a zombie.
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return True  # no /proc
+
+
+
+def test_kill_tree_ends_the_processes_the_run_started():
+    context = multiprocessing.get_context("spawn")
+    conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=start_worker, args=(child_conn,))
+    process.start()
+    job = contain(process.pid)
+    worker_pid = conn.recv()
+
+    kill_tree(process, job)
+    process.join(10)
+    close_job(job)
+
+    deadline = time.monotonic() + 10
+    while alive(worker_pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not process.is_alive()
+    assert not alive(worker_pid)
@@ -3,98 +3,532 @@ import subprocess
 import pycolmap
 import imageio_ffmpeg
 from pathlib import Path
-import subprocess
+import shutil
 import os
 
-from PySide6.QtCore import QObject, QThread, Signal
-
-class TrackingWorker(QObject):
-    finished = Signal()
-    log_message = Signal(str)
-    error = Signal(str)
-
-    def __init__(self, project_dir, camera_model, match_type, sift_ratio, sift_distance, pair_options):
-        super().__init__()
-        self.project_dir = project_dir
-        self.camera_model = camera_model
-        self.match_type = match_type
-        self.sift_ratio = sift_ratio
-        self.sift_distance = sift_distance
-        self.pair_options = pair_options
-
-    def run(self):
-        try:
-            import os, pycolmap
-            
-            video_path = os.path.join(self.project_dir, "source.mp4")
-            frames_dir = os.path.join(self.project_dir, "frames")
-            database = os.path.join(self.project_dir, "database.db")
-
-            recon_root = os.path.join(self.project_dir, "reconstruction")
-            next_index = len([d for d in os.listdir(recon_root) if os.path.isdir(os.path.join(recon_root, d))])
-            recon_dir = os.path.join(recon_root, str(next_index))
-            os.makedirs(recon_dir, exist_ok=True)
-
-            self.log_message.emit("[1/4] Extracting frames…")
-            generate_frames(video_path, frames_dir)
-            self.log_message.emit("✅ Frames generated.")
-
-            self.log_message.emit("[2/4] Extracting features…")
-            extract_features(database, frames_dir, self.camera_model)
-            self.log_message.emit("✅ Features extracted.")
-            
-            self.log_message.emit("[3/4] Matching features…")
-            sift_options = pycolmap.SiftMatchingOptions(
-                max_ratio=self.sift_ratio,
-                max_distance=self.sift_distance
-            )
+from cache import (
+    StageCache, fingerprint, options_dict, find_reconstruction, find_checkpoint, new_run_dir, read_marker,
+    write_fingerprint, CHECKPOINT_FILE, FINGERPRINT_FILE
+)
+from checkpoints import check_cancelled
+from colmap_binary import read_cameras, read_images, read_points3D
+from streaming import DEFAULT_FOCAL_LENGTH_FACTOR, stream_features
+from keyframes import select_keyframes, build_keyframe_database, register_remaining_frames
+from mappers import run_mapper
+from project_index import ReconstructionIndex
+from retrieval import RetrievalPairingOptions, match_retrieval
+from sharding import extract_sharded, match_sharded
+from proxy import PROXY_DIR, extract_frames, probe_video, proxy_size, rescale_model
+from masking import MASK_DIR, build_masks, mattes_signature
+from lenses import LensLibrary, calibration_from_model, MAX_CALIBRATION_ERROR, MIN_CALIBRATION_IMAGES
+from telemetry import RunReport, database_metrics, model_metrics, find_report, load_report, format_summary
+
+# Working copies of runs started beside another run of the same project (see ``setup_variant``).
+VARIANTS_DIR = "variants"
+
+
+def setup_project(project_dir, video_path=None):
+    """Create the project folder layout, copying the source video in if given."""
+    os.makedirs(project_dir, exist_ok=True)
+
+    if video_path:
+        shutil.copy2(video_path, os.path.join(project_dir, "source.mp4"))
+
+    os.makedirs(os.path.join(project_dir, "frames"), exist_ok=True)
+    os.makedirs(os.path.join(project_dir, "reconstruction"), exist_ok=True)
+
+
+def setup_variant(project_dir):
+    """
+    A working copy of a project in its ``variants`` folder, for a run beside
+    another run of the project: it has its own frames, database and stage
+    cache. Returns its folder.
+    """
+    variant_dir = new_run_dir(os.path.join(project_dir, VARIANTS_DIR))
+    source = os.path.join(project_dir, "source.mp4")
+    try:
+        os.link(source, os.path.join(variant_dir, "source.mp4"))
+    except OSError:
+        shutil.copy2(source, os.path.join(variant_dir, "source.mp4"))  # no hard links on this drive
+    setup_project(variant_dir)
+    return variant_dir
+
+
+def adopt_variant(variant_dir, project_dir, log=print):
+    """
+    Move the finished reconstructions of a working copy into its project
+    and remove the copy; returns {old folder: new folder}. Unfinished ones
+    are dropped: their checkpoints only fit the copy's database.
+    """
+    moved = {}
+    variant_root = os.path.join(variant_dir, "reconstruction")
+    for name in sorted(os.listdir(variant_root)) if os.path.isdir(variant_root) else []:
+        recon_dir = os.path.join(variant_root, name)
+        if read_marker(recon_dir, FINGERPRINT_FILE) is None:
+            continue
+        target = new_run_dir(os.path.join(project_dir, "reconstruction"))
+        for entry in os.listdir(recon_dir):
+            os.rename(os.path.join(recon_dir, entry), os.path.join(target, entry))
+        moved[recon_dir] = target
+        log(f"📦 Added the variant's reconstruction to the project as {os.path.basename(target)}.")
+    shutil.rmtree(variant_dir, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(variant_dir))  # the last variant leaves no empty folder
+    except OSError:
+        pass
+    ReconstructionIndex(project_dir).refresh(log=log)
+    return moved
+
+
+def frames_fingerprint(cache, video_path, fps):
+    return fingerprint(cache.source_hash(video_path), fps=fps)
+
+
+def ensure_plates(project_dir, fps=24, num_threads=-1, log=print):
+    """Extract the full resolution background plates unless they are already up to date; returns their folder."""
+    video_path = os.path.join(project_dir, "source.mp4")
+    frames_dir = os.path.join(project_dir, "frames")
+    cache = StageCache(project_dir)
+    frames_key = frames_fingerprint(cache, video_path, fps)
+    if cache.is_fresh("frames", frames_key) and has_frames(frames_dir):
+        return frames_dir
+
+    log("🎞️ Extracting full resolution plates…")
+    cache.invalidate("frames")
+    shutil.rmtree(frames_dir, ignore_errors=True)
+    extract_frames(video_path, frames_dir, fps=fps, num_threads=num_threads, log=log)
+    cache.store("frames", frames_key)
+    return frames_dir
+
+
+def make_pair_options(match_type, block_size=50, overlap=15, max_num_neighbors=50, max_distance=100.0,
+                      retrieval_neighbors=8):
+    """Build the pairing options for a match type."""
+    if match_type == "exhaustive":
+        return pycolmap.ExhaustivePairingOptions(block_size=block_size)
+    elif match_type == "sequential":
+        return pycolmap.SequentialPairingOptions(overlap=overlap)
+    elif match_type == "spatial":
+        return pycolmap.SpatialPairingOptions(
+            max_num_neighbors=max_num_neighbors,
+            max_distance=max_distance
+        )
+    elif match_type == "retrieval":
+        return RetrievalPairingOptions(overlap=overlap, num_neighbors=retrieval_neighbors)
+    raise ValueError(f"Unknown match type: {match_type}")
+
+
+def run_tracking(project_dir, camera_model, match_type, sift_ratio, sift_distance, pair_options, num_threads=-1, use_cache=True,
+                 streaming=False, write_frames=True, keyframes=False, keyframe_motion=0.05,
+                 mapper="incremental", chunk_size=300, chunk_overlap=30, proxy_scale=1.0, motion_masks=False,
+                 mattes_dir=None, lens=None, lens_mode="prior", shards=0, cancel=None, preview=None, on_stage=None,
+                 log=print):
+    """
+    Run the four tracking stages on a project and return the reconstruction folder.
+    ``num_threads`` caps the threads used by ffmpeg and COLMAP (-1 uses every core).
+    Stages whose fingerprint matches the last completed run are skipped unless
+    ``use_cache`` is False. With ``streaming`` frames are piped from ffmpeg into
+    feature extraction, and plates are only written if ``write_frames`` is set.
+    With ``keyframes`` only frames that moved by ``keyframe_motion`` (fraction of
+    the image diagonal) are matched and mapped; the rest are registered after.
+    ``mapper`` picks the mapping backend from ``mappers.MAPPERS``: "incremental",
+    "chunked" (overlapping chunks of ``chunk_size`` mapped in parallel and
+    joined) or "global" (rotation and translation averaging, one bundle adjustment).
+    A ``proxy_scale`` below 1 tracks on frames downscaled by that factor and
+    rescales the models to the plate resolution; full resolution plates are
+    then only extracted on export (see ``ensure_plates``).
+    ``motion_masks`` keeps features off moving objects, and the mattes in
+    ``mattes_dir`` (white = excluded) off whatever they cover (see ``masking``).
+    ``lens`` names a calibration of the lens library (see ``lenses``): its
+    intrinsics are the starting point of mapping, held fixed if ``lens_mode``
+    is "fixed", and with "prior" the solved intrinsics are added back to it.
+    With ``shards`` above 0, features are extracted and matched in shards by
+    that many worker processes and merged into the project database (see
+    ``sharding``; nodes sharing the project folder can join in).
+    Setting the ``cancel`` event stops the run with TrackingCancelled at the
+    next safe point. Mapping is checkpointed, and an unfinished mapping with
+    the same inputs is resumed instead of started again. With the incremental
+    mapper, ``preview`` is called with ``(reconstruction, model_index)`` as
+    images are registered (see ``ui.viewer.LiveModelFeed``), and ``on_stage``
+    follows the stages of the run report (see ``telemetry.RunReport``).
+    """
+    video_path = os.path.join(project_dir, "source.mp4")
+    frames_dir = os.path.join(project_dir, "frames")
+    database = os.path.join(project_dir, "database.db")
+    recon_root = os.path.join(project_dir, "reconstruction")
+    proxy_dir = os.path.join(project_dir, PROXY_DIR)
+    proxy = proxy_scale < 1
+    # Streaming decodes proxies itself and stores full resolution keypoints.
+    rescale = proxy and not streaming
+    feature_frames_dir = proxy_dir if rescale else frames_dir
+
+    cache = StageCache(project_dir)
+    if not use_cache:
+        cache.data["stages"].clear()
+
+    sift_options = pycolmap.SiftMatchingOptions(
+        max_ratio=sift_ratio,
+        max_distance=sift_distance
+    )
+
+    matching_options = pycolmap.FeatureMatchingOptions(
+        sift=sift_options,
+        num_threads=num_threads
+    )
 
-            matching_options = pycolmap.FeatureMatchingOptions(
-                sift=sift_options
+    fps = 24
+    frames_key = frames_fingerprint(cache, video_path, fps)
+    proxy_key = fingerprint(frames_key, proxy_scale=proxy_scale) if proxy else frames_key
+    masking = motion_masks or bool(mattes_dir)
+    mask_dir = os.path.join(project_dir, MASK_DIR)
+    features_inputs = {"camera_model": camera_model, "decode": "stream" if streaming else "jpeg"}
+    if masking or lens:
+        # Size of the images features are extracted from (keypoints are in plate pixels when streaming).
+        plate_size = tuple(probe_video(video_path)["size"])
+        feature_size = proxy_size(*plate_size, proxy_scale) if rescale else plate_size
+    if masking:
+        masks_key = fingerprint(
+            frames_key, size=feature_size, motion=motion_masks, mattes=mattes_signature(mattes_dir) if mattes_dir else None
+        )
+        features_inputs["masks"] = masks_key
+    features_key = fingerprint(proxy_key, **features_inputs)
+    keyframes_key = fingerprint(features_key, keyframe_motion=keyframe_motion) if keyframes else features_key
+    lens_params = LensLibrary().prior(lens, camera_model, *feature_size) if lens else None
+    if lens and lens_params is None:
+        log(f"🔭 No calibration of lens '{lens}' at this resolution yet, solving the intrinsics from scratch.")
+    refine_intrinsics = lens_params is None or lens_mode != "fixed"
+    matches_key = fingerprint(
+        keyframes_key,
+        # Verification only depends on whether there is a focal length prior, not on its value.
+        lens_prior=lens_params is not None,
+        match_type=match_type,
+        matching_options=options_dict(matching_options),
+        pair_options=options_dict(pair_options)
+    )
+    mapping_key = fingerprint(
+        matches_key, mapper=mapper,
+        intrinsics=[round(p, 6) for p in lens_params] if lens_params else None,
+        refine_intrinsics=refine_intrinsics,
+        chunks=(chunk_size, chunk_overlap) if mapper == "chunked" else None
+    )
+
+    report = RunReport(on_stage=on_stage, settings={
+        "camera_model": camera_model,
+        "match_type": match_type,
+        "sift_ratio": sift_ratio,
+        "sift_distance": sift_distance,
+        "pair_options": options_dict(pair_options),
+        "num_threads": num_threads,
+        "streaming": streaming,
+        "write_frames": write_frames,
+        "keyframes": keyframes,
+        "keyframe_motion": keyframe_motion,
+        "mapper": mapper,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "proxy_scale": proxy_scale,
+        "motion_masks": motion_masks,
+        "mattes_dir": mattes_dir,
+        "lens": lens,
+        "lens_mode": lens_mode,
+        "shards": shards,
+    })
+
+    frames_fresh = cache.is_fresh("frames", frames_key) and has_frames(frames_dir)
+    features_fresh = cache.is_fresh("features", features_key) and os.path.exists(database)
+
+    if masking:
+        check_cancelled(cancel)
+        log("🎭 Building feature masks…")
+        with report.stage("masks") as stage:
+            if cache.is_fresh("masks", masks_key) and has_frames(mask_dir):
+                stage["skipped"] = True
+                log("⏩ Source and mattes unchanged, reusing masks.")
+            else:
+                cache.invalidate("masks")
+                shutil.rmtree(mask_dir, ignore_errors=True)
+                stage["masked_fraction"] = round(build_masks(
+                    video_path, mask_dir, *feature_size, motion=motion_masks, mattes_dir=mattes_dir, fps=fps,
+                    num_threads=num_threads, cancel=cancel, log=log
+                ), 4)
+                cache.store("masks", masks_key)
+
+    check_cancelled(cancel)
+    if streaming and not features_fresh:
+        write_plates = write_frames and not frames_fresh
+        log("[1/4] Streaming frames…")
+        log("[2/4] Extracting features while decoding…")
+        with report.stage("stream"):
+            if not frames_fresh:
+                cache.invalidate("frames")
+                shutil.rmtree(frames_dir, ignore_errors=True)
+            cache.invalidate("features")
+            cache.invalidate("matches")
+            if os.path.exists(database):
+                os.remove(database)
+
+            stream_features(
+                video_path, database, camera_model,
+                frames_dir=frames_dir if write_plates else None,
+                fps=fps, scale=proxy_scale, num_threads=num_threads,
+                mask_dir=mask_dir if masking else None, cancel=cancel, log=log
             )
-            
+            if write_plates:
+                cache.store("frames", frames_key)
+            cache.store("features", features_key)
+        log("✅ Frames streamed and features extracted.")
+    else:
+        log("[1/4] Extracting frames…")
+        with report.stage("frames") as stage:
+            if rescale:
+                if cache.is_fresh("proxy", proxy_key) and has_frames(proxy_dir):
+                    stage["skipped"] = True
+                    log("⏩ Source unchanged, reusing proxy frames.")
+                else:
+                    cache.invalidate("proxy")
+                    shutil.rmtree(proxy_dir, ignore_errors=True)
+                    extract_frames(video_path, proxy_dir, scale=proxy_scale, fps=fps, num_threads=num_threads, log=log)
+                    cache.store("proxy", proxy_key)
+                    log("✅ Proxy frames generated, full resolution plates are extracted on export.")
+            elif frames_fresh:
+                stage["skipped"] = True
+                log("⏩ Source unchanged, reusing frames.")
+            elif streaming and not write_frames:
+                stage["skipped"] = True
+                log("⏩ Plates not requested, skipping frame extraction.")
+            else:
+                cache.invalidate("frames")
+                shutil.rmtree(frames_dir, ignore_errors=True)
+                generate_frames(video_path, frames_dir, fps=fps, num_threads=num_threads)
+                cache.store("frames", frames_key)
+                log("✅ Frames generated.")
+
+        check_cancelled(cancel)
+        log("[2/4] Extracting features…")
+        with report.stage("features") as stage:
+            if features_fresh:
+                stage["skipped"] = True
+                log("⏩ Frames and camera model unchanged, reusing features.")
+            else:
+                cache.invalidate("features")
+                cache.invalidate("matches")
+                if os.path.exists(database):
+                    os.remove(database)
+                if shards:
+                    extract_sharded(project_dir, database, feature_frames_dir, camera_model, shards,
+                                    num_threads=num_threads, mask_dir=mask_dir if masking else None,
+                                    cancel=cancel, log=log)
+                else:
+                    extract_features(database, feature_frames_dir, camera_model, num_threads=num_threads,
+                                     mask_dir=mask_dir if masking else None)
+                cache.store("features", features_key)
+                log("✅ Features extracted.")
+
+    # With keyframes, only the keyframes are matched and mapped, from their own database.
+    match_database = database
+    keyframe_names = None
+    if keyframes:
+        check_cancelled(cancel)
+        match_database = os.path.join(project_dir, "keyframes.db")
+        keyframes_file = os.path.join(project_dir, "keyframes.txt")
+        log("🔑 Selecting keyframes…")
+        with report.stage("keyframes") as stage:
+            if cache.is_fresh("keyframes", keyframes_key) and os.path.exists(match_database):
+                stage["skipped"] = True
+                with open(keyframes_file, "r", encoding="utf-8") as f:
+                    keyframe_names = f.read().split()
+                log(f"⏩ Features unchanged, reusing {len(keyframe_names)} keyframe(s).")
+            else:
+                cache.invalidate("keyframes")
+                cache.invalidate("matches")
+                keyframe_names = select_keyframes(database, min_motion=keyframe_motion, log=log)
+                build_keyframe_database(database, match_database, keyframe_names)
+                with open(keyframes_file, "w", encoding="utf-8") as f:
+                    f.write("\n".join(keyframe_names))
+                cache.store("keyframes", keyframes_key)
+
+    # Applied on every run: the lens prior is not part of the features fingerprint.
+    for db_path in {database, match_database}:
+        set_camera_prior(db_path, lens_params)
+    if lens_params is not None:
+        log(f"🔭 Lens '{lens}': starting from [{', '.join(f'{p:.6g}' for p in lens_params)}]"
+            + (", held fixed." if not refine_intrinsics else "."))
+
+    check_cancelled(cancel)
+    log("[3/4] Matching features…")
+    with report.stage("matching") as stage:
+        if cache.is_fresh("matches", matches_key):
+            stage["skipped"] = True
+            log("⏩ Matching settings unchanged, reusing matches.")
+        else:
+            cache.invalidate("matches")
+            clear_matches(match_database)
+            if shards:
+                match_sharded(project_dir, match_database, match_type, matching_options, pair_options, shards,
+                              num_threads=num_threads, cancel=cancel, log=log)
+            else:
+                match_features(match_database, match_type, matching_options, pair_options, log=log)
+            cache.store("matches", matches_key)
+            log("✅ Features matched.")
+
+    check_cancelled(cancel)
+    log("[4/4] Running mapping…")
+    recon_dir = find_reconstruction(recon_root, mapping_key) if use_cache else None
+    resume_dir = find_checkpoint(recon_root, mapping_key) if use_cache and not recon_dir else None
+    if recon_dir:
+        log(f"⏩ Inputs unchanged, reusing reconstruction {os.path.basename(recon_dir)}.")
+    else:
+        if resume_dir:
+            recon_dir = resume_dir
+            log(f"⏯️ Resuming reconstruction {os.path.basename(recon_dir)}.")
+        else:
+            recon_dir = new_run_dir(recon_root)
+            write_fingerprint(recon_dir, mapping_key, name=CHECKPOINT_FILE)
+
+        with report.stage("mapping"):
+            # Without plates (streaming, no frames written) points cannot be colored.
+            os.makedirs(feature_frames_dir, exist_ok=True)
+            mapper_options = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap} if mapper == "chunked" else {}
+            mapper_options["refine_intrinsics"] = refine_intrinsics
+            if mapper == "incremental" and preview is not None:
+                mapper_options["preview"] = preview
+            map_reconstruction(match_database, feature_frames_dir, recon_dir, num_threads=num_threads,
+                               extract_colors=has_frames(feature_frames_dir), mapper=mapper, cancel=cancel, log=log,
+                               **mapper_options)
+
+        # The mapper is the last cancellable step: the finished models only
+        # become reusable once the fingerprint below is written.
+        if keyframes:
+            log("📌 Registering the remaining frames…")
+            with report.stage("register"):
+                for model in sorted(os.listdir(recon_dir)):
+                    model_dir = os.path.join(recon_dir, model)
+                    if os.path.isdir(model_dir):
+                        register_remaining_frames(model_dir, database, keyframe_names, log=log)
+
+        if rescale:
+            # The database stays in proxy pixels, the models are stored at plate resolution.
+            with report.stage("rescale"):
+                width, height = probe_video(video_path)["size"]
+                for model in sorted(os.listdir(recon_dir)):
+                    model_dir = os.path.join(recon_dir, model)
+                    if os.path.isfile(os.path.join(model_dir, "images.bin")):
+                        rescale_model(model_dir, width, height)
+                log(f"📐 Rescaled the model(s) to {width}x{height}.")
+        write_fingerprint(recon_dir, mapping_key)
 
-            match_features(database, self.match_type, matching_options, self.pair_options)
-            self.log_message.emit("✅ Features matched.")
+        metrics = database_metrics(database)
+        if keyframes:
+            metrics["keyframes"] = len(keyframe_names)
+            pair_metrics = database_metrics(match_database)
+            metrics["matched_pairs"] = pair_metrics["matched_pairs"]
+            metrics["verified_pairs"] = pair_metrics["verified_pairs"]
+        metrics["models"] = model_metrics(recon_dir)
+        report.data["metrics"] = metrics
+        report.save(recon_dir)
+        log("✅ Reconstruction complete.")
+        if lens and refine_intrinsics:
+            save_lens_calibration(recon_dir, lens, project_dir, log=log)
 
-            self.log_message.emit("[4/4] Running mapping…")
-            map_reconstruction(database, frames_dir, recon_dir)
-            self.log_message.emit("✅ Reconstruction complete.")
-            self.log_message.emit("=== Tracking completed successfully ===")
+    if find_report(recon_dir):
+        for line in format_summary(load_report(recon_dir)):
+            log(line)
+    ReconstructionIndex(project_dir).refresh(log=log)
+    log("=== Tracking completed successfully ===")
 
-        except Exception as e:
-            self.error.emit(str(e))
-        finally:
-            self.finished.emit()
+    return recon_dir
 
 
-def generate_frames(source, dest_dir, dest_name="frame_%06d.jpg", fps=24):
+def has_frames(frames_dir):
+    return os.path.isdir(frames_dir) and any(os.scandir(frames_dir))
+
+
+def generate_frames(source, dest_dir, dest_name="frame_%06d.jpg", fps=24, num_threads=-1):
     """Generate frames using packaged ffmpeg binary."""
     dest_dir = Path(dest_dir)
     dest_dir.mkdir(parents=True, exist_ok=True)
 
     ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
 
+    threads = ["-threads", str(num_threads)] if num_threads > 0 else []
     cmd = [
-        ffmpeg_path, "-y", "-i", str(source),
+        ffmpeg_path, "-y", *threads, "-i", str(source),
         "-vf", f"fps={fps}",
         "-qscale:v", "2",
+        *threads,
         str(dest_dir / dest_name)
     ]
     print(f"[FFmpeg] Using embedded binary: {ffmpeg_path}")
     subprocess.run(cmd, check=True)
 
 
-def extract_features(db_path, frames_path, camera_model):    
+def extract_features(db_path, frames_path, camera_model, num_threads=-1, mask_dir=None):
     # set image reader to single camera
     pycolmap.extract_features(
         database_path=db_path,
         image_path=frames_path,
         camera_mode=pycolmap.CameraMode.SINGLE,
-        camera_model=camera_model
+        camera_model=camera_model,
+        # COLMAP drops keypoints where <mask_dir>/<image name>.png is black.
+        reader_options=pycolmap.ImageReaderOptions(mask_path=mask_dir or ""),
+        extraction_options=pycolmap.FeatureExtractionOptions(num_threads=num_threads)
     )
 
-def match_features(db_path, match_type, matching_options, pairing_options):
+def set_camera_prior(db_path, params):
+    """
+    Give the database cameras ``params`` as a focal length prior, or with
+    None, reset cameras that had one to COLMAP's default guess.
+    """
+    if not os.path.exists(db_path):
+        return
+    with pycolmap.Database.open(db_path) as db:
+        for camera in db.read_all_cameras():
+            if params is not None:
+                camera.params = params
+                camera.has_prior_focal_length = True
+            elif camera.has_prior_focal_length:
+                default = pycolmap.Camera.create(
+                    camera.camera_id, camera.model,
+                    DEFAULT_FOCAL_LENGTH_FACTOR * max(camera.width, camera.height), camera.width, camera.height
+                )
+                camera.params = default.params
+                camera.has_prior_focal_length = False
+            else:
+                continue
+            db.update_camera(camera)
+
+
+def save_lens_calibration(recon_dir, lens, project_dir, log=print):
+    """Add the intrinsics of the largest model of a run to the lens library, if it is well solved."""
+    models = [
+        calibration_from_model(os.path.join(recon_dir, name)) for name in sorted(os.listdir(recon_dir))
+        if os.path.isfile(os.path.join(recon_dir, name, "cameras.bin"))
+    ]
+    if not models:
+        return
+    model, width, height, params, images, error = max(models, key=lambda m: m[4])
+    if images < MIN_CALIBRATION_IMAGES or error > MAX_CALIBRATION_ERROR:
+        log(f"🔭 Model too weak to calibrate lens '{lens}' ({images} image(s), {error:.2f}px), library unchanged.")
+        return
+    source = os.path.abspath(project_dir)
+    if os.path.basename(os.path.dirname(source)) == VARIANTS_DIR:
+        source = os.path.dirname(os.path.dirname(source))  # one sample per project, variants included
+    library = LensLibrary()
+    library.add_sample(lens, model, width, height, params, source=source, images=images, error=error)
+    library.save()
+    log(f"🔭 Saved the intrinsics of lens '{lens}' ({width}x{height}) to {library.path}.")
+
+
+def clear_matches(db_path):
+    """Drop raw and verified matches, keeping cameras, images and features."""
+    if not os.path.exists(db_path):
+        return
+    with pycolmap.Database.open(db_path) as db:
+        db.clear_matches()
+        db.clear_two_view_geometries()
+
+
+def match_features(db_path, match_type, matching_options, pairing_options, log=print):
     if match_type == "exhaustive":
         pycolmap.match_exhaustive(
             database_path=db_path,
@@ -113,109 +547,342 @@ def match_features(db_path, match_type, matching_options, pairing_options):
             matching_options=matching_options,
             pairing_options=pairing_options
         )
+    elif match_type == "retrieval":
+        match_retrieval(db_path, matching_options, pairing_options, log=log)
 
-def map_reconstruction(db_path, frames_path, output_path):
-    pycolmap.incremental_mapping(
-        database_path=db_path,
-        image_path=frames_path,
-        output_path=output_path
-    )
+def map_reconstruction(db_path, frames_path, output_path, num_threads=-1, extract_colors=True,
+                       mapper="incremental", log=print, **mapper_options):
+    run_mapper(mapper, db_path, frames_path, output_path, num_threads=num_threads,
+               extract_colors=extract_colors, log=log, **mapper_options)
 
-from pxr import Usd, UsdGeom, Gf, Sdf
+from pxr import Usd, UsdGeom, Sdf, Vt
 import numpy as np
 
-def create_usd(project_dir, reconstruction: "pycolmap.Reconstruction", export_path: str, horizontal_aperature=20.0):
+# Constant local camera flip (Rx(0) * Ry(180) * Rz(180)) from COLMAP to USD axes.
+R_LOCAL = np.diag([1.0, -1.0, -1.0])
+
+
+def point_cloud_arrays(reconstruction: "pycolmap.Reconstruction", with_quality=False):
+    """
+    Return (N, 3) float32 positions, (N, 3) float32 colors in 0-1 and, with
+    ``with_quality``, (N,) track lengths and (N,) mean reprojection errors
+    (None otherwise, reading them slows the export down).
+    ``reconstruction`` can also be a model folder, read directly (see colmap_binary).
+    """
+    if isinstance(reconstruction, str):
+        arrays = read_points3D(reconstruction)
+        return (
+            arrays["xyz"].astype(np.float32),
+            arrays["rgb"].astype(np.float32) / 255.0,
+            arrays["track_lengths"].astype(np.int32) if with_quality else None,
+            arrays["errors"].astype(np.float32) if with_quality else None,
+        )
+
+    points3D = reconstruction.points3D
+    count = len(points3D)
+    points = np.empty((count, 3), dtype=np.float32)
+    colors = np.empty((count, 3), dtype=np.uint8)
+    track_lengths = errors = None
+
+    if with_quality:
+        track_lengths = np.empty(count, dtype=np.int32)
+        errors = np.empty(count, dtype=np.float32)
+        for i, pt in enumerate(points3D.values()):
+            points[i] = pt.xyz
+            colors[i] = pt.color
+            track_lengths[i] = pt.track.length()
+            errors[i] = pt.error
+    else:
+        for i, pt in enumerate(points3D.values()):
+            points[i] = pt.xyz
+            colors[i] = pt.color
+
+    return points, colors.astype(np.float32) / 255.0, track_lengths, errors
+
+
+def filter_point_cloud(points, colors, track_lengths, errors, min_track_length=0, max_reprojection_error=None):
+    """Drop points seen by too few images or with a large reprojection error."""
+    keep = np.ones(len(points), dtype=bool)
+    if min_track_length:
+        keep &= track_lengths >= min_track_length
+    if max_reprojection_error:
+        keep &= errors <= max_reprojection_error
+    return points[keep], colors[keep]
+
+
+def voxel_decimate(points, colors, voxel_size):
+    """Replace the points in each cell of a ``voxel_size`` grid by their mean position and color."""
+    if voxel_size <= 0 or len(points) == 0:
+        return points, colors
+
+    cells = np.floor(points / voxel_size).astype(np.int64)
+    cells -= cells.min(axis=0)
+    dims = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+    def mean(values):
+        return np.stack([
+            np.bincount(inverse, weights=values[:, axis], minlength=len(counts)) for axis in range(3)
+        ], axis=1) / counts[:, None]
+
+    return mean(points).astype(np.float32), mean(colors).astype(np.float32)
+
+
+def point_cloud_levels(points, colors, voxel_size=0.0, lod_levels=1, point_width=0.01):
+    """
+    Return [(name, points, colors, width)] from finest ("lod0", decimated by
+    ``voxel_size``) to coarsest, every level using a 4x coarser grid.
+    """
+    levels = [("lod0", *voxel_decimate(points, colors, voxel_size), max(point_width, voxel_size))]
+    if lod_levels > 1 and len(points):
+        # Coarse levels are sized from the robust extent of the cloud.
+        low, high = np.percentile(points, [1, 99], axis=0)
+        base = max(voxel_size, np.linalg.norm(high - low) / 1024)
+        for level in range(1, lod_levels):
+            size = base * 4 ** level
+            levels.append((f"lod{level}", *voxel_decimate(points, colors, size), max(point_width, size)))
+    return levels
+
+
+def author_points(points_prim, points, colors, width):
+    """Write one point cloud (positions, per-point colors, one width and extent) on a Points prim."""
+    points_prim.CreatePointsAttr().Set(Vt.Vec3fArray.FromNumpy(points))
+    points_prim.CreateDisplayColorPrimvar(UsdGeom.Tokens.vertex).Set(Vt.Vec3fArray.FromNumpy(colors))
+    points_prim.CreateWidthsAttr().Set(Vt.FloatArray([width]))
+    points_prim.SetWidthsInterpolation(UsdGeom.Tokens.constant)
+    if len(points):
+        points_prim.CreateExtentAttr().Set(Vt.Vec3fArray.FromNumpy(np.stack([
+            points.min(axis=0) - width / 2, points.max(axis=0) + width / 2
+        ]).astype(np.float32)))
+
+
+def author_point_cloud(stage, prim_path, levels):
+    """Define a Points prim with the given levels, as a "lod" variant set when there are several."""
+    points_prim = UsdGeom.Points.Define(stage, prim_path)
+    if len(levels) == 1:
+        author_points(points_prim, *levels[0][1:])
+        return points_prim
+
+    variant_set = points_prim.GetPrim().GetVariantSets().AddVariantSet("lod")
+    for name, points, colors, width in levels:
+        variant_set.AddVariant(name)
+        variant_set.SetVariantSelection(name)
+        with variant_set.GetVariantEditContext():
+            author_points(points_prim, points, colors, width)
+    # Load the lightest level by default, switch to lod0 for every point.
+    variant_set.SetVariantSelection(levels[-1][0])
+    return points_prim
+
+
+def parse_frame_number(name):
+    """Return the frame number of a ``frame_XXXXXX.jpg`` image name, or None."""
+    try:
+        return int(name.replace("frame_", "").replace(".jpg", ""))
+    except ValueError:
+        return None
+
+
+def camera_transform_arrays(reconstruction: "pycolmap.Reconstruction"):
+    """
+    Return (frames, matrices, camera_ids) for every registered image, sorted by frame.
+    Matrices are (N, 4, 4) row-vector USD transforms (camera to world).
+    ``reconstruction`` can also be a model folder, read directly (see colmap_binary).
+    """
+    if isinstance(reconstruction, str):
+        return model_transform_arrays(reconstruction)
+
+    frames, quats, translations, camera_ids = [], [], [], []
+
+    for image in reconstruction.images.values():
+        frame = parse_frame_number(image.name)
+        if frame is None or not image.has_pose:
+            continue
+
+        T_cw = image.cam_from_world().inverse()
+        frames.append(frame)
+        quats.append(T_cw.rotation.quat)
+        translations.append(T_cw.translation)
+        camera_ids.append(image.camera_id)
+
+    frames = np.asarray(frames, dtype=np.float64)
+    order = np.argsort(frames, kind="stable")
+    frames = frames[order]
+    camera_ids = np.asarray(camera_ids, dtype=np.int64)[order]
+    quats = np.asarray(quats, dtype=np.float64).reshape(-1, 4)[order]
+    translations = np.asarray(translations, dtype=np.float64).reshape(-1, 3)[order]
+
+    quats /= np.linalg.norm(quats, axis=1, keepdims=True)
+    matrices = np.zeros((len(frames), 4, 4), dtype=np.float64)
+    # Gf matrices use row vectors, so the rotation block is R^T.
+    matrices[:, :3, :3] = R_LOCAL @ quat_to_matrix(quats).transpose(0, 2, 1)
+    matrices[:, 3, :3] = translations
+    matrices[:, 3, 3] = 1.0
+
+    return frames, matrices, camera_ids
+
+
+def model_transform_arrays(model_dir):
+    """camera_transform_arrays of a model folder, from the cam_from_world poses in images.bin."""
+    images = read_images(model_dir)
+    numbered = sorted(
+        (frame, i) for i, frame in enumerate(map(parse_frame_number, images["names"])) if frame is not None
+    )
+    frames = np.array([frame for frame, _ in numbered], dtype=np.float64)
+    order = np.array([i for _, i in numbered], dtype=np.int64)
+
+    quats = images["quats"][order]
+    quats /= np.linalg.norm(quats, axis=1, keepdims=True)
+    rotations = quat_to_matrix(quats)  # cam_from_world
+    matrices = np.zeros((len(frames), 4, 4), dtype=np.float64)
+    # Row-vector world_from_cam: the rotation block is (R^T)^T = R, the translation -R^T t.
+    matrices[:, :3, :3] = R_LOCAL @ rotations
+    matrices[:, 3, :3] = -np.einsum("nji,nj->ni", rotations, images["translations"][order])
+    matrices[:, 3, 3] = 1.0
+    return frames, matrices, images["camera_ids"][order]
+
+
+def camera_intrinsics(reconstruction):
+    """{camera_id: (width, height, params)} of a pycolmap.Reconstruction or a model folder."""
+    if isinstance(reconstruction, str):
+        return {
+            camera_id: (camera["width"], camera["height"], camera["params"])
+            for camera_id, camera in read_cameras(reconstruction).items()
+        }
+    return {
+        camera_id: (camera.width, camera.height, camera.params)
+        for camera_id, camera in reconstruction.cameras.items()
+    }
+
+
+def quat_to_matrix(quats):
+    """Convert (N, 4) xyzw unit quaternions to (N, 3, 3) rotation matrices."""
+    x, y, z, w = quats.T
+    matrices = np.empty((len(quats), 3, 3), dtype=np.float64)
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - z * w)
+    matrices[:, 0, 2] = 2 * (x * z + y * w)
+    matrices[:, 1, 0] = 2 * (x * y + z * w)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - x * w)
+    matrices[:, 2, 0] = 2 * (x * z - y * w)
+    matrices[:, 2, 1] = 2 * (y * z + x * w)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return matrices
+
+
+def set_time_samples(layer, attr, times, values):
+    """Author many time samples on one attribute directly on the layer."""
+    path = attr.GetPath()
+    for time, value in zip(times.tolist(), values):
+        layer.SetTimeSample(path, time, value)
+
+
+def points_layer_path(export_path):
+    """Binary layer the point cloud payload is written to, next to the export."""
+    stem = os.path.splitext(export_path)[0]
+    return f"{stem}_points.usdc"
+
+
+def create_usd(project_dir, reconstruction: "pycolmap.Reconstruction", export_path: str, horizontal_aperature=20.0,
+               voxel_size=0.0, min_track_length=0, max_reprojection_error=None, lod_levels=1, points_payload=True):
     """
     Export a pycolmap.Reconstruction to USD with point cloud and animated camera.
+    Passing the model folder instead reads its binary files straight into
+    arrays, which is faster and lighter than loading the reconstruction.
+    Points can be filtered by track length and reprojection error, decimated on
+    a ``voxel_size`` grid and written as ``lod_levels`` "lod" variants. With
+    ``points_payload`` the cloud goes to a separate binary layer loaded as a
+    payload, so ``export_path`` stays a light camera layer.
     """
+    points, colors = filter_point_cloud(
+        *point_cloud_arrays(reconstruction, with_quality=bool(min_track_length or max_reprojection_error)),
+        min_track_length=min_track_length,
+        max_reprojection_error=max_reprojection_error
+    )
+    levels = point_cloud_levels(points, colors, voxel_size=voxel_size, lod_levels=lod_levels)
+    frames, matrices, camera_ids = camera_transform_arrays(reconstruction)
+
+    cameras = camera_intrinsics(reconstruction)
+    first_camera_id = next(iter(cameras))
+    first_width, first_height, _ = cameras[first_camera_id]
+    vertical_aperature = horizontal_aperature * first_height / first_width
+
+    # Intrinsics per camera: (focal length in mm, k)
+    intrinsics = {
+        cam_id: (
+            float(params[0] * (horizontal_aperature / first_width)),
+            float(params[3]),
+        )
+        for cam_id, (_, _, params) in cameras.items()
+    }
+    used_camera_ids = np.unique(camera_ids).tolist() or [first_camera_id]
+
     stage = Usd.Stage.CreateNew(export_path)
-    track_xform = UsdGeom.Xform.Define(stage, "/track")
-    track_xform.AddRotateXOp().Set(180.0)
-    
-    # --- Point Cloud ---
-    points = []
-    colors = []
-
-    for pt_id, pt in reconstruction.points3D.items():
-        # COLMAP 3D coordinates
-        points.append(pt.xyz)
-        # Optional: RGB colors (0-255) -> (0-1)
-        if hasattr(pt, 'rgb') and pt.rgb:
-            colors.append([c / 255.0 for c in pt.rgb])
-        else:
-            colors.append([1.0, 1.0, 1.0])  # default white
+    layer = stage.GetRootLayer()
 
-    points = np.array(points)
-    colors = np.array(colors)
+    # Define prims and attribute specs with the Usd API, then author all data
+    # through Sdf in one change block.
+    track_xform = UsdGeom.Xform.Define(stage, "/track")
+    rotate_attr = track_xform.AddRotateXOp().GetAttr()
 
-    # Create a USD point instancer / points primitive
-    pc_prim = UsdGeom.Points.Define(stage, "/track/PointCloud")
-    pc_prim.CreatePointsAttr(points.tolist())
-    pc_prim.CreateDisplayColorAttr(colors.tolist())
-    pc_prim.CreateWidthsAttr([0.01])  # small point size
+    # --- Point Cloud ---
+    if points_payload:
+        points_path = points_layer_path(export_path)
+        points_stage = Usd.Stage.CreateNew(points_path)
+        points_stage.SetDefaultPrim(author_point_cloud(points_stage, "/PointCloud", levels).GetPrim())
+        points_stage.GetRootLayer().Save()
+        pc_prim = stage.DefinePrim("/track/PointCloud")
+        pc_prim.GetPayloads().AddPayload("./" + os.path.basename(points_path))
+    else:
+        author_point_cloud(stage, "/track/PointCloud", levels)
 
     # --- Animated Camera ---
     camera_prim = UsdGeom.Camera.Define(stage, "/track/Camera")
-    transform_op = camera_prim.AddTransformOp()
-    
-    first_camera_id = next(iter(reconstruction.cameras.keys()))
-    first_camera = reconstruction.cameras[first_camera_id]
-    camera_prim.GetProjectionAttr().Set("perspective")
-    
-    vertical_aperature = horizontal_aperature * first_camera.height / first_camera.width
-    camera_prim.GetHorizontalApertureAttr().Set(horizontal_aperature)
-    camera_prim.GetVerticalApertureAttr().Set(vertical_aperature)
-    
+    transform_attr = camera_prim.AddTransformOp().GetAttr()
+    projection_attr = camera_prim.GetProjectionAttr()
+    h_aperture_attr = camera_prim.GetHorizontalApertureAttr()
+    v_aperture_attr = camera_prim.GetVerticalApertureAttr()
+    focal_attr = camera_prim.GetFocalLengthAttr()
+
     # --- Camera background for Houdini ---
     bg_attr = camera_prim.GetPrim().CreateAttribute(
         "houdini:backgroundimage", Sdf.ValueTypeNames.String
     )
 
-    # --- Lens distortion attribute (create once) ---
+    # --- Lens distortion attribute ---
     k_attr = camera_prim.GetPrim().CreateAttribute(
         "lens:distortion_k", Sdf.ValueTypeNames.FloatArray
     )
 
-    for img_name, image in reconstruction.images.items():
-        try:
-            frame = int(image.name.replace("frame_", "").replace(".jpg", ""))
-        except:
-            continue
-        
-        T_cw = image.cam_from_world().inverse()
-        q = T_cw.rotation.quat
-        q = q/ np.linalg.norm(q)
-        t = T_cw.translation
-        
-        q_usd = Gf.Quatd(q[3], Gf.Vec3d(q[0], q[1], q[2]))
-        R_cw = Gf.Matrix3d(q_usd)
-        t_cw = Gf.Vec3d(t[0], t[1], t[2])
-        
-        R_local_x = Gf.Matrix3d().SetRotate(Gf.Rotation(Gf.Vec3d(1,0,0), 0))
-        R_local_y = Gf.Matrix3d().SetRotate(Gf.Rotation(Gf.Vec3d(0, 1, 0), 180))
-        R_local_z = Gf.Matrix3d().SetRotate(Gf.Rotation(Gf.Vec3d(0, 0, 1), 180))
-        
-        R_l = R_local_x * R_local_y * R_local_z
-        
-        R_combined = R_l * R_cw
-        M = Gf.Matrix4d(1.0)
-        M.SetRotate(R_combined)
-        M.SetTranslateOnly(t_cw)
-        
-        transform_op.Set(M, float(frame))
-        
-        cam = reconstruction.cameras[image.camera_id]
-        f, cx, cy, k = cam.params  # only focal length
-        focal_length = f * (horizontal_aperature / first_camera.width)
-        camera_prim.GetFocalLengthAttr().Set(focal_length, time=frame)
-
-        # --- Lens distortion keyed ---
-        k_attr.Set([float(cam.params[3])], time=float(frame))
-
-        # --- Background image keyed per frame ---
-        # You can use absolute or relative path
-        img_path = os.path.join(project_dir, "frames", "frame_$F6.jpg").replace("\\", "/")  # image.path gives the original file path
-        bg_attr.Set(img_path, time=float(frame))
-                
+    # Resolve specs for attributes that fall back to schema defaults.
+    for attr in (projection_attr, h_aperture_attr, v_aperture_attr, focal_attr):
+        attr.Set(attr.Get())
+
+    img_path = os.path.join(project_dir, "frames", "frame_$F6.jpg").replace("\\", "/")
+
+    with Sdf.ChangeBlock():
+        layer.GetAttributeAtPath(rotate_attr.GetPath()).default = 180.0
+
+        layer.GetAttributeAtPath(projection_attr.GetPath()).default = "perspective"
+        layer.GetAttributeAtPath(h_aperture_attr.GetPath()).default = float(horizontal_aperature)
+        layer.GetAttributeAtPath(v_aperture_attr.GetPath()).default = float(vertical_aperature)
+
+        set_time_samples(layer, transform_attr, frames, Vt.Matrix4dArray.FromNumpy(matrices))
+
+        if len(used_camera_ids) == 1:
+            # Single camera: intrinsics never change, write them once.
+            focal_length, k = intrinsics[used_camera_ids[0]]
+            layer.GetAttributeAtPath(focal_attr.GetPath()).default = focal_length
+            layer.GetAttributeAtPath(k_attr.GetPath()).default = Vt.FloatArray([k])
+        else:
+            focal_lengths = [intrinsics[cam_id][0] for cam_id in camera_ids.tolist()]
+            ks = [Vt.FloatArray([intrinsics[cam_id][1]]) for cam_id in camera_ids.tolist()]
+            set_time_samples(layer, focal_attr, frames, focal_lengths)
+            set_time_samples(layer, k_attr, frames, ks)
+
+        # Houdini expands $F6 per frame, so the path is constant.
+        layer.GetAttributeAtPath(bg_attr.GetPath()).default = img_path
+
     # Save USD
-    stage.GetRootLayer().Save()
+    layer.Save()
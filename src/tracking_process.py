@@ -0,0 +1,192 @@
+"""
+Tracking in a child process.
+
+The GUI runs every track in a process of its own (``ui.worker.TrackingProcess``),
+so a crash in a native library only ends that run, the memory of SIFT,
+matching and mapping is given back when the run ends, and several projects
+can be tracked at once. ``run_child`` captures the child's output (native
+lines included) into the run's log file and sends messages to the GUI over a
+pipe, each a dict with a ``type``:
+
+    log        {"lines": [...]}
+    progress   {"progress": (label, current, total) or None}, parsed from COLMAP's output
+    stage      {"name": ..., "stats": None when the stage starts, its timings and metrics when it ends}
+    preview    {"update": ...}, the model being mapped (see ``ui.viewer.LiveModelFeed``)
+    finished   {"recon_dir": ...}
+    cancelled  {}
+    error      {"message": ..., "traceback": ...}
+
+One of the last three ends the run. Setting the ``cancel`` event stops it at
+the next safe point; ``kill_tree`` ends it at once, with the processes it
+started (chunk and shard workers, ffmpeg): they share its process group on
+POSIX and its Job object on Windows (``contain``).
+"""
+import os
+import signal
+import sys
+import threading
+import traceback
+
+from checkpoints import TrackingCancelled
+from log_capture import LogCapture
+
+# Seconds between batches of log lines sent to the GUI.
+FORWARD_INTERVAL = 0.05
+# Windows process access rights that ``contain`` needs.
+PROCESS_TERMINATE = 0x0001
+PROCESS_SET_QUOTA = 0x0100
+
+
+def forward_output(capture, send, stop):
+    """Send captured lines and progress changes until ``stop`` is set, then what is left."""
+    last_progress = None
+    while True:
+        stopping = stop.wait(FORWARD_INTERVAL)
+        lines, dropped, progress = capture.drain()
+        if dropped:
+            lines.insert(0, f"… {dropped} line(s) skipped, see the run's log file")
+        if lines:
+            send("log", lines=lines)
+        if progress != last_progress:
+            last_progress = progress
+            send("progress", progress=progress)
+        if stopping:
+            return
+
+
+def lead_process_group():
+    """In the child: start a process group on POSIX that the processes it starts join, for ``kill_tree``."""
+    if os.name == "posix":
+        os.setpgrp()
+
+
+def contain(pid):
+    """
+    Put process ``pid`` in a Job object of its own on Windows, which the
+    processes it starts join too. Returns the job handle for ``kill_tree``,
+    or None elsewhere and when it cannot be made.
+    """
+    if sys.platform != "win32":
+        return None
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+    kernel32.CreateJobObjectW.argtypes = [wintypes.LPVOID, wintypes.LPCWSTR]
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    kernel32.AssignProcessToJobObject.argtypes = [wintypes.HANDLE, wintypes.HANDLE]
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+
+    job = kernel32.CreateJobObjectW(None, None)
+    if not job:
+        return None
+    process = kernel32.OpenProcess(PROCESS_SET_QUOTA | PROCESS_TERMINATE, False, pid)
+    assigned = bool(process) and kernel32.AssignProcessToJobObject(job, process)
+    if process:
+        kernel32.CloseHandle(process)
+    if not assigned:
+        kernel32.CloseHandle(job)
+        return None
+    return job
+
+
+def kill_tree(process, job=None):
+    """End ``process`` (a multiprocessing process running ``run_child``) and the processes it started."""
+    if job is not None:
+        import ctypes
+        from ctypes import wintypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.TerminateJobObject.argtypes = [wintypes.HANDLE, wintypes.UINT]
+        kernel32.TerminateJobObject(job, 1)
+    elif os.name == "posix":
+        try:
+            # Only once the child leads its group, before that it has started nothing.
+            if os.getpgid(process.pid) == process.pid:
+                os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass  # already gone
+    process.kill()
+
+
+def close_job(job):
+    """Let go of a job handle from ``contain`` once its processes have exited."""
+    if job is not None:
+        import ctypes
+        from ctypes import wintypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        kernel32.CloseHandle(job)
+
+
+def run_child(conn, cancel, project_dir, settings, log_path):
+    """
+    Process entry point: run ``tracking.run_tracking`` on a project with
+    ``settings`` (its keyword arguments, with ``pair_settings`` for
+    ``make_pair_options`` in place of ``pair_options``) and report over ``conn``.
+    With ``variant`` set in the settings the run works in a copy of the project
+    (``tracking.setup_variant``), for runs beside another one of the same project.
+    """
+    lead_process_group()
+    lock = threading.Lock()
+
+    def send(kind, **payload):
+        with lock:
+            conn.send({"type": kind, **payload})
+
+    capture = LogCapture(terminal=False)
+    capture.start()
+    capture.start_run(log_path)
+    stop = threading.Event()
+    forwarder = threading.Thread(target=forward_output, args=(capture, send, stop), name="forward", daemon=True)
+    forwarder.start()
+
+    try:
+        from tracking import adopt_variant, make_pair_options, run_tracking, setup_variant
+
+        settings = dict(settings)
+        variant = settings.pop("variant", False)
+        preview = None
+        if settings.pop("live_preview", False):
+            from ui.viewer import LiveModelFeed
+
+            preview = LiveModelFeed()
+            preview.updated.connect(lambda update: send("preview", update=update))
+        match_type = settings.pop("match_type")
+        variant_dir = setup_variant(project_dir) if variant else None
+        try:
+            recon_dir = run_tracking(
+                variant_dir or project_dir,
+                settings.pop("camera_model"),
+                match_type,
+                settings.pop("sift_ratio"),
+                settings.pop("sift_distance"),
+                make_pair_options(match_type, **settings.pop("pair_settings")),
+                cancel=cancel,
+                preview=preview,
+                on_stage=lambda name, stats: send("stage", name=name, stats=stats),
+                log=capture.write,
+                **settings
+            )
+        finally:
+            if variant_dir:
+                moved = adopt_variant(variant_dir, project_dir, log=capture.write)
+        if variant_dir:
+            recon_dir = moved.get(recon_dir, recon_dir)
+        result = ("finished", {"recon_dir": recon_dir})
+    except TrackingCancelled:
+        result = ("cancelled", {})
+    except Exception as e:
+        capture.write(traceback.format_exc().rstrip())
+        result = ("error", {"message": str(e), "traceback": traceback.format_exc()})
+
+    # Restoring the output waits for the last native lines, then the rest is sent before the result.
+    capture.stop()
+    stop.set()
+    forwarder.join()
+    capture.end_run()
+    send(result[0], **result[1])
+    conn.close()
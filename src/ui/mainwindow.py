@@ -1,25 +1,53 @@
 from PySide6.QtWidgets import (
     QHBoxLayout, QLabel, QPushButton, QVBoxLayout, QWidget,
-    QFileDialog, QMessageBox, QTextEdit, QComboBox, QStackedWidget, QFormLayout, QSpinBox, QDoubleSpinBox, QMenuBar
+    QFileDialog, QMessageBox, QPlainTextEdit, QProgressBar, QComboBox, QStackedWidget, QFormLayout, QSpinBox, QDoubleSpinBox, QMenuBar, QCheckBox
 )
 from PySide6.QtGui import QAction
-from PySide6.QtCore import QObject, Signal, QThread, QThreadPool
+from PySide6.QtCore import QObject, Signal, QThreadPool, QCoreApplication, QTimer, Qt
 
 import os
 import shutil
-import pycolmap
-
-from tracking import create_usd, TrackingWorker
+import time
+
+# NumPy, pycolmap, USD and OpenGL load after the first paint (see ui/startup.py):
+# tracking, ui.viewer and ui.worker are imported where they are used.
+from cache import find_checkpoint
+from log_capture import LogCapture, RING_LINES
+from project_index import ReconstructionIndex, ModelCache, SORT_KEYS, describe
+from lenses import LensLibrary
+from presets import PRESETS, plan_preset
+from ui.startup import FirstPaint, Warmup
+
+LOG_UPDATES_PER_SECOND = 20
+# Lines appended per update, keeps a log burst from freezing the window.
+LOG_LINES_PER_UPDATE = 5000
+# Seconds the running tracks get to stop at a safe point when the window closes, before they are killed.
+CLOSE_GRACE_SECONDS = 10
 
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Methven Track")
-        self.resize(400, 700)
+        self.resize(1100, 700)
 
         self.project_dir = None
         self.source_video = None
-        
+        self.model_cache = ModelCache(max_models=4)
+        # Tracking runs by run id, each in its own process; several may track one project.
+        self.runs = {}
+        self.run_count = 0
+        # The USD export running on a background thread, one at a time.
+        self.usd_export = None
+        # Native COLMAP/ffmpeg output is captured too, and shown in batches.
+        self.log_capture = LogCapture()
+        self.log_capture.start()
+
+        # Load the heavy modules in the background once the window is on screen.
+        self.first_paint = FirstPaint(self)
+        self.warmup = Warmup()
+        self.first_paint.painted.connect(self.warmup.start)
+        self.warmup.failed.connect(self.log)
+        self.warmup.ready.connect(self.ensure_viewer)
         
         top_bar = QHBoxLayout()
         
@@ -39,15 +67,51 @@ class MainWindow(QWidget):
         # add the custom "menu" area
         main_v_layout.addLayout(top_bar)
 
+        # Controls on the left, the 3D view of the selected model on the right
+        content_row = QHBoxLayout()
         self.main_layout = QVBoxLayout()
-        main_v_layout.addLayout(self.main_layout, 1)
+        content_row.addLayout(self.main_layout)
+        # The OpenGL viewer replaces this placeholder once its modules are loaded.
+        self.viewer = None
+        self.viewer_placeholder = QLabel("Loading viewer…")
+        self.viewer_placeholder.setAlignment(Qt.AlignCenter)
+        content_row.addWidget(self.viewer_placeholder, 1)
+        self.content_row = content_row
+        main_v_layout.addLayout(content_row, 1)
         
         sift_settings_widget = QWidget()
         sift_settings_layout = QFormLayout()
                 
+        self.clip = None
+        self.cost_model = None
+        self.applying_preset = False
+        self.preset_selector = QComboBox()
+        self.preset_selector.addItem("Custom", None)
+        for preset in PRESETS:
+            self.preset_selector.addItem(preset.capitalize(), preset)
+        self.preset_selector.setToolTip(
+            "Fill in the settings below for this clip's length, resolution and motion.\n"
+            "Fast and Balanced trade some accuracy for runtime, Quality picks the most thorough\n"
+            "matching and mapping that still finish in a reasonable time."
+        )
+        self.preset_selector.currentIndexChanged.connect(self.apply_preset)
+        sift_settings_layout.addRow("Preset:", self.preset_selector)
+
         self.camera_model_selector = QComboBox()
         self.camera_model_selector.addItems(["SIMPLE_RADIAL", "FISHEYE"])
         sift_settings_layout.addRow("Camera Model:", self.camera_model_selector)
+
+        self.lens_selector = QComboBox()
+        self.lens_selector.setEditable(True)
+        self.lens_selector.setToolTip(
+            "Lens library calibration to start from. Type a new name to calibrate that lens:\n"
+            "the solved intrinsics are saved to the library when tracking finishes."
+        )
+        self.lens_fixed_check = QCheckBox("Hold lens fixed")
+        self.lens_fixed_check.setToolTip("Keep the library intrinsics instead of refining them (faster, consistent focal length).")
+        self.refresh_lens_list()
+        sift_settings_layout.addRow("Lens:", self.lens_selector)
+        sift_settings_layout.addRow(self.lens_fixed_check)
         
         self.max_sift_ratio_spin = QDoubleSpinBox()
         self.max_sift_ratio_spin.setValue(0.8)
@@ -55,12 +119,75 @@ class MainWindow(QWidget):
         self.max_sift_distance_spin.setValue(0.7)
         sift_settings_layout.addRow("Max Sift ratio:", self.max_sift_ratio_spin)
         sift_settings_layout.addRow("Max Sift distance:", self.max_sift_distance_spin)
+
+        self.streaming_check = QCheckBox("Stream frames into feature extraction")
+        self.streaming_check.setToolTip("Decode the video once and extract features while frames are decoded.")
+        sift_settings_layout.addRow(self.streaming_check)
+
+        self.proxy_selector = QComboBox()
+        for label, scale in (("Full resolution", 1.0), ("1/2", 0.5), ("1/4", 0.25)):
+            self.proxy_selector.addItem(label, scale)
+        self.proxy_selector.setToolTip(
+            "Track on downscaled frames (much faster on 4K/6K plates).\n"
+            "Cameras are rescaled to full resolution and plates are extracted on export."
+        )
+        sift_settings_layout.addRow("Tracking resolution:", self.proxy_selector)
+
+        self.motion_masks_check = QCheckBox("Mask moving objects")
+        self.motion_masks_check.setToolTip("Extract no features on people, cars, water and other independently moving things.")
+        sift_settings_layout.addRow(self.motion_masks_check)
+
+        self.mattes_dir = None
+        self.mattes_btn = QPushButton("Garbage mattes…")
+        self.mattes_btn.setToolTip(
+            "Folder of mattes (white = no features), one per frame numbered like the frames,\n"
+            "or a single image for the whole shot. Cancel the dialog to clear."
+        )
+        self.mattes_btn.clicked.connect(self.select_mattes)
+        sift_settings_layout.addRow("Mattes:", self.mattes_btn)
+
+        self.keyframes_check = QCheckBox("Adaptive keyframes")
+        self.keyframes_check.setToolTip("Only match and map frames with enough motion, then register the rest.")
+        self.keyframe_motion_spin = QDoubleSpinBox()
+        self.keyframe_motion_spin.setDecimals(3)
+        self.keyframe_motion_spin.setSingleStep(0.01)
+        self.keyframe_motion_spin.setValue(0.05)
+        self.keyframe_motion_spin.setEnabled(False)
+        self.keyframes_check.toggled.connect(self.keyframe_motion_spin.setEnabled)
+        sift_settings_layout.addRow(self.keyframes_check)
+        sift_settings_layout.addRow("Keyframe motion:", self.keyframe_motion_spin)
+
+        self.mapper_selector = QComboBox()
+        self.mapper_selector.addItems(["incremental", "chunked", "global"])
+        self.mapper_selector.setToolTip(
+            "incremental: COLMAP's incremental mapper.\n"
+            "chunked: map overlapping chunks of frames in parallel and join them (long shots).\n"
+            "global: solve all camera poses at once, then one bundle adjustment (fast on long shots)."
+        )
+        self.chunk_size_spin = QSpinBox()
+        self.chunk_size_spin.setRange(10, 100000)
+        self.chunk_size_spin.setValue(300)
+        self.chunk_size_spin.setEnabled(False)
+        self.mapper_selector.currentTextChanged.connect(
+            lambda mapper: self.chunk_size_spin.setEnabled(mapper == "chunked")
+        )
+        sift_settings_layout.addRow("Mapper:", self.mapper_selector)
+        sift_settings_layout.addRow("Chunk size:", self.chunk_size_spin)
+
+        self.shards_spin = QSpinBox()
+        self.shards_spin.setRange(0, 256)
+        self.shards_spin.setSpecialValueText("Off")
+        self.shards_spin.setToolTip(
+            "Extract and match features in shards on this many processes, then merge them.\n"
+            "Other machines sharing the project folder can help with: cli.py shard-worker <project>"
+        )
+        sift_settings_layout.addRow("Shard workers:", self.shards_spin)
         
         sift_settings_widget.setLayout(sift_settings_layout)
         self.main_layout.addWidget(sift_settings_widget)
 
         self.match_type_selector = QComboBox()
-        self.match_type_selector.addItems(["exhaustive", "sequential", "spatial"])
+        self.match_type_selector.addItems(["exhaustive", "sequential", "spatial", "retrieval"])
         self.main_layout.addWidget(QLabel("Feature Matching Type:"))
         self.main_layout.addWidget(self.match_type_selector)
         
@@ -94,81 +221,223 @@ class MainWindow(QWidget):
         spatial_layout.addRow("Max distance:", self.max_distance_spin)
         spatial_widget.setLayout(spatial_layout)
 
+        # Retrieval options
+        retrieval_widget = QWidget()
+        retrieval_layout = QFormLayout()
+        self.retrieval_overlap_spin = QSpinBox()
+        self.retrieval_overlap_spin.setValue(15)
+        self.retrieval_neighbors_spin = QSpinBox()
+        self.retrieval_neighbors_spin.setRange(1, 100)
+        self.retrieval_neighbors_spin.setValue(8)
+        self.retrieval_neighbors_spin.setToolTip("Most similar frames matched per frame, to close loops.")
+        retrieval_layout.addRow("Overlap:", self.retrieval_overlap_spin)
+        retrieval_layout.addRow("Retrieved frames:", self.retrieval_neighbors_spin)
+        retrieval_widget.setLayout(retrieval_layout)
+
         self.pair_options_stack.addWidget(exhaustive_widget)
         self.pair_options_stack.addWidget(sequential_widget)
         self.pair_options_stack.addWidget(spatial_widget)
+        self.pair_options_stack.addWidget(retrieval_widget)
 
         # Switch on match type change
         self.match_type_selector.currentIndexChanged.connect(
             lambda i: self.pair_options_stack.setCurrentIndex(i)
         )
 
+        self.estimate_label = QLabel()
+        self.estimate_label.setWordWrap(True)
+        self.main_layout.addWidget(self.estimate_label)
+        # Any setting the estimate depends on: update it, and leave the preset for "Custom".
+        for signal in (
+            self.proxy_selector.currentIndexChanged, self.keyframes_check.toggled,
+            self.keyframe_motion_spin.valueChanged, self.mapper_selector.currentIndexChanged,
+            self.chunk_size_spin.valueChanged, self.match_type_selector.currentIndexChanged,
+            self.overlap_spin.valueChanged, self.max_neighbors_spin.valueChanged,
+            self.retrieval_overlap_spin.valueChanged, self.retrieval_neighbors_spin.valueChanged,
+            self.motion_masks_check.toggled,
+        ):
+            signal.connect(self.settings_changed)
+
+        tracking_row = QHBoxLayout()
         self.track_btn = QPushButton("▶ Run Tracking")
         self.track_btn.setEnabled(False)
         self.track_btn.clicked.connect(self.handle_tracking_action)
-        self.main_layout.addWidget(self.track_btn)
+        self.resume_btn = QPushButton("⏯ Resume")
+        self.resume_btn.setToolTip("Continue the unfinished run from its last checkpoint.")
+        self.resume_btn.setVisible(False)
+        self.resume_btn.clicked.connect(self.run_tracking)
+        self.cancel_btn = QPushButton("⏹ Cancel")
+        self.cancel_btn.setToolTip("Stop at the next safe point, keeping a checkpoint to resume from.")
+        self.cancel_btn.setVisible(False)
+        self.cancel_btn.clicked.connect(self.cancel_tracking)
+        tracking_row.addWidget(self.track_btn, 1)
+        tracking_row.addWidget(self.resume_btn)
+        tracking_row.addWidget(self.cancel_btn)
+        self.main_layout.addLayout(tracking_row)
 
         # Reconstruction selector
         self.main_layout.addWidget(QLabel("<b>Reconstructions</b>"))
+        recon_row = QHBoxLayout()
         self.recon_selector = QComboBox()
         self.recon_selector.setEnabled(False)
-        self.main_layout.addWidget(self.recon_selector)
+        self.recon_selector.currentIndexChanged.connect(self.show_selected_model)
+        self.recon_sort_selector = QComboBox()
+        self.recon_sort_selector.addItems(list(SORT_KEYS))
+        self.recon_sort_selector.setToolTip("Sort by name, or by quality (frame coverage, then reprojection error).")
+        self.recon_sort_selector.currentTextChanged.connect(
+            lambda _: self.project_dir and self.update_reconstruction_list()
+        )
+        self.delete_recon_btn = QPushButton("🗑")
+        self.delete_recon_btn.setToolTip("Delete the selected reconstruction from disk.")
+        self.delete_recon_btn.setEnabled(False)
+        self.delete_recon_btn.clicked.connect(self.delete_reconstruction)
+        recon_row.addWidget(self.recon_selector, 1)
+        recon_row.addWidget(self.delete_recon_btn)
+        recon_row.addWidget(QLabel("Sort:"))
+        recon_row.addWidget(self.recon_sort_selector)
+        self.main_layout.addLayout(recon_row)
+
+        # Export options
+        self.export_options_widget = QWidget()
+        export_options_layout = QFormLayout()
+        self.voxel_size_spin = QDoubleSpinBox()
+        self.voxel_size_spin.setDecimals(4)
+        self.voxel_size_spin.setSingleStep(0.01)
+        self.voxel_size_spin.setToolTip("Merge the points in each voxel of this size (0 keeps every point).")
+        self.min_track_length_spin = QSpinBox()
+        self.min_track_length_spin.setToolTip("Drop points seen by fewer images.")
+        self.max_error_spin = QDoubleSpinBox()
+        self.max_error_spin.setToolTip("Drop points with a larger reprojection error in pixels (0 keeps every point).")
+        self.lod_levels_spin = QSpinBox()
+        self.lod_levels_spin.setRange(1, 6)
+        self.lod_levels_spin.setToolTip("Point cloud level-of-detail variants, the coarsest is loaded by default.")
+        export_options_layout.addRow("Voxel size:", self.voxel_size_spin)
+        export_options_layout.addRow("Min track length:", self.min_track_length_spin)
+        export_options_layout.addRow("Max reprojection error:", self.max_error_spin)
+        export_options_layout.addRow("LOD levels:", self.lod_levels_spin)
+        self.export_options_widget.setLayout(export_options_layout)
+        self.export_options_widget.setVisible(False)
+        self.main_layout.addWidget(self.export_options_widget)
 
         self.export_btn = QPushButton("💾 Export USD")
         self.export_btn.setVisible(False)
         self.export_btn.clicked.connect(self.export_usd)
         self.main_layout.addWidget(self.export_btn)
 
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        self.main_layout.addWidget(self.progress_bar)
+        self.runs_label = QLabel()
+        self.runs_label.setVisible(False)
+        self.main_layout.addWidget(self.runs_label)
+
         self.main_layout.addWidget(QLabel("<b>Log Output</b>"))
-        self.log_box = QTextEdit()
+        self.log_box = QPlainTextEdit()
         self.log_box.setReadOnly(True)
+        self.log_box.setUndoRedoEnabled(False)
+        self.log_box.setMaximumBlockCount(RING_LINES)
         self.log_box.setPlaceholderText("Tracking logs will appear here…")
 
         self.main_layout.addWidget(self.log_box, 1)
 
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(1000 // LOG_UPDATES_PER_SECOND)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start()
+
     # ----------------------------------------------------
     # Utility
     # ----------------------------------------------------
     def log(self, message: str):
-        self.log_box.append(message)
-        self.log_box.verticalScrollBar().setValue(
-            self.log_box.verticalScrollBar().maximum()
-        )
-        print(message)
+        """Thread safe: the message shows up with the next log flush."""
+        self.log_capture.write(message)
+
+    def flush_log(self):
+        """Show the lines logged since the last flush in one append, and the progress of the project's run."""
+        lines, dropped, _ = self.log_capture.drain(LOG_LINES_PER_UPDATE)
+        if lines:
+            scroll_bar = self.log_box.verticalScrollBar()
+            follow = scroll_bar.value() == scroll_bar.maximum()
+            if dropped:
+                lines.insert(0, f"… {dropped} line(s) skipped, see the run's log file")
+            self.log_box.appendPlainText("\n".join(lines))
+            if follow:
+                scroll_bar.setValue(scroll_bar.maximum())
+
+        run = self.current_run()
+        progress = run.progress if run is not None else None
+        if progress is not None:
+            label, current, total = progress
+            self.progress_bar.setVisible(True)
+            if total:
+                self.progress_bar.setRange(0, total)
+                self.progress_bar.setValue(min(current, total))
+                self.progress_bar.setFormat(f"{label} %v/%m")
+            else:
+                self.progress_bar.setRange(0, 0)  # busy indicator
+                self.progress_bar.setFormat(f"{label} {current}")
+
+    def ensure_viewer(self):
+        """Create the 3D viewer in place of its placeholder; returns it."""
+        if self.viewer is None:
+            self.warmup.wait()
+            from ui.viewer import ModelViewer
+            self.viewer = ModelViewer()
+            self.content_row.replaceWidget(self.viewer_placeholder, self.viewer)
+            self.viewer_placeholder.deleteLater()
+        return self.viewer
 
     def set_project(self, project_dir: str):
         self.project_dir = project_dir
+        self.model_cache.clear()
         self.setWindowTitle(f"Methven Track {project_dir}")
-        self.track_btn.setEnabled(True)
         self.log(f"📁 Loaded project: {project_dir}")
+        # The viewer and the probe import native modules: not while the warmup does.
+        self.warmup.after(self.show_project)
+
+    def show_project(self):
+        """Show the current project in the viewer, lists and estimates."""
+        if not self.project_dir:
+            return
+        # Load the viewer's modules before the probe thread imports its own: native
+        # modules loaded from two threads at once can deadlock (USD's take the GIL).
+        self.ensure_viewer().clear()
+        self.probe_clip()
+        self.update_run_controls()
 
         self.update_reconstruction_list()
         if self.recon_selector.count() > 0:
             self.recon_selector.setCurrentIndex(0)
+        self.update_resume_button()
+
+    def update_resume_button(self):
+        """Offer to resume when the project has a run that did not finish mapping."""
+        unfinished = bool(self.project_dir) and not self.project_runs() and \
+            find_checkpoint(os.path.join(self.project_dir, "reconstruction")) is not None
+        self.resume_btn.setVisible(unfinished)
+
+    def closeEvent(self, event):
+        """
+        Cancel the running tracks, so they write their checkpoints, and end
+        the ones that did not stop within CLOSE_GRACE_SECONDS.
+        """
+        if self.runs:
+            for run in self.runs.values():
+                run.cancel()
+            self.log(f"⏹ Cancelling {len(self.runs)} run(s) at the next safe point…")
+            deadline = time.monotonic() + CLOSE_GRACE_SECONDS
+            while self.runs and time.monotonic() < deadline:
+                QCoreApplication.processEvents()
+                time.sleep(0.05)
+            for run in list(self.runs.values()):
+                run.kill()
+        if self.usd_export is not None:
+            self.log("⏳ Waiting for the USD export to finish…")
+            self.usd_export.thread.join()
+        self.log_timer.stop()
+        self.log_capture.stop()
+        event.accept()
 
-    def update_reconstruction_list(self):
-        """Refresh the reconstruction dropdown."""
-        self.recon_selector.clear()
-        recon_dir = os.path.join(self.project_dir, "reconstruction")
-        if not os.path.exists(recon_dir):
-            os.makedirs(recon_dir, exist_ok=True)
-
-        recon_folders = [
-            name for name in os.listdir(recon_dir)
-            if os.path.isdir(os.path.join(recon_dir, name))
-        ]
-        recon_folders.sort()
-
-        if recon_folders:
-            self.recon_selector.addItems(recon_folders)
-            self.recon_selector.setEnabled(True)
-            self.track_btn.setText("🔁 Retrack")
-            self.export_btn.setVisible(True)
-            self.log(f"🧠 Found {len(recon_folders)} reconstruction(s).")
-        else:
-            self.recon_selector.setEnabled(False)
-            self.track_btn.setText("▶ Run Tracking")
-            self.export_btn.setVisible(False)
     # ----------------------------------------------------
     # Project management
     # ----------------------------------------------------
@@ -184,14 +453,10 @@ class MainWindow(QWidget):
             self, "Select Folder to Create Project In", os.path.expanduser("~")
         )
 
-        os.makedirs(project_path, exist_ok=True)
-
-        dest_video = os.path.join(project_path, "source.mp4")
-        shutil.copy2(video_path, dest_video)
-        self.log(f"📀 Copied source video to: {dest_video}")
-
-        os.makedirs(os.path.join(project_path, "frames"), exist_ok=True)
-        os.makedirs(os.path.join(project_path, "reconstruction"), exist_ok=True)
+        self.warmup.wait()
+        from tracking import setup_project
+        setup_project(project_path, video_path)
+        self.log(f"📀 Copied source video to: {os.path.join(project_path, 'source.mp4')}")
 
         self.set_project(project_path)
 
@@ -210,30 +475,146 @@ class MainWindow(QWidget):
         self.source_video = video_path
         self.set_project(project_dir)
 
+    def refresh_lens_list(self):
+        current = self.lens_selector.currentText()
+        self.lens_selector.clear()
+        self.lens_selector.addItems([""] + LensLibrary().names())
+        self.lens_selector.setCurrentText(current)
+
+    # ----------------------------------------------------
+    # Presets and estimates
+    # ----------------------------------------------------
+    def probe_clip(self):
+        """Measure the project's clip in the background; presets and estimates wait for it."""
+        from ui.worker import ClipProbe
+
+        self.clip = None
+        self.estimate_label.setText("⏱️ Estimating runtime…")
+        self.clip_probe = ClipProbe()
+        self.clip_probe.log_message.connect(self.log)
+        self.clip_probe.probed.connect(self.clip_probed)
+        self.clip_probe.start(os.path.join(self.project_dir, "source.mp4"))
+
+    def clip_probed(self, video_path, clip, cost_model):
+        if not self.project_dir or video_path != os.path.join(self.project_dir, "source.mp4"):
+            return  # another project was opened meanwhile
+        self.clip, self.cost_model = clip, cost_model
+        self.log(f"🎬 {clip['frames']} frame(s) at {clip['width']}x{clip['height']}, "
+                 f"{clip['motion'] * 100:.2f}% motion per frame.")
+        self.apply_preset()
+
+    def current_settings(self):
+        """The settings shown in the window, as CLI config keys (what the cost model reads)."""
+        match_type = self.match_type_selector.currentText()
+        return {
+            "proxy_scale": self.proxy_selector.currentData(),
+            "keyframes": self.keyframes_check.isChecked(),
+            "keyframe_motion": self.keyframe_motion_spin.value(),
+            "mapper": self.mapper_selector.currentText(),
+            "chunk_size": self.chunk_size_spin.value(),
+            "chunk_overlap": max(3, self.chunk_size_spin.value() // 10),
+            "match_type": match_type,
+            "overlap": (self.retrieval_overlap_spin if match_type == "retrieval" else self.overlap_spin).value(),
+            "max_num_neighbors": self.max_neighbors_spin.value(),
+            "retrieval_neighbors": self.retrieval_neighbors_spin.value(),
+            "motion_masks": self.motion_masks_check.isChecked(),
+        }
+
+    def apply_preset(self):
+        """Set the widgets to the selected preset's settings for this clip."""
+        preset = self.preset_selector.currentData()
+        if preset and self.clip is not None:
+            settings = plan_preset(self.clip, preset, self.cost_model)
+            self.applying_preset = True
+            try:
+                self.proxy_selector.setCurrentIndex(self.proxy_selector.findData(settings["proxy_scale"]))
+                self.keyframes_check.setChecked(settings["keyframes"])
+                self.keyframe_motion_spin.setValue(settings["keyframe_motion"])
+                self.mapper_selector.setCurrentText(settings["mapper"])
+                self.match_type_selector.setCurrentText(settings["match_type"])
+                if settings["match_type"] == "sequential":
+                    self.overlap_spin.setValue(settings["overlap"])
+                elif settings["match_type"] == "retrieval":
+                    self.retrieval_overlap_spin.setValue(settings["overlap"])
+                    self.retrieval_neighbors_spin.setValue(settings["retrieval_neighbors"])
+            finally:
+                self.applying_preset = False
+        self.update_estimate()
+
+    def settings_changed(self):
+        if not self.applying_preset:
+            self.preset_selector.blockSignals(True)
+            self.preset_selector.setCurrentIndex(0)
+            self.preset_selector.blockSignals(False)
+            self.update_estimate()
+
+    def update_estimate(self):
+        if self.clip is None:
+            return
+        from cost_model import format_estimate
+
+        stages = self.cost_model.estimate(self.clip, self.current_settings())
+        self.estimate_label.setText(f"⏱️ Estimated runtime {format_estimate(stages)}")
+
+    def select_mattes(self):
+        mattes_dir = QFileDialog.getExistingDirectory(
+            self, "Select Garbage Mattes Folder", self.project_dir or os.path.expanduser("~")
+        )
+        self.mattes_dir = mattes_dir or None
+        self.mattes_btn.setText(os.path.basename(mattes_dir) if mattes_dir else "Garbage mattes…")
+        if mattes_dir:
+            self.log(f"🎭 Garbage mattes: {mattes_dir}")
+
     # ----------------------------------------------------
     # Tracking control
     # ----------------------------------------------------
     def handle_tracking_action(self):
         """Handle Track or Retrack button click."""
-        if self.track_btn.text().startswith("🔁"):
+        if self.project_busy():
+            confirm = QMessageBox.question(
+                self, "Track a Variant",
+                "A run or an export is using this project. Track it again with the current settings beside it?\n"
+                "The new run works in a copy of the project (frames and features are extracted again), "
+                "and its reconstruction is added to the project when it finishes.",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if confirm == QMessageBox.No:
+                return
+        elif self.track_btn.text().startswith("🔁"):
             confirm = QMessageBox.question(
                 self, "Retrack Project",
-                "This will clear all existing reconstructions.\nContinue?",
+                "Track again with the current settings?\n"
+                "Frames, features, matches and models are reused when their inputs are unchanged, "
+                "an unfinished run with the same settings resumes from its checkpoint, "
+                "and other settings are mapped into a new reconstruction.\n"
+                "Existing reconstructions are kept (🗑 deletes the selected one).",
                 QMessageBox.Yes | QMessageBox.No
             )
             if confirm == QMessageBox.No:
                 return
 
-            # Clear reconstructions
-            recon_dir = os.path.join(self.project_dir, "reconstruction")
-            for item in os.listdir(recon_dir):
-                path = os.path.join(recon_dir, item)
-                if os.path.isdir(path):
-                    shutil.rmtree(path)
-            self.log("🧹 Cleared old reconstructions.")
-
         self.run_tracking()
 
+    def delete_reconstruction(self):
+        """Delete the run folder of the selected model, with every model and checkpoint in it."""
+        name = self.recon_selector.currentData()
+        if not self.project_dir or not name or self.project_runs():
+            return
+        run = name.split("/")[0]
+        confirm = QMessageBox.question(
+            self, "Delete Reconstruction",
+            f"Delete reconstruction {run} and all of its models from disk?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if confirm == QMessageBox.No:
+            return
+
+        shutil.rmtree(os.path.join(self.project_dir, "reconstruction", run))
+        self.model_cache.clear()
+        self.log(f"🗑️ Deleted reconstruction {run}.")
+        self.update_reconstruction_list()
+        self.update_run_controls()
+
     # ----------------------------------------------------
     # Tracking pipeline
     # ----------------------------------------------------
@@ -242,76 +623,165 @@ class MainWindow(QWidget):
         if not self.project_dir:
             QMessageBox.warning(self, "No Project", "Please create or open a project first.")
             return
+        # Beside a run in the project's folder, the run works in a copy of it.
+        variant = self.project_busy()
+        self.run_count += 1
+        label = os.path.basename(os.path.normpath(self.project_dir))
+        if variant:
+            label += f" #{self.run_count}"
+        log_path = os.path.join(self.project_dir, "logs", time.strftime("track_%Y%m%d_%H%M%S") + f"_{self.run_count}.log")
+        self.log(f"🚀 Starting tracking{' of a variant' if variant else ''} in a separate process…")
+        self.log(f"📝 Full log: {log_path}")
 
-        self.track_btn.setEnabled(False)
-        self.log("🚀 Starting tracking in background thread…")
-
-        # Prepare matching options based on current UI
         match_type = self.match_type_selector.currentText()
-        if match_type == "exhaustive":
-            pair_options = pycolmap.ExhaustivePairingOptions(block_size=self.block_size_spin.value())
-        elif match_type == "sequential":
-            pair_options = pycolmap.SequentialPairingOptions(overlap=self.overlap_spin.value())
-        else:
-            pair_options = pycolmap.SpatialPairingOptions(
-                max_num_neighbors=self.max_neighbors_spin.value(),
-                max_distance=self.max_distance_spin.value()
-            )
-
-        # Create thread and worker
-        self.thread = QThread()
-        self.worker = TrackingWorker(
-            project_dir=self.project_dir,
-            camera_model=self.camera_model_selector.currentText(),
-            match_type=match_type,
-            sift_ratio=self.max_sift_ratio_spin.value(),
-            sift_distance=self.max_sift_distance_spin.value(),
-            pair_options=pair_options
-        )
-        self.worker.moveToThread(self.thread)
-
-        # Connect signals
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.worker.log_message.connect(self.log)
-        self.worker.error.connect(lambda e: QMessageBox.critical(self, "Tracking Error", e))
-        self.worker.finished.connect(lambda: self.track_btn.setEnabled(True))
-        self.worker.finished.connect(self.update_reconstruction_list)
-
-        # Start
-        self.thread.start()
+        settings = {
+            "camera_model": self.camera_model_selector.currentText(),
+            "match_type": match_type,
+            "sift_ratio": self.max_sift_ratio_spin.value(),
+            "sift_distance": self.max_sift_distance_spin.value(),
+            # make_pair_options arguments, the options are built in the tracking process
+            "pair_settings": {
+                "block_size": self.block_size_spin.value(),
+                "overlap": self.retrieval_overlap_spin.value() if match_type == "retrieval" else self.overlap_spin.value(),
+                "max_num_neighbors": self.max_neighbors_spin.value(),
+                "max_distance": self.max_distance_spin.value(),
+                "retrieval_neighbors": self.retrieval_neighbors_spin.value(),
+            },
+            "streaming": self.streaming_check.isChecked(),
+            "keyframes": self.keyframes_check.isChecked(),
+            "keyframe_motion": self.keyframe_motion_spin.value(),
+            "mapper": self.mapper_selector.currentText(),
+            "chunk_size": self.chunk_size_spin.value(),
+            "chunk_overlap": max(3, self.chunk_size_spin.value() // 10),
+            "proxy_scale": self.proxy_selector.currentData(),
+            "motion_masks": self.motion_masks_check.isChecked(),
+            "mattes_dir": self.mattes_dir,
+            "lens": self.lens_selector.currentText().strip() or None,
+            "lens_mode": "fixed" if self.lens_fixed_check.isChecked() else "prior",
+            "shards": self.shards_spin.value(),
+            # The viewer follows the model being mapped
+            "live_preview": True,
+            "variant": variant,
+        }
+
+        from ui.worker import TrackingProcess
+        run = TrackingProcess(self.project_dir, settings, log_path, run_id=self.run_count, label=label)
+        # Logged straight from the message thread, the log timer shows it.
+        run.log_lines.connect(self.log_run_lines, Qt.DirectConnection)
+        run.status_changed.connect(self.update_runs_label)
+        run.preview.connect(self.apply_live_update)
+        run.error.connect(self.show_tracking_error)
+        run.finished.connect(self.tracking_finished)
+        self.runs[run.run_id] = run
+        run.start()
+        self.update_run_controls()
+
+    def log_run_lines(self, run, lines):
+        """Thread safe: log lines of a run, prefixed with its label while several are tracked."""
+        if len(self.runs) > 1:
+            prefix = f"[{run.label}] "
+            lines = [prefix + line for line in lines]
+        self.log("\n".join(lines))
+
+    def project_runs(self):
+        """The running tracks of the open project, oldest first."""
+        return [run for run in self.runs.values() if run.project_dir == self.project_dir]
+
+    def project_busy(self):
+        """
+        Whether a run or the USD export works in the open project's folder
+        (other runs of it then work in a copy).
+        """
+        if self.usd_export is not None and self.usd_export.project_dir == self.project_dir:
+            return True
+        return any(not run.settings.get("variant") for run in self.project_runs())
+
+    def current_run(self):
+        """The latest run of the open project: the one the progress bar and viewer follow."""
+        runs = self.project_runs()
+        return runs[-1] if runs else None
+
+    def update_run_controls(self):
+        """Track, cancel, resume and progress controls for the open project."""
+        runs = self.project_runs()
+        run = runs[-1] if runs else None
+        self.track_btn.setEnabled(bool(self.project_dir))
+        self.cancel_btn.setVisible(run is not None)
+        self.cancel_btn.setEnabled(any(not r.cancel_event.is_set() for r in runs))
+        if run is None:
+            self.progress_bar.setVisible(False)
+        # A running track may be writing into any run folder, and the export reads one.
+        self.delete_recon_btn.setEnabled(run is None and not self.project_busy() and self.recon_selector.count() > 0)
+        # Exporting extracts the plates into the frames folder a run in the project folder is using.
+        self.export_btn.setEnabled(self.usd_export is None and not self.project_busy())
+        self.update_resume_button()
+        self.update_runs_label()
+
+    def update_runs_label(self, _run=None):
+        """List the running tracks with their current stage."""
+        names = [f"{run.label} ({run.stage or 'starting'})" for run in self.runs.values()]
+        self.runs_label.setText("⏳ Tracking: " + ", ".join(names))
+        self.runs_label.setVisible(bool(names))
+
+    def apply_live_update(self, run, update):
+        if run is self.current_run():
+            self.ensure_viewer().apply_live_update(update)
+
+    def cancel_tracking(self):
+        runs = self.project_runs()
+        if runs:
+            for run in runs:
+                run.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.log(f"⏹ Cancelling {len(runs)} run(s) at the next safe point…")
+
+    def show_tracking_error(self, run, message):
+        title = f"Tracking Error: {run.label}"
+        box = QMessageBox(QMessageBox.Critical, title, message, QMessageBox.Ok, self)
+        box.setDetailedText("\n".join(run.tail))
+        box.exec()
+
+    def tracking_finished(self, run):
+        """The run's process has exited, giving its memory back."""
+        self.runs.pop(run.run_id, None)
+        run.deleteLater()
+        self.flush_log()
+        self.refresh_lens_list()
+        if run.project_dir == self.project_dir:
+            self.update_reconstruction_list()
+        self.update_run_controls()
 
     def update_reconstruction_list(self):
-        """Refresh the reconstruction dropdown by finding folders containing COLMAP .bin files."""
+        """Refresh the reconstruction dropdown from the project's model index."""
+        selected = self.recon_selector.currentData()
         self.recon_selector.clear()
-        recon_root = os.path.join(self.project_dir, "reconstruction")
-        if not os.path.exists(recon_root):
-            os.makedirs(recon_root, exist_ok=True)
-
-        valid_recons = []
+        os.makedirs(os.path.join(self.project_dir, "reconstruction"), exist_ok=True)
 
-        # Walk through subfolders recursively
-        for root, dirs, files in os.walk(recon_root):
-            # Check if folder contains any .bin files
-            if any(f.endswith(".bin") for f in files):
-                # Make the path relative to recon_root for dropdown display
-                rel_path = os.path.relpath(root, recon_root)
-                valid_recons.append(rel_path)
+        index = ReconstructionIndex(self.project_dir).refresh(log=self.log)
+        entries = index.entries(sort=self.recon_sort_selector.currentText())
 
-        valid_recons.sort()
-
-        if valid_recons:
-            self.recon_selector.addItems(valid_recons)
+        if entries:
+            for name, summary in entries:
+                self.recon_selector.addItem(describe(name, summary), name)
+            position = self.recon_selector.findData(selected)
+            self.recon_selector.setCurrentIndex(max(position, 0))
             self.recon_selector.setEnabled(True)
             self.track_btn.setText("🔁 Retrack")
             self.export_btn.setVisible(True)
-            self.log(f"🧠 Found {len(valid_recons)} reconstruction(s).")
+            self.export_options_widget.setVisible(True)
+            self.log(f"🧠 Found {len(entries)} reconstruction(s).")
         else:
             self.recon_selector.setEnabled(False)
             self.track_btn.setText("▶ Run Tracking")
             self.export_btn.setVisible(False)
+            self.export_options_widget.setVisible(False)
+        self.delete_recon_btn.setEnabled(bool(entries) and not self.project_runs())
+
+    def show_selected_model(self):
+        name = self.recon_selector.currentData()
+        if self.project_dir and name:
+            model_dir = os.path.join(self.project_dir, "reconstruction", name)
+            self.ensure_viewer().show_model(lambda: self.model_cache.get(model_dir))
 
     # ----------------------------------------------------
     # Export
@@ -323,21 +793,46 @@ class MainWindow(QWidget):
         export_dir = os.path.join(self.project_dir, "export")
         os.makedirs(export_dir, exist_ok=True)
 
-        selected_recon = self.recon_selector.currentText() or "0"
+        selected_recon = self.recon_selector.currentData() or "0"
         recon_dir = os.path.join(self.project_dir, "reconstruction", selected_recon)
         
         recon_clean_name = selected_recon.replace('/', '_').replace('\\', '_')
 
         usd_path, _ = QFileDialog.getSaveFileName(
-            self, "Export to USD", os.path.join(export_dir, f"camera_track_{recon_clean_name}.usda"),
-            "USD Files (*.usd *.usda)"
+            self, "Export to USD", os.path.join(export_dir, f"camera_track_{recon_clean_name}.usdc"),
+            "USD Files (*.usdc *.usd *.usda)"
         )
         if usd_path:
-            try:
-                self.log(f"Exporting reconstruction #{selected_recon} to USD…")
-                recon = pycolmap.Reconstruction(recon_dir)
-                create_usd(self.project_dir, recon, usd_path)
-                self.log(f"✅ USD file exported to: {usd_path}")
-                QMessageBox.information(self, "Export Complete", f"USD file exported to:\n{usd_path}")
-            except Exception as e:
-                QMessageBox.critical(self, "Export Failed", f"Error exporting USD:\n{str(e)}")
+            from ui.worker import UsdExport
+
+            self.log(f"Exporting reconstruction #{selected_recon} to USD…")
+            # The export thread imports the native modules the warmup is loading.
+            self.warmup.wait()
+            self.usd_export = UsdExport(
+                self.project_dir, recon_dir, usd_path,
+                dict(
+                    voxel_size=self.voxel_size_spin.value(),
+                    min_track_length=self.min_track_length_spin.value(),
+                    max_reprojection_error=self.max_error_spin.value() or None,
+                    lod_levels=self.lod_levels_spin.value()
+                ),
+                log=self.log
+            )
+            self.usd_export.done.connect(self.usd_exported)
+            self.usd_export.failed.connect(self.usd_export_failed)
+            self.usd_export.start()
+            self.update_run_controls()
+
+    def usd_exported(self, export):
+        self.usd_export = None
+        export.deleteLater()
+        self.update_run_controls()
+        self.log(f"⏱️ Export took {export.seconds:.1f}s.")
+        self.log(f"✅ USD file exported to: {export.usd_path}")
+        QMessageBox.information(self, "Export Complete", f"USD file exported to:\n{export.usd_path}")
+
+    def usd_export_failed(self, export, message):
+        self.usd_export = None
+        export.deleteLater()
+        self.update_run_controls()
+        QMessageBox.critical(self, "Export Failed", f"Error exporting USD:\n{message}")
@@ -0,0 +1,92 @@
+"""
+Fast GUI startup.
+
+Only Qt is imported before the main window is shown. NumPy, pycolmap, USD,
+PyOpenGL and the tracking pipeline take seconds to load on a cold start, so
+the window imports them where they are used, and ``Warmup`` imports them on a
+background thread once the window has painted: by the time a project is
+opened they are usually loaded already.
+
+Native modules imported from two threads at once can deadlock (USD's
+initialisers take the GIL while the other thread holds the loader lock), so
+while the warmup runs the window defers its own imports with ``Warmup.after``
+or, where it cannot, blocks in ``Warmup.wait``.
+"""
+import importlib
+import threading
+
+from PySide6.QtCore import QEvent, QObject, Signal
+
+# Imported after the first paint, heaviest first.
+HEAVY_MODULES = [
+    "numpy", "pycolmap", "pxr.Usd", "OpenGL.GL",
+    "tracking", "ui.viewer", "ui.worker",
+]
+
+
+class FirstPaint(QObject):
+    """Emits ``painted`` once, after the first paint event of the watched widget."""
+    painted = Signal()
+
+    def __init__(self, widget):
+        super().__init__(widget)
+        self.widget = widget
+        widget.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if watched is self.widget and event.type() == QEvent.Paint:
+            self.widget.removeEventFilter(self)
+            self.painted.emit()
+        return False
+
+
+class Warmup(QObject):
+    """Imports HEAVY_MODULES on a background thread, then emits ``ready``."""
+    ready = Signal()
+    failed = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.thread = None
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.pending = []
+        self.ready.connect(self.run_pending)
+
+    @property
+    def running(self):
+        return self.thread is not None and not self.done.is_set()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self.thread.start()
+
+    def after(self, callback):
+        """Call ``callback`` now, or on this object's thread once a running warmup is done."""
+        with self.lock:
+            if self.running:
+                self.pending.append(callback)
+                return
+        callback()
+
+    def wait(self):
+        """Block until a running warmup is done."""
+        if self.thread is not None:
+            self.done.wait()
+
+    def run_pending(self):
+        callbacks, self.pending = self.pending, []
+        for callback in callbacks:
+            callback()
+
+    def run(self):
+        for name in HEAVY_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                # The same import fails again on first use, where it is reported in context.
+                self.failed.emit(f"⚠️ Could not load {name}: {e}")
+        # Set under the lock: a callback deferred by ``after`` is always run by ``ready``.
+        with self.lock:
+            self.done.set()
+        self.ready.emit()
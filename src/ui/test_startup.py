@@ -0,0 +1,49 @@
+import importlib.util
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+from PySide6.QtCore import QCoreApplication
+
+from ui import startup
+from ui.startup import Warmup
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "benchmarks", "startup.py")
+# Far above a normal start, so only a real regression fails; CI also runs the benchmark with its budget.
+MAX_FIRST_PAINT = 10.0
+
+
+def test_first_paint_loads_no_heavy_modules(monkeypatch):
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")  # no display needed
+    spec = importlib.util.spec_from_file_location("startup_benchmark", BENCHMARK)
+    benchmark = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(benchmark)
+
+    elapsed, loaded = benchmark.time_startup(timeout=60)
+
+    assert loaded == []
+    assert elapsed < MAX_FIRST_PAINT
+
+
+def test_after_defers_until_the_warmup_is_done(monkeypatch):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    gate = threading.Event()
+    monkeypatch.setattr(startup, "HEAVY_MODULES", ["module"])
+    monkeypatch.setattr(startup, "importlib", SimpleNamespace(import_module=lambda name: gate.wait()))
+    warmup = Warmup()
+    calls = []
+
+    warmup.start()
+    warmup.after(lambda: calls.append("deferred"))
+    assert calls == [] and warmup.running
+
+    gate.set()
+    warmup.wait()
+    deadline = time.monotonic() + 5
+    while not calls and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    warmup.after(lambda: calls.append("now"))
+
+    assert calls == ["deferred", "now"]
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from ui.viewer import LiveModelFeed
+
+
+def reconstruction(ids, offset=0.0):
+    points3D = {i: SimpleNamespace(xyz=np.array([i, 0.0, offset]), color=np.array([i % 256, 0, 0])) for i in ids}
+    return SimpleNamespace(points3D=points3D, images={}, cameras={})
+
+
+def snapshot(feed, model, model_index=0):
+    updates = []
+    feed.updated.connect(updates.append)
+    feed.next_time = 0.0
+    feed(model, model_index)
+    feed.updated.disconnect(updates.append)
+    return updates[-1]
+
+
+def test_live_updates_carry_moved_and_removed_points():
+    feed = LiveModelFeed()
+    first = snapshot(feed, reconstruction(range(100)))
+    # Bundle adjustment moved every point, points 0-49 were merged away and 100-149 are new.
+    second = snapshot(feed, reconstruction(range(50, 150), offset=1.0))
+
+    assert first["reset"] and not second["reset"]
+    assert sorted(second["points"][:, 0]) == list(range(50, 150))
+    assert np.all(second["points"][:, 2] == 1.0)
+
+
+def test_draw_order_is_stable_and_mixes_new_points_in():
+    feed = LiveModelFeed()
+    first = snapshot(feed, reconstruction(range(1000)))
+    second = snapshot(feed, reconstruction(range(2000)))
+
+    old = [i for i in second["points"][:, 0] if i < 1000]
+    assert old == list(first["points"][:, 0])
+    # New points are spread through the order, not appended: every prefix is a uniform sample.
+    assert 300 < np.count_nonzero(second["points"][:1000, 0] >= 1000) < 700
+
+
+def test_a_new_model_resets_the_view():
+    feed = LiveModelFeed()
+    snapshot(feed, reconstruction(range(10)))
+    assert snapshot(feed, reconstruction(range(5)), model_index=1)["reset"]
@@ -0,0 +1,446 @@
+"""
+Interactive point cloud and camera path viewer.
+
+Points and camera frustums live in OpenGL vertex buffers and are drawn with
+the fixed-function pipeline (OpenGL 1.5 / 2.1 compatibility), so the viewer
+also runs on software OpenGL (Mesa llvmpipe, Qt's opengl32sw on Windows).
+Points are shuffled once when a model is loaded, which makes every prefix of
+the buffer a uniform subsample: level of detail is just drawing fewer points,
+as many as the cloud's size on screen can show, within a point budget that
+is lower while the view is being dragged and on software renderers.
+
+During mapping, LiveModelFeed sends snapshots of the model being built, in
+a draw order that keeps the same property as points are added and removed.
+"""
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from OpenGL import GL
+from PySide6.QtCore import QObject, Qt, Signal
+from PySide6.QtGui import QSurfaceFormat
+from PySide6.QtOpenGLWidgets import QOpenGLWidget
+
+from tracking import point_cloud_arrays
+
+FIELD_OF_VIEW = 45.0
+# Points drawn per pixel covered by the cloud before drawing more stops showing more.
+POINTS_PER_PIXEL = 2.0
+MIN_LOD_POINTS = 50000
+POINT_BUDGET = 8000000
+INTERACTIVE_POINT_BUDGET = 1500000
+# Software renderers draw far fewer points per second.
+SOFTWARE_BUDGET_FACTOR = 0.125
+SOFTWARE_RENDERERS = ("llvmpipe", "softpipe", "swrast", "gdi generic", "swiftshader", "software")
+LIVE_UPDATE_SECONDS = 0.5
+# Largest share of the mapper's time spent reading the model for live updates.
+LIVE_UPDATE_SHARE = 0.1
+# COLMAP looks down +z with y pointing down, the viewer is y up.
+WORLD_FLIP = np.diag([1.0, -1.0, -1.0, 1.0])
+
+
+def perspective(fov_y, aspect, near, far):
+    f = 1.0 / math.tan(math.radians(fov_y) / 2)
+    return np.array([
+        [f / aspect, 0, 0, 0],
+        [0, f, 0, 0],
+        [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0, 0, -1, 0],
+    ])
+
+
+def look_at(eye, target, up=(0.0, 1.0, 0.0)):
+    forward = target - eye
+    forward /= np.linalg.norm(forward)
+    side = np.cross(forward, up)
+    side /= np.linalg.norm(side)
+    up = np.cross(side, forward)
+    view = np.identity(4)
+    view[0, :3], view[1, :3], view[2, :3] = side, up, -forward
+    view[:3, 3] = -view[:3, :3] @ eye
+    return view
+
+
+def camera_poses(reconstruction):
+    """Centers (N, 3) and world_from_cam rotations (N, 3, 3) of the posed images, in name order."""
+    images = sorted((image for image in reconstruction.images.values() if image.has_pose), key=lambda i: i.name)
+    centers = np.array([image.projection_center() for image in images]).reshape(-1, 3)
+    rotations = np.array([image.cam_from_world().rotation.matrix().T for image in images]).reshape(-1, 3, 3)
+    return centers, rotations
+
+
+def frustum_lines(centers, rotations, camera, size):
+    """Line segment vertices (N * 16, 3) and uint8 colors of camera frustums ``size`` deep, colored along the path."""
+    if len(centers) == 0:
+        return np.empty((0, 3), np.float32), np.empty((0, 3), np.uint8)
+    half_w = camera.width / (2 * camera.focal_length_x) * size
+    half_h = camera.height / (2 * camera.focal_length_y) * size
+    corners = np.array([[-half_w, -half_h, size], [half_w, -half_h, size], [half_w, half_h, size], [-half_w, half_h, size]])
+    # (N, 4, 3) corners in world space
+    world_corners = np.einsum("nij,kj->nki", rotations, corners) + centers[:, None, :]
+    apex = np.repeat(centers[:, None, :], 4, axis=1)
+    rim = np.roll(world_corners, -1, axis=1)
+    segments = np.stack([apex, world_corners, world_corners, rim], axis=2).reshape(-1, 3)
+
+    t = np.linspace(0, 1, len(centers))[:, None]
+    colors = (np.array([60, 200, 255]) * (1 - t) + np.array([255, 90, 200]) * t).astype(np.uint8)
+    return segments.astype(np.float32), np.repeat(colors, 16, axis=0)
+
+
+def model_geometry(reconstruction, seed=0):
+    """Shuffled points and uint8 colors plus camera frustum lines of a reconstruction."""
+    points, colors, _, _ = point_cloud_arrays(reconstruction)
+    order = np.random.default_rng(seed).permutation(len(points))
+    centers, rotations = camera_poses(reconstruction)
+    camera = next(iter(reconstruction.cameras.values()), None)
+    size = frustum_size(points, centers)
+    lines, line_colors = frustum_lines(centers, rotations, camera, size) if camera else (None, None)
+    return {
+        "points": points[order],
+        "colors": np.rint(colors[order] * 255).astype(np.uint8),
+        "lines": lines,
+        "line_colors": line_colors,
+    }
+
+
+def frustum_size(points, centers):
+    """Frustum depth: a fraction of the camera path, or of the cloud when the camera barely moves."""
+    extent = 0.0
+    if len(centers) > 1:
+        extent = np.linalg.norm(np.ptp(centers, axis=0))
+    if extent == 0.0 and len(points):
+        low, high = np.percentile(points, [5, 95], axis=0)
+        extent = np.linalg.norm(high - low)
+    return 0.05 * (extent or 1.0)
+
+
+class LiveModelFeed(QObject):
+    """
+    Called by the mapper in the tracking process with ``(reconstruction,
+    model_index)`` after every registered image; emits the current points
+    and cameras at most once per LIVE_UPDATE_SECONDS, less often when the
+    model is so large that reading it takes more than LIVE_UPDATE_SHARE of
+    the mapper's time.
+
+    Every update holds all the points, since bundle adjustment moves,
+    merges and deletes them. Each point keeps the random key it got when it
+    first appeared and points are sent in key order, so every prefix stays
+    a uniform sample while the model grows, and the drawn subset does not
+    flicker from one update to the next.
+    """
+
+    updated = Signal(object)
+
+    def __init__(self, seed=0):
+        super().__init__()
+        self.model_index = None
+        self.rng = np.random.default_rng(seed)
+        self.ids = np.empty(0, dtype=np.int64)  # sorted
+        self.keys = np.empty(0)
+        self.next_time = 0.0
+
+    def __call__(self, reconstruction, model_index):
+        start = time.monotonic()
+        if start < self.next_time:
+            return
+
+        reset = model_index != self.model_index
+        if reset:
+            self.model_index = model_index
+            self.ids = np.empty(0, dtype=np.int64)
+            self.keys = np.empty(0)
+
+        points3D = reconstruction.points3D
+        count = len(points3D)
+        ids = np.empty(count, dtype=np.int64)
+        points = np.empty((count, 3), dtype=np.float32)
+        colors = np.empty((count, 3), dtype=np.uint8)
+        for i, (point3D_id, point) in enumerate(points3D.items()):
+            ids[i] = point3D_id
+            points[i] = point.xyz
+            colors[i] = point.color
+        order = self.draw_order(ids)
+
+        centers, rotations = camera_poses(reconstruction)
+        camera = next(iter(reconstruction.cameras.values()), None)
+        lines, line_colors = frustum_lines(centers, rotations, camera, frustum_size(points, centers)) \
+            if camera else (None, None)
+        self.updated.emit({
+            "reset": reset, "points": points[order], "colors": colors[order],
+            "lines": lines, "line_colors": line_colors,
+        })
+        now = time.monotonic()
+        self.next_time = now + max(LIVE_UPDATE_SECONDS, (now - start) / LIVE_UPDATE_SHARE)
+
+    def draw_order(self, ids):
+        """Order of ``ids`` by their random keys; new ids get a key, removed ones are forgotten."""
+        keys = self.rng.random(len(ids))
+        if len(self.ids):
+            position = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+            known = self.ids[position] == ids
+            keys[known] = self.keys[position[known]]
+        by_id = np.argsort(ids)
+        self.ids, self.keys = ids[by_id], keys[by_id]
+        return np.argsort(keys)
+
+
+class PointCloudRenderer:
+    """Vertex buffers and fixed-function drawing of points and line segments; needs a current GL context."""
+
+    def __init__(self):
+        self.points = np.empty((0, 3), np.float32)
+        self.colors = np.empty((0, 3), np.uint8)
+        self.capacity = 0
+        self.uploaded = 0
+        self.lines = np.empty((0, 3), np.float32)
+        self.line_colors = np.empty((0, 3), np.uint8)
+        self.lines_dirty = False
+        self.buffers = None
+        self.software = False
+
+    def initialize(self):
+        renderer = (GL.glGetString(GL.GL_RENDERER) or b"").decode("utf-8", "replace").lower()
+        self.software = any(name in renderer for name in SOFTWARE_RENDERERS)
+        # OpenGL 1.1 (e.g. Windows' GDI renderer) has no buffer objects, draw from client memory then.
+        if bool(GL.glGenBuffers):
+            self.buffers = GL.glGenBuffers(4)
+        GL.glEnable(GL.GL_DEPTH_TEST)
+        GL.glClearColor(0.11, 0.11, 0.13, 1.0)
+        self.capacity = self.uploaded = 0
+        self.lines_dirty = True
+
+    def budget(self, interactive):
+        budget = INTERACTIVE_POINT_BUDGET if interactive else POINT_BUDGET
+        return int(budget * (SOFTWARE_BUDGET_FACTOR if self.software else 1.0))
+
+    def set_points(self, points, colors):
+        self.points, self.colors = points, colors
+        self.capacity = self.uploaded = 0
+
+    def set_lines(self, lines, colors):
+        self.lines, self.line_colors = lines, colors
+        self.lines_dirty = True
+
+    def upload(self):
+        """Send the points not on the GPU yet, reallocating (x2) only when the buffers are full."""
+        if self.buffers is None:
+            return
+        count = len(self.points)
+        if count > self.capacity:
+            self.capacity = max(1024, count * 2 if self.uploaded else count)
+            for buffer, data in ((self.buffers[0], self.points), (self.buffers[1], self.colors)):
+                GL.glBindBuffer(GL.GL_ARRAY_BUFFER, buffer)
+                GL.glBufferData(GL.GL_ARRAY_BUFFER, self.capacity * data.itemsize * 3, None, GL.GL_DYNAMIC_DRAW)
+            self.uploaded = 0
+        if count > self.uploaded:
+            for buffer, data in ((self.buffers[0], self.points), (self.buffers[1], self.colors)):
+                new = np.ascontiguousarray(data[self.uploaded:count])
+                GL.glBindBuffer(GL.GL_ARRAY_BUFFER, buffer)
+                GL.glBufferSubData(GL.GL_ARRAY_BUFFER, self.uploaded * data.itemsize * 3, new.nbytes, new)
+            self.uploaded = count
+        if self.lines_dirty:
+            for buffer, data in ((self.buffers[2], self.lines), (self.buffers[3], self.line_colors)):
+                GL.glBindBuffer(GL.GL_ARRAY_BUFFER, buffer)
+                GL.glBufferData(GL.GL_ARRAY_BUFFER, max(data.nbytes, 1), np.ascontiguousarray(data), GL.GL_STATIC_DRAW)
+            self.lines_dirty = False
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+
+    def draw_arrays(self, mode, first_buffer, vertices, colors, count):
+        """Draw from buffers ``first_buffer`` (vertices) and the next one (colors), or from client memory."""
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glEnableClientState(GL.GL_COLOR_ARRAY)
+        if self.buffers is not None:
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.buffers[first_buffer])
+            GL.glVertexPointer(3, GL.GL_FLOAT, 0, None)
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.buffers[first_buffer + 1])
+            GL.glColorPointer(3, GL.GL_UNSIGNED_BYTE, 0, None)
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        else:
+            GL.glVertexPointer(3, GL.GL_FLOAT, 0, vertices)
+            GL.glColorPointer(3, GL.GL_UNSIGNED_BYTE, 0, colors)
+        GL.glDrawArrays(mode, 0, count)
+        GL.glDisableClientState(GL.GL_COLOR_ARRAY)
+        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+
+    def draw(self, projection, modelview, num_points, point_size):
+        self.upload()
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
+        GL.glMatrixMode(GL.GL_PROJECTION)
+        GL.glLoadMatrixf(np.ascontiguousarray(projection.T, dtype=np.float32))
+        GL.glMatrixMode(GL.GL_MODELVIEW)
+        GL.glLoadMatrixf(np.ascontiguousarray(modelview.T, dtype=np.float32))
+
+        num_points = min(num_points, len(self.points))
+        if num_points:
+            GL.glPointSize(point_size)
+            self.draw_arrays(GL.GL_POINTS, 0, self.points, self.colors, num_points)
+        if len(self.lines):
+            self.draw_arrays(GL.GL_LINES, 2, self.lines, self.line_colors, len(self.lines))
+
+
+class ModelViewer(QOpenGLWidget):
+    """
+    Orbit viewer of one reconstruction: left drag orbits, right or middle drag
+    pans, the wheel zooms and a double click frames the model again.
+    """
+
+    geometry_ready = Signal(int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        surface_format = QSurfaceFormat()
+        surface_format.setVersion(2, 1)
+        surface_format.setProfile(QSurfaceFormat.NoProfile)
+        surface_format.setDepthBufferSize(24)
+        self.setFormat(surface_format)
+        self.setMinimumSize(320, 240)
+
+        self.renderer = PointCloudRenderer()
+        self.target = np.zeros(3)
+        self.radius = 1.0
+        self.distance = 3.0
+        self.yaw = 0.0
+        self.pitch = 0.3
+        self.drag_button = None
+        self.drag_position = None
+        self.framed = False
+
+        self.generation = 0
+        self.loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="viewer-load")
+        self.geometry_ready.connect(self.on_geometry_ready)
+
+    # --- Data ---
+
+    def show_model(self, load_reconstruction):
+        """Load a model off the GUI thread; ``load_reconstruction`` returns a pycolmap.Reconstruction."""
+        self.generation += 1
+        generation = self.generation
+
+        def work():
+            try:
+                geometry = model_geometry(load_reconstruction())
+            except Exception:
+                geometry = None
+            self.geometry_ready.emit(generation, geometry)
+
+        self.loader.submit(work)
+
+    def on_geometry_ready(self, generation, geometry):
+        if generation != self.generation:
+            return  # another model was selected meanwhile
+        self.set_geometry(geometry)
+
+    def set_geometry(self, geometry):
+        if geometry is None:
+            self.clear()
+            return
+        self.renderer.set_points(geometry["points"], geometry["colors"])
+        if geometry["lines"] is not None:
+            self.renderer.set_lines(geometry["lines"], geometry["line_colors"])
+        self.frame_model()
+        self.update()
+
+    def apply_live_update(self, update):
+        """Show a LiveModelFeed snapshot: points and cameras are replaced, a new model is framed again."""
+        self.generation += 1  # a model load still running is now stale
+        if update["reset"]:
+            self.framed = False
+        self.renderer.set_points(update["points"], update["colors"])
+        if update["lines"] is not None:
+            self.renderer.set_lines(update["lines"], update["line_colors"])
+        if not self.framed and len(self.renderer.points) + len(self.renderer.lines) > 0:
+            self.frame_model()
+        self.update()
+
+    def clear(self):
+        self.generation += 1
+        self.renderer.set_points(np.empty((0, 3), np.float32), np.empty((0, 3), np.uint8))
+        self.renderer.set_lines(np.empty((0, 3), np.float32), np.empty((0, 3), np.uint8))
+        self.update()
+
+    def frame_model(self):
+        """Center the orbit on the bulk of the points (or the cameras) and fit it in view."""
+        points = self.renderer.points[:200000]
+        if len(points) == 0:
+            points = self.renderer.lines
+        if len(points) == 0:
+            return
+        self.target = np.median(points, axis=0).astype(np.float64)
+        self.radius = float(np.percentile(np.linalg.norm(points - self.target, axis=1), 90)) or 1.0
+        self.distance = self.radius / math.sin(math.radians(FIELD_OF_VIEW) / 2) * 1.1
+        self.framed = True
+
+    # --- Level of detail ---
+
+    def lod_points(self):
+        """Points worth drawing at the cloud's current size on screen, within the point budget."""
+        height = max(1, self.height() * self.devicePixelRatio())
+        if self.distance > self.radius:
+            pixel_radius = self.radius / (self.distance * math.tan(math.radians(FIELD_OF_VIEW) / 2)) * height / 2
+        else:
+            pixel_radius = height  # inside the cloud it fills the view
+        useful = POINTS_PER_PIXEL * math.pi * pixel_radius ** 2
+        budget = self.renderer.budget(interactive=self.drag_button is not None)
+        return int(min(len(self.renderer.points), max(MIN_LOD_POINTS, useful), budget))
+
+    # --- OpenGL ---
+
+    def initializeGL(self):
+        self.renderer.initialize()
+
+    def paintGL(self):
+        width, height = max(1, self.width()), max(1, self.height())
+        near = max(self.distance - self.radius * 4, self.distance * 0.001)
+        projection = perspective(FIELD_OF_VIEW, width / height, near, self.distance + self.radius * 100)
+
+        eye_direction = np.array([
+            math.cos(self.pitch) * math.sin(self.yaw),
+            math.sin(self.pitch),
+            math.cos(self.pitch) * math.cos(self.yaw),
+        ])
+        flipped_target = (WORLD_FLIP[:3, :3] @ self.target)
+        modelview = look_at(flipped_target + eye_direction * self.distance, flipped_target) @ WORLD_FLIP
+
+        num_points = self.lod_points()
+        # Fewer points are drawn bigger so the cloud keeps its density on screen.
+        coverage = min(len(self.renderer.points), MIN_LOD_POINTS * 40) / max(num_points, 1)
+        point_size = float(np.clip(1.5 * math.sqrt(coverage), 1.5, 4.0))
+        self.renderer.draw(projection, modelview, num_points, point_size)
+
+    # --- Interaction ---
+
+    def mousePressEvent(self, event):
+        self.drag_button = event.button()
+        self.drag_position = event.position()
+
+    def mouseMoveEvent(self, event):
+        if self.drag_button is None:
+            return
+        delta = event.position() - self.drag_position
+        self.drag_position = event.position()
+        if self.drag_button == Qt.LeftButton:
+            self.yaw -= delta.x() * 0.01
+            self.pitch = float(np.clip(self.pitch + delta.y() * 0.01, -1.5, 1.5))
+        else:
+            # Pan in the view plane, scaled so the point under the cursor follows it.
+            scale = 2 * self.distance * math.tan(math.radians(FIELD_OF_VIEW) / 2) / max(1, self.height())
+            right = np.array([math.cos(self.yaw), 0.0, -math.sin(self.yaw)])
+            up = np.array([
+                -math.sin(self.pitch) * math.sin(self.yaw), math.cos(self.pitch), -math.sin(self.pitch) * math.cos(self.yaw)
+            ])
+            offset = (-delta.x() * right + delta.y() * up) * scale
+            self.target += WORLD_FLIP[:3, :3] @ offset
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        self.drag_button = None
+        self.update()  # redraw at the full point budget
+
+    def mouseDoubleClickEvent(self, event):
+        self.frame_model()
+        self.update()
+
+    def wheelEvent(self, event):
+        self.distance *= 0.9 ** (event.angleDelta().y() / 120)
+        self.update()
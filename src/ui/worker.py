@@ -0,0 +1,173 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+
+from PySide6.QtCore import QObject, Signal
+
+from tracking_process import close_job, contain, kill_tree, run_child
+
+# Lines of a run kept for its error report.
+TAIL_LINES = 40
+# Seconds a finished tracking process gets to exit before it is killed.
+EXIT_TIMEOUT = 30
+
+
+class TrackingProcess(QObject):
+    """
+    One tracking run in a child process (see ``tracking_process``). Its
+    messages are read on a background thread: ``log_lines`` is emitted from
+    that thread, connect it directly to something thread safe. The other
+    signals pass the run itself and reach slots of GUI objects queued.
+    """
+    log_lines = Signal(object, list)
+    status_changed = Signal(object)
+    preview = Signal(object, object)
+    error = Signal(object, str)
+    finished = Signal(object)
+
+    def __init__(self, project_dir, settings, log_path, run_id=0, label=None):
+        super().__init__()
+        self.run_id = run_id
+        self.label = label or os.path.basename(os.path.normpath(project_dir))
+        self.project_dir = project_dir
+        self.settings = settings
+        self.log_path = log_path
+        self.progress = None
+        self.stage = None
+        self.stages = {}
+        self.tail = deque(maxlen=TAIL_LINES)
+        self.context = multiprocessing.get_context("spawn")
+        self.cancel_event = self.context.Event()
+        self.process = None
+        self.conn = None
+        self.killed = False
+        self.job = None
+        self.job_lock = threading.Lock()
+
+    def start(self):
+        self.conn, child_conn = self.context.Pipe(duplex=False)
+        # Not a daemon: sharded and chunked runs start processes of their own.
+        self.process = self.context.Process(
+            target=run_child, name="tracking",
+            args=(child_conn, self.cancel_event, self.project_dir, self.settings, self.log_path)
+        )
+        self.process.start()
+        self.job = contain(self.process.pid)
+        child_conn.close()
+        threading.Thread(target=self.read_messages, name="tracking-messages", daemon=True).start()
+
+    def cancel(self):
+        """Stop the run at its next safe point (thread safe)."""
+        self.cancel_event.set()
+
+    def kill(self):
+        """End the run now, with the processes it started (chunk and shard workers, ffmpeg)."""
+        self.killed = True
+        with self.job_lock:
+            kill_tree(self.process, self.job)
+
+    def read_messages(self):
+        result = None
+        try:
+            while result is None:
+                message = self.conn.recv()
+                kind = message["type"]
+                if kind == "log":
+                    self.tail.extend(message["lines"])
+                    self.log_lines.emit(self, message["lines"])
+                elif kind == "progress":
+                    self.progress = message["progress"]
+                    self.status_changed.emit(self)
+                elif kind == "stage":
+                    if message["stats"] is None:
+                        self.stage = message["name"]
+                    else:
+                        self.stages[message["name"]] = message["stats"]
+                    self.status_changed.emit(self)
+                elif kind == "preview":
+                    self.preview.emit(self, message["update"])
+                else:
+                    result = message
+        except (EOFError, OSError):
+            pass  # the process died without a result
+        self.conn.close()
+        self.process.join(EXIT_TIMEOUT)
+        if self.process.is_alive():
+            with self.job_lock:
+                kill_tree(self.process, self.job)
+            self.process.join()
+        with self.job_lock:
+            close_job(self.job)
+            self.job = None
+
+        if self.killed:
+            self.log_lines.emit(self, ["⏹ Tracking stopped."])
+        elif result is None:
+            self.error.emit(self, f"The tracking process ended unexpectedly (exit code {self.process.exitcode}).")
+        elif result["type"] == "error":
+            self.error.emit(self, result["message"])
+        elif result["type"] == "cancelled":
+            if self.settings.get("variant"):
+                self.log_lines.emit(self, ["⏹ Tracking cancelled, the variant's working copy was removed."])
+            else:
+                self.log_lines.emit(self, ["⏹ Tracking cancelled. ⏯ Resume continues from the last checkpoint."])
+        self.finished.emit(self)
+
+
+class ClipProbe(QObject):
+    """Probes a clip and loads the cost model on a background thread, for presets and estimates."""
+    probed = Signal(str, object, object)
+    log_message = Signal(str)
+
+    def start(self, video_path):
+        threading.Thread(target=self.run, args=(video_path,), name="clip-probe", daemon=True).start()
+
+    def run(self, video_path):
+        from cost_model import CostModel
+        from presets import probe_clip
+
+        try:
+            clip = probe_clip(video_path)
+            cost_model = CostModel(log=self.log_message.emit)
+        except Exception as e:
+            self.log_message.emit(f"⚠️ Could not estimate runtimes: {e}")
+            return
+        self.probed.emit(video_path, clip, cost_model)
+
+
+class UsdExport(QObject):
+    """
+    Extracts the full resolution plates when needed and writes a USD file on a
+    background thread, so the window stays responsive for 4K and 6K plates.
+    """
+    done = Signal(object)
+    failed = Signal(object, str)
+
+    def __init__(self, project_dir, recon_dir, usd_path, options, log):
+        super().__init__()
+        self.project_dir = project_dir
+        self.recon_dir = recon_dir
+        self.usd_path = usd_path
+        self.options = options
+        self.log = log
+        self.seconds = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="usd-export", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        from telemetry import record_stage
+        from tracking import create_usd, ensure_plates
+
+        try:
+            ensure_plates(self.project_dir, log=self.log)
+            with record_stage(self.recon_dir, "export") as stage:
+                create_usd(self.project_dir, self.recon_dir, self.usd_path, **self.options)
+        except Exception as e:
+            self.failed.emit(self, str(e))
+            return
+        self.seconds = stage["wall_s"]
+        self.done.emit(self)